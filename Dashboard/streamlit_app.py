@@ -8,35 +8,35 @@ if os.path.abspath("..") not in sys.path:
     sys.path.insert(0, os.path.abspath(".."))
 from src.loader import NewsDataLoader
 from src.db import *
+from src.cache import DashboardData
 
 st.set_page_config(page_title='News Analysis', page_icon=':loudspeaker:', layout='wide')
 
 st.title(":loudspeaker: News EDA")
 st.markdown('<style>div.block-container{padding-top:2rem;}</style>', unsafe_allow_html=True)
 
-domains_df = read_domains()
-locations_df = read_domain_locations()
-traffic_df = read_traffic_data()
-articles_df = read_articles()
+# One cached data layer per server process, shared by every rerun and session
+@st.cache_resource
+def get_dashboard_data():
+    return DashboardData()
+
+data = get_dashboard_data()
 
 col1, col2 = st.columns((2))
 
-# Assuming articles_df is already loaded
-articles_df["published_at"] = pd.to_datetime(articles_df["published_at"])
+# Only the bounds of the publication dates are needed for the date pickers
+min_published_at, max_published_at = data.date_range()
 
 # Date pickers for start and end date
 st.sidebar.header("Filter by Published Date")
-start_date = st.sidebar.date_input("Start Date", articles_df["published_at"].min().date())
-end_date = st.sidebar.date_input("End Date", articles_df["published_at"].max().date())
-
-# Filter the DataFrame based on selected dates
-filtered_df = articles_df[(articles_df["published_at"] >= pd.Timestamp(start_date)) & (articles_df["published_at"] <= pd.Timestamp(end_date))]
+start_date = st.sidebar.date_input("Start Date", pd.Timestamp(min_published_at).date())
+end_date = st.sidebar.date_input("End Date", pd.Timestamp(max_published_at).date())
 
-# Group the DataFrame by 'source_name' and count the number of 'id'
-category_df = filtered_df.groupby(by=["source_name"], as_index=False)["id"].count()
+# Count the articles of each domain within the selected dates (end date inclusive) from the cached daily counts
+category_df = data.counts_by_source(pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1)).copy()
 
 # Rename the columns
-category_df.rename(columns={"source_name": "Domain", "id": "Count"}, inplace=True)
+category_df.rename(columns={"source_name": "Domain", "article_count": "Count"}, inplace=True)
 
 # Sort the DataFrame to get the top 5
 top_category_df = category_df.sort_values(by="Count", ascending=False).head(5)
@@ -61,12 +61,9 @@ with col2:
 
 import plotly.graph_objects as go
 
-# Merge domains_df with locations_df to include the country information
-merged_df = pd.merge(domains_df, locations_df, left_on='domain_locations_id', right_on='id')
-
-# Grouping the merged DataFrame by country
-country_df = merged_df.groupby("country", as_index=False)["domain_name"].count()
-country_df.rename(columns={"domain_name": "Domain Count", "country": "Country"}, inplace=True)
+# Count the domains of each country through their location in the database
+country_df = data.domains_by_country().copy()
+country_df.rename(columns={"domain_count": "Domain Count", "country": "Country"}, inplace=True)
 
 # Sorting by domain count to get the top countries
 country_df = country_df.sort_values(by="Domain Count", ascending=False)
@@ -100,11 +97,9 @@ fig_pie.update_layout(
 st.plotly_chart(fig_pie, use_container_width=False)
 
 
- # Convert 'published_at' to datetime if it's not already
-articles_df["published_at"] = pd.to_datetime(articles_df["published_at"])
-
-# Group by date and count the number of articles
-time_series_df = articles_df.groupby(articles_df["published_at"].dt.date).size().reset_index(name="Article Count")
+# Number of articles per day, derived from the cached daily counts
+time_series_df = data.daily_counts().copy()
+time_series_df.rename(columns={"published_date": "published_at", "article_count": "Article Count"}, inplace=True)
 
 # Plotting the time series graph
 st.subheader("Number of Articles Over Time")
@@ -0,0 +1,41 @@
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Modules src.utils must not import until one of its functions needs them
+HEAVY_MODULES = ['nltk', 'sklearn', 'keybert', 'bertopic', 'mlflow', 'matplotlib', 'sentence_transformers', 'torch']
+
+# Run in a fresh interpreter: time `import src.utils` on its own and on top of pandas and numpy
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import pandas, numpy
+base = time.perf_counter()
+import src.utils
+end = time.perf_counter()
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'total': end - start, 'module': end - base, 'heavy': heavy}}))
+"""
+
+
+# Function to measure the import of src.utils in a new interpreter
+def measure_import(cwd=None):
+    import json
+    output = subprocess.run([sys.executable, '-c', SCRIPT.format(heavy=HEAVY_MODULES)],
+                            cwd=cwd, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the import time of src.utils')
+    parser.add_argument('--runs', type=int, default=5, help="Number of fresh interpreters to time")
+    args = parser.parse_args()
+
+    results = [measure_import() for _ in range(args.runs)]
+    print(f"import src.utils: {statistics.median(r['module'] for r in results) * 1000:.0f} ms "
+          f"({statistics.median(r['total'] for r in results) * 1000:.0f} ms with pandas and numpy), "
+          f"median of {args.runs} runs")
+    heavy = sorted(set(name for r in results for name in r['heavy']))
+    print(f"Heavy modules imported: {', '.join(heavy) if heavy else 'none'}")
@@ -0,0 +1,48 @@
+import argparse
+import random
+import time
+from src.text import TextNormalizer, english_stopwords
+
+
+# Function reproducing the previous remove_stopwords, which rebuilt the stopword set for every document
+def remove_stopwords_per_document(text):
+    from nltk.corpus import stopwords
+    stop_words = set(stopwords.words('english'))
+    words = text.split()
+    filtered_words = [word for word in words if word.lower() not in stop_words]
+    return ' '.join(filtered_words)
+
+# Function to build documents mixing stopwords with other words
+def make_documents(n_documents, words_per_document, seed=0):
+    rng = random.Random(seed)
+    vocabulary = sorted(english_stopwords()) + [f"Word{i}" for i in range(5000)]
+    return [' '.join(rng.choices(vocabulary, k=words_per_document)) for _ in range(n_documents)]
+
+# Function to time a callable, returning its result and the elapsed seconds
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark stopword removal')
+    parser.add_argument('--documents', type=int, default=20000, help="Number of documents")
+    parser.add_argument('--words', type=int, default=300, help="Words per document")
+    parser.add_argument('--jobs', type=int, default=None, help="Processes for the parallel run, all cores if omitted")
+    args = parser.parse_args()
+
+    documents = make_documents(args.documents, args.words)
+    normalizer = TextNormalizer()
+
+    expected, legacy = timed(lambda: [remove_stopwords_per_document(text) for text in documents])
+    serial_result, serial = timed(normalizer.normalize_batch, documents)
+    parallel_result, parallel = timed(normalizer.normalize_batch, documents, n_jobs=args.jobs)
+    if serial_result != expected or parallel_result != expected:
+        print("Error: TextNormalizer output differs from remove_stopwords")
+
+    print(f"{args.documents} documents of {args.words} words")
+    print(f"remove_stopwords per document: {legacy:.2f} s")
+    print(f"TextNormalizer:                {serial:.2f} s ({legacy / serial:.1f}x)")
+    print(f"TextNormalizer, processes:     {parallel:.2f} s ({legacy / parallel:.1f}x)")
@@ -0,0 +1,339 @@
+import numpy as np
+import pandas as pd
+
+# Number of query vectors scored against the lists at a time
+SEARCH_BATCH_SIZE = 1024
+
+# Training vectors used per list by IVFIndex.train
+TRAIN_POINTS_PER_LIST = 64
+
+METRICS = ('cosine', 'l2')
+
+
+# Function to scale vectors to unit length, leaving zero vectors as they are
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+# Function to return the index of the best scoring centroid of every vector, in blocks to bound memory
+def _assign(vectors, centroids, metric, block_size=SEARCH_BATCH_SIZE * 8):
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for offset in range(0, len(vectors), block_size):
+        labels[offset:offset + block_size] = _scores(vectors[offset:offset + block_size], centroids, metric).argmax(axis=1)
+    return labels
+
+# Function to score queries against vectors: cosine similarity, or negative squared distance for l2
+def _scores(queries, vectors, metric, vector_norms=None):
+    products = queries @ vectors.T
+    if metric == 'cosine':
+        return products
+    if vector_norms is None:
+        vector_norms = (vectors ** 2).sum(axis=1)
+    return 2 * products - (queries ** 2).sum(axis=1)[:, None] - vector_norms[None, :]
+
+
+class IVFIndex:
+    '''
+    An inverted file (IVF) index for approximate nearest neighbour search.
+
+    Vectors are assigned to the nearest of n_lists k-means centroids; a
+    query is only compared with the vectors of its n_probe nearest lists,
+    so a search costs about n_probe / n_lists of a brute force one.
+    n_probe = n_lists gives exact results. Cosine indexes store unit
+    vectors and score with inner products. The index is trained once on a
+    representative sample of at least n_lists vectors, which only fixes
+    the centroids; vectors can then be added at any time. Adding an id
+    that is already indexed replaces its vector.
+    '''
+    def __init__(self, n_lists=256, n_probe=8, metric='cosine', seed=0):
+        '''
+        n_lists: Number of k-means clusters the vectors are split into
+        n_probe: Lists searched per query by default
+        metric: cosine (scores are cosine similarities) or l2 (scores are negative squared distances)
+        '''
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.metric = metric
+        self.seed = seed
+        self.centroids = None
+        # Per list: vectors, ids, and chunks added since the last consolidation
+        self._vectors = []
+        self._ids = []
+        self._pending = []
+        self._norms = []
+        # id -> list holding its vector
+        self._list_of = {}
+
+    def __len__(self):
+        return sum(len(ids) for ids in self._ids) + sum(len(ids) for chunks in self._pending for ids, _ in chunks)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def _prepare(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        return _normalize(vectors) if self.metric == 'cosine' else vectors
+
+    def train(self, vectors, n_iter=20):
+        '''
+        Fits the list centroids with k-means on (a sample of) vectors
+        '''
+        rng = np.random.default_rng(self.seed)
+        n_lists = self.n_lists
+        # Fewer vectors than lists would leave lists without a centroid
+        if len(vectors) < n_lists:
+            raise ValueError(f"Training needs at least n_lists={n_lists} vectors, got {len(vectors)}")
+        # Sample before converting, so a memory-mapped array is never read whole
+        if len(vectors) > n_lists * TRAIN_POINTS_PER_LIST:
+            sample = np.sort(rng.choice(len(vectors), n_lists * TRAIN_POINTS_PER_LIST, replace=False))
+            vectors = vectors[sample]
+        vectors = self._prepare(vectors)
+
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            labels = _assign(vectors, centroids, self.metric)
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, vectors)
+            empty = counts == 0
+            centroids[~empty] = sums[~empty] / counts[~empty, None]
+            # Restart empty lists from random vectors
+            if empty.any():
+                centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            if self.metric == 'cosine':
+                centroids = _normalize(centroids)
+
+        self.centroids = centroids.astype(np.float32)
+        self._vectors = [np.empty((0, centroids.shape[1]), dtype=np.float32) for _ in range(n_lists)]
+        self._ids = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+        self._norms = [np.empty(0, dtype=np.float32) for _ in range(n_lists)]
+        self._pending = [[] for _ in range(n_lists)]
+        self._list_of = {}
+        return self
+
+    def add(self, ids, vectors):
+        '''
+        Adds vectors with their integer ids. Ids already in the index have
+        their vector replaced; an id repeated within vectors keeps its last one.
+        '''
+        if not self.is_trained:
+            raise ValueError("The index must be trained before vectors are added")
+        vectors = self._prepare(vectors)
+        ids = np.asarray(list(ids), dtype=np.int64)
+        if len(ids) != len(vectors):
+            raise ValueError("Expected one vector per id")
+
+        # Last occurrence of every id in the batch
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = np.sort(len(ids) - 1 - last)
+        ids, vectors = ids[keep], vectors[keep]
+        self._remove([article_id for article_id in ids.tolist() if article_id in self._list_of])
+
+        labels = _assign(vectors, self.centroids, self.metric)
+        self._list_of.update(zip(ids.tolist(), labels.tolist()))
+        order = np.argsort(labels, kind='stable')
+        bounds = np.searchsorted(labels[order], np.arange(self.n_lists + 1))
+        for list_id in np.flatnonzero(np.diff(bounds)):
+            rows = order[bounds[list_id]:bounds[list_id + 1]]
+            self._pending[list_id].append((ids[rows], vectors[rows]))
+
+    def _remove(self, ids):
+        # Drop the stored vectors of ids, list by list
+        lists = {}
+        for article_id in ids:
+            lists.setdefault(self._list_of.pop(article_id), []).append(article_id)
+        for list_id, list_ids in lists.items():
+            self._consolidate(list_id)
+            keep = ~np.isin(self._ids[list_id], list_ids)
+            self._ids[list_id] = self._ids[list_id][keep]
+            self._vectors[list_id] = self._vectors[list_id][keep]
+            self._norms[list_id] = self._norms[list_id][keep]
+
+    def _consolidate(self, list_id):
+        # Merge the chunks added to a list into one array before it is searched
+        if self._pending[list_id]:
+            chunks = self._pending[list_id]
+            self._ids[list_id] = np.concatenate([self._ids[list_id]] + [ids for ids, _ in chunks])
+            self._vectors[list_id] = np.concatenate([self._vectors[list_id]] + [vectors for _, vectors in chunks])
+            self._norms[list_id] = (self._vectors[list_id] ** 2).sum(axis=1)
+            self._pending[list_id] = []
+
+    def search(self, queries, k=10, n_probe=None):
+        '''
+        Returns (ids, scores), two (n_queries, k) arrays of the best matches
+        of every query, best first. Slots without a match hold id -1 and
+        score -inf.
+        '''
+        if not self.is_trained:
+            raise ValueError("The index is empty")
+        queries = self._prepare(queries)
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+
+        result_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        result_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for offset in range(0, len(queries), SEARCH_BATCH_SIZE):
+            batch = queries[offset:offset + SEARCH_BATCH_SIZE]
+            ids, scores = self._search_batch(batch, k, n_probe)
+            result_ids[offset:offset + len(batch)] = ids
+            result_scores[offset:offset + len(batch)] = scores
+        return result_ids, result_scores
+
+    def _search_batch(self, queries, k, n_probe):
+        centroid_scores = _scores(queries, self.centroids, self.metric)
+        if n_probe < self.n_lists:
+            probes = np.argpartition(-centroid_scores, n_probe - 1, axis=1)[:, :n_probe]
+        else:
+            probes = np.broadcast_to(np.arange(self.n_lists), (len(queries), self.n_lists))
+
+        best_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        # Score every probed list against all the queries probing it at once
+        for list_id in np.unique(probes):
+            self._consolidate(list_id)
+            if len(self._ids[list_id]) == 0:
+                continue
+            rows = np.flatnonzero((probes == list_id).any(axis=1))
+            scores = _scores(queries[rows], self._vectors[list_id], self.metric, self._norms[list_id])
+            candidate_scores = np.hstack([best_scores[rows], scores])
+            candidate_ids = np.hstack([best_ids[rows], np.broadcast_to(self._ids[list_id], scores.shape)])
+            top = np.argpartition(-candidate_scores, k - 1, axis=1)[:, :k] if candidate_scores.shape[1] > k \
+                else np.broadcast_to(np.arange(candidate_scores.shape[1]), (len(rows), candidate_scores.shape[1]))
+            best_scores[rows] = np.take_along_axis(candidate_scores, top, axis=1)
+            best_ids[rows] = np.take_along_axis(candidate_ids, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        return np.take_along_axis(best_ids, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def items(self):
+        '''
+        Yields (ids, vectors) for every list, the vectors as stored (unit length for cosine)
+        '''
+        for list_id in range(self.n_lists if self.is_trained else 0):
+            self._consolidate(list_id)
+            if len(self._ids[list_id]):
+                yield self._ids[list_id], self._vectors[list_id]
+
+    def save(self, path):
+        '''
+        Saves the index to one .npz file
+        '''
+        if not self.is_trained:
+            raise ValueError("The index is empty")
+        for list_id in range(self.n_lists):
+            self._consolidate(list_id)
+        np.savez(
+            path,
+            params=np.array([self.n_lists, self.n_probe, self.seed]),
+            metric=np.array(self.metric),
+            centroids=self.centroids,
+            sizes=np.array([len(ids) for ids in self._ids]),
+            ids=np.concatenate(self._ids),
+            vectors=np.concatenate(self._vectors),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            n_lists, n_probe, seed = (int(value) for value in data['params'])
+            index = cls(n_lists, n_probe, str(data['metric']), seed)
+            index.centroids = data['centroids']
+            bounds = np.concatenate([[0], np.cumsum(data['sizes'])])
+            ids = data['ids']
+            vectors = data['vectors']
+        index._ids = [ids[bounds[i]:bounds[i + 1]] for i in range(n_lists)]
+        index._vectors = [vectors[bounds[i]:bounds[i + 1]] for i in range(n_lists)]
+        index._norms = [(list_vectors ** 2).sum(axis=1) for list_vectors in index._vectors]
+        index._pending = [[] for _ in range(n_lists)]
+        index._list_of = {article_id: list_id for list_id, list_ids in enumerate(index._ids)
+                          for article_id in list_ids.tolist()}
+        return index
+
+
+# Function to build an index over the vectors of an EmbeddingStore, reading them block by block
+def index_store(store, n_lists=None, n_probe=8, metric='cosine', block_size=100000):
+    '''
+    n_lists defaults to about the square root of the number of vectors
+    '''
+    if len(store) == 0:
+        raise ValueError("The embedding store is empty")
+    if n_lists is None:
+        n_lists = int(min(max(np.sqrt(len(store)), 1), 4096))
+    index = IVFIndex(n_lists, n_probe, metric)
+    vectors = store.vectors()
+    ids = store.ids
+    index.train(vectors)
+    for offset in range(0, len(store), block_size):
+        index.add(ids[offset:offset + block_size], vectors[offset:offset + block_size])
+    return index
+
+# Function to find pairs of indexed articles scoring at least threshold against each other
+def near_duplicates(index, threshold=0.9, k=10, n_probe=None):
+    '''
+    Queries every indexed vector against the index and returns a DataFrame
+    of (id_a, id_b, score) pairs with id_a < id_b, each pair once. Only the
+    k best matches of each vector are considered.
+    '''
+    pairs = []
+    for ids, vectors in index.items():
+        for offset in range(0, len(ids), SEARCH_BATCH_SIZE):
+            query_ids = ids[offset:offset + SEARCH_BATCH_SIZE]
+            # One extra neighbour, as every vector finds itself
+            match_ids, scores = index.search(vectors[offset:offset + SEARCH_BATCH_SIZE], k + 1, n_probe)
+            source = np.broadcast_to(query_ids[:, None], match_ids.shape)
+            keep = (scores >= threshold) & (match_ids >= 0) & (match_ids != source)
+            pairs.append(pd.DataFrame({'id_a': source[keep], 'id_b': match_ids[keep], 'score': scores[keep]}))
+
+    if not pairs:
+        return pd.DataFrame({'id_a': pd.Series(dtype='int64'), 'id_b': pd.Series(dtype='int64'),
+                             'score': pd.Series(dtype='float32')})
+    pairs = pd.concat(pairs, ignore_index=True)
+    # A pair can be found from both sides, keep it once with the smaller id first
+    swap = pairs['id_a'] > pairs['id_b']
+    pairs.loc[swap, ['id_a', 'id_b']] = pairs.loc[swap, ['id_b', 'id_a']].to_numpy()
+    pairs = pairs.sort_values('score', ascending=False).drop_duplicates(['id_a', 'id_b'])
+    return pairs.sort_values(['id_a', 'id_b']).reset_index(drop=True)
+
+# Function to group indexed articles into stories: connected components of the near-duplicate pairs
+def cluster_stories(index, threshold=0.8, k=10, n_probe=None):
+    '''
+    Returns a Series mapping every indexed id to a story id, the smallest
+    article id of its story. Articles without a match form their own story.
+    '''
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    ids = np.concatenate([list_ids for list_ids, _ in index.items()] or [np.empty(0, dtype=np.int64)])
+    ids = np.sort(ids)
+    pairs = near_duplicates(index, threshold, k, n_probe)
+    rows = np.searchsorted(ids, pairs['id_a'].to_numpy())
+    columns = np.searchsorted(ids, pairs['id_b'].to_numpy())
+    graph = coo_matrix((np.ones(len(rows)), (rows, columns)), shape=(len(ids), len(ids)))
+    _, labels = connected_components(graph, directed=False)
+
+    stories = pd.Series(ids, index=ids).groupby(labels).transform('min')
+    stories.index.name = 'article_id'
+    stories.name = 'story_id'
+    return stories
+
+# Function to list the stories covered by more than one site
+def cross_site_stories(stories, articles, id_column='article_id', source_column='source_name'):
+    '''
+    stories: Series from cluster_stories
+    articles: DataFrame with the id and source of the articles
+    Returns one row per story reported by several sources, with the number
+    of articles, the number of sources and the sources themselves.
+    '''
+    merged = articles[[id_column, source_column]].merge(
+        stories.rename('story_id'), left_on=id_column, right_index=True
+    )
+    summary = merged.groupby('story_id', observed=True).agg(
+        n_articles=(id_column, 'size'),
+        n_sources=(source_column, 'nunique'),
+        sources=(source_column, lambda sources: sorted(set(sources))),
+    )
+    return summary[summary['n_sources'] > 1].sort_values('n_sources', ascending=False)
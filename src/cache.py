@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from src import db
+
+
+class TTLCache:
+    '''
+    A thread-safe in-process cache whose entries expire after ttl seconds.
+
+    At most max_entries values are kept, the least recently used one is
+    dropped first. Each entry also remembers a version; asking for another
+    version counts as a miss.
+    '''
+    def __init__(self, ttl=600, max_entries=128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, version, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, entry_version, value = entry
+                if expires_at > time.monotonic() and entry_version == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, version=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute, version=None):
+        # None is never cached, the db readers return it on errors
+        missing = object()
+        value = self.get(key, version, missing)
+        if value is missing:
+            value = compute()
+            if value is not None:
+                self.set(key, value, version)
+        return value
+
+    def invalidate(self, predicate=None):
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if predicate(key)]:
+                    del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DashboardData:
+    '''
+    Cached data access for the Streamlit dashboard.
+
+    Results are tied to the MAX(id) of the tables they read, which is
+    re-checked at most every check_interval seconds. The per-source daily
+    counts are fetched once and every date window is derived from them in
+    memory, so changing the dates does not query the database again.
+    '''
+    def __init__(self, ttl=600, max_entries=128, check_interval=10):
+        self.cache = TTLCache(ttl, max_entries)
+        self.check_interval = check_interval
+        self._versions = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def table_versions(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= self.check_interval:
+                versions = db.read_table_versions()
+                # Keep the previous versions if the check fails, the TTL still applies
+                if versions is not None:
+                    self._versions = versions
+                self._checked_at = now
+            return self._versions
+
+    def _cached(self, key, tables, compute):
+        versions = self.table_versions()
+        version = tuple(versions.get(table) for table in tables)
+        return self.cache.get_or_compute(key, compute, version)
+
+    def invalidate(self):
+        self.cache.invalidate()
+        with self._lock:
+            self._checked_at = None
+
+    def date_range(self):
+        return self._cached(("date_range",), ("articles",), db.read_article_date_range)
+
+    def daily_counts_by_source(self):
+        def compute():
+            df = db.daily_article_counts_by_source()
+            if df is not None:
+                df["published_date"] = pd.to_datetime(df["published_date"])
+            return df
+        return self._cached(("daily_counts_by_source",), ("articles",), compute)
+
+    def counts_by_source(self, start_date=None, end_date=None):
+        '''
+        Article count per source for start_date <= published date < end_date
+        '''
+        def compute():
+            daily = self.daily_counts_by_source()
+            if daily is None:
+                return None
+            mask = pd.Series(True, index=daily.index)
+            if start_date is not None:
+                mask &= daily["published_date"] >= pd.Timestamp(start_date)
+            if end_date is not None:
+                mask &= daily["published_date"] < pd.Timestamp(end_date)
+            return (daily[mask].groupby("source_name", as_index=False)["article_count"].sum()
+                    .sort_values("article_count", ascending=False, ignore_index=True))
+        return self._cached(("counts_by_source", start_date, end_date), ("articles",), compute)
+
+    def daily_counts(self):
+        '''
+        Article count per published date, including articles without a source
+        '''
+        def compute():
+            df = db.daily_article_counts()
+            if df is not None:
+                df["published_date"] = pd.to_datetime(df["published_date"])
+            return df
+        return self._cached(("daily_counts",), ("articles",), compute)
+
+    def domains_by_country(self):
+        return self._cached(("domains_by_country",), ("domains", "domain_locations"), db.count_domains_by_country)
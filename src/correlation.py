@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+from src.joins import DomainDictionary
+
+# Rows of the correlation matrix computed at a time
+CORRELATION_BLOCK_SIZE = 1024
+
+# Largest domain x topic matrix whose transpose is made dense for the block products
+DENSE_TRANSPOSE_LIMIT = 50_000_000
+
+METHODS = ('pearson', 'cosine')
+
+
+# Function to count the articles of every (domain, topic) pair as a sparse domain x topic matrix
+def domain_topic_matrix(data, domain_column='domain', topic_column='topic', dictionary=None, drop_outliers=False):
+    '''
+    data: DataFrame or iterable of DataFrame chunks with a domain and a topic column
+    dictionary: DomainDictionary giving the row of every domain, a new one by default
+    drop_outliers: Skip BERTopic's outlier topic -1
+    Returns (counts, domains, topics): a CSR matrix holding the same
+    counts as pd.crosstab(domain, topic), and the domain and topic labels
+    of its rows and columns.
+    '''
+    from scipy.sparse import coo_matrix
+
+    if dictionary is None:
+        dictionary = DomainDictionary()
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+    topic_codes = {}
+    rows, columns = [], []
+    for chunk in chunks:
+        chunk = chunk[chunk[domain_column].notna() & chunk[topic_column].notna()]
+        if drop_outliers:
+            chunk = chunk[chunk[topic_column] != -1]
+        rows.append(dictionary.encode(chunk[domain_column]))
+        local_codes, uniques = pd.factorize(chunk[topic_column])
+        mapping = np.array([topic_codes.setdefault(topic, len(topic_codes)) for topic in uniques], dtype=np.int64)
+        columns.append(mapping[local_codes] if len(mapping) else local_codes.astype(np.int64))
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    columns = np.concatenate(columns) if columns else np.empty(0, dtype=np.int64)
+    counts = coo_matrix((np.ones(len(rows), dtype=np.float64), (rows, columns)),
+                        shape=(len(dictionary), len(topic_codes))).tocsr()
+
+    # Keep only the domains with articles, with rows and columns in sorted label order like crosstab
+    used = np.flatnonzero(np.asarray(counts.sum(axis=1)).ravel() > 0)
+    domains = dictionary.categories[used]
+    domain_order = np.argsort(domains.to_numpy(dtype=object), kind='stable')
+    topics = pd.Index(list(topic_codes))
+    topic_order = np.argsort(topics.to_numpy(), kind='stable')
+    counts = counts[used[domain_order]][:, topic_order]
+    return counts, domains[domain_order], topics[topic_order]
+
+# Function to compute the statistics that turn a block of row dot products into correlations
+def _row_statistics(matrix, method):
+    n_columns = matrix.shape[1]
+    sums = np.asarray(matrix.sum(axis=1)).ravel()
+    squares = np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()
+    if method == 'cosine':
+        return np.zeros_like(sums), np.sqrt(squares)
+    means = sums / n_columns
+    # Population standard deviation times the number of columns: the norm of the centred row
+    scales = np.sqrt(np.maximum(squares - n_columns * means ** 2, 0))
+    return means, scales
+
+# Function to yield the correlation of every block of rows with all the rows
+def correlation_blocks(matrix, method='pearson', block_size=CORRELATION_BLOCK_SIZE):
+    '''
+    Yields (start, block) with block the dense (rows start..start+len(block)) x
+    n_rows correlation matrix, computed from row dot products so the matrix
+    is never centred, and only densified when it is small enough. Rows with
+    no variance (pearson) or no counts (cosine) have NaN correlations, as
+    DataFrame.corr gives.
+    '''
+    if method not in METHODS:
+        raise ValueError(f"Unknown correlation method: {method}")
+    matrix = matrix.tocsr().astype(np.float64)
+    n_columns = matrix.shape[1]
+    means, scales = _row_statistics(matrix, method)
+    # Sparse x sparse products are slow once the blocks fill up; when the
+    # transpose fits in memory the blocks are multiplied densely with BLAS
+    dense = matrix.shape[0] * matrix.shape[1] <= DENSE_TRANSPOSE_LIMIT
+    transposed = matrix.T.toarray() if dense else matrix.T.tocsc()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, matrix.shape[0], block_size):
+            stop = min(start + block_size, matrix.shape[0])
+            if dense:
+                products = matrix[start:stop].toarray() @ transposed
+            else:
+                products = (matrix[start:stop] @ transposed).toarray()
+            # x.y minus the part due to the means gives the dot product of the centred rows
+            products -= n_columns * np.outer(means[start:stop], means)
+            block = products / np.outer(scales[start:stop], scales)
+            block[~np.isfinite(block)] = np.nan
+            yield start, np.clip(block, -1, 1)
+
+# Function to find the k most correlated pairs of rows without building the full correlation matrix
+def top_correlated_pairs(matrix, labels=None, k=100, method='pearson', block_size=CORRELATION_BLOCK_SIZE):
+    '''
+    Returns a DataFrame of the k pairs (a, b) with a before b in the row
+    order and the highest correlation, sorted by decreasing correlation.
+    Only k candidates per block are kept, so memory stays at one block.
+    '''
+    best_scores = np.empty(0)
+    best_rows = np.empty(0, dtype=np.int64)
+    best_columns = np.empty(0, dtype=np.int64)
+    n_rows = matrix.shape[0]
+    for start, block in correlation_blocks(matrix, method, block_size):
+        # Only pairs above the diagonal, each pair once
+        rows = np.arange(start, start + len(block))[:, None]
+        block = np.where(np.arange(n_rows)[None, :] > rows, block, np.nan)
+        flat = np.nan_to_num(block, nan=-np.inf).ravel()
+        n_candidates = min(k, int(np.isfinite(flat).sum()))
+        if n_candidates == 0:
+            continue
+        candidates = np.argpartition(-flat, n_candidates - 1)[:n_candidates]
+        best_scores = np.concatenate([best_scores, flat[candidates]])
+        best_rows = np.concatenate([best_rows, start + candidates // n_rows])
+        best_columns = np.concatenate([best_columns, candidates % n_rows])
+        if len(best_scores) > k:
+            keep = np.argpartition(-best_scores, k - 1)[:k]
+            best_scores, best_rows, best_columns = best_scores[keep], best_rows[keep], best_columns[keep]
+
+    order = np.lexsort((best_columns, best_rows, -best_scores))
+    labels = pd.Index(labels if labels is not None else np.arange(n_rows))
+    return pd.DataFrame({
+        'site_a': labels[best_rows[order]],
+        'site_b': labels[best_columns[order]],
+        'correlation': best_scores[order],
+    })
+
+# Function to find the most correlated pairs of news sites from the topics of their articles
+def site_correlation(data, k=100, method='pearson', domain_column='domain', topic_column='topic',
+                     drop_outliers=False, block_size=CORRELATION_BLOCK_SIZE):
+    '''
+    Sites are compared by their article counts per topic, i.e. the rows of
+    pd.crosstab(domain, topic). data can be the full article set or an
+    iterable of DataFrame chunks.
+    '''
+    counts, domains, _ = domain_topic_matrix(data, domain_column, topic_column, drop_outliers=drop_outliers)
+    return top_correlated_pairs(counts, domains, k, method, block_size)
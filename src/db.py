@@ -1,8 +1,17 @@
 import os
+import io
+import time
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
 import psycopg2
 import pandas as pd
 import numpy as np
 from psycopg2 import sql
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError
 
 # Database connection parameters
 DB_NAME = os.getenv("DB_NAME")
@@ -11,6 +20,29 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT", "5432")  # Default to 5432 if not set
 
+# Connection pool parameters
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_CHECK_AFTER = float(os.getenv("DB_POOL_CHECK_AFTER", "30"))  # Ping connections idle longer than this
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "").lower() in ("1", "true", "yes")
+
+# Columns of the 'articles' table filled from the rating DataFrame (domain_id is resolved separately)
+ARTICLE_COLUMNS = [
+    'source_name', 'author', 'title', 'description', 'url', 'url_to_image',
+    'published_at', 'content', 'category', 'article', 'title_sentiment'
+]
+
+# All columns of the 'articles' table and the long text ones the streaming readers skip by default
+ARTICLE_TABLE_COLUMNS = ['id'] + ARTICLE_COLUMNS + ['domain_id']
+ARTICLE_TEXT_COLUMNS = ['content', 'article']
+
+# Default number of articles sent to the server per COPY/INSERT batch
+BULK_CHUNK_SIZE = 10000
+
+# Default number of rows fetched per round trip by the streaming readers
+STREAM_CHUNK_SIZE = 10000
+
 # SQL commands to create the tables
 create_tables_commands = [
     """
@@ -72,390 +104,861 @@ create_tables_commands = [
     """
 ]
 
-# Function to create tables in the PostgreSQL database
+# SQL commands adding secondary indexes and making domain names unique
+create_indexes_commands = [
+    # Point every reference to a duplicated domain name at its lowest id before dropping the duplicates
+    """
+    UPDATE articles a SET domain_id = k.keep_id
+    FROM (SELECT id, MIN(id) OVER (PARTITION BY domain_name) AS keep_id FROM domains) k
+    WHERE a.domain_id = k.id AND k.id <> k.keep_id;
+    """,
+    """
+    UPDATE traffic_data t SET domain_id = k.keep_id
+    FROM (SELECT id, MIN(id) OVER (PARTITION BY domain_name) AS keep_id FROM domains) k
+    WHERE t.domain_id = k.id AND k.id <> k.keep_id;
+    """,
+    """
+    UPDATE domains d SET domain_locations_id = k.location_id
+    FROM (SELECT domain_name, MIN(domain_locations_id) AS location_id FROM domains GROUP BY domain_name) k
+    WHERE d.domain_name = k.domain_name AND d.domain_locations_id IS NULL AND k.location_id IS NOT NULL;
+    """,
+    """
+    DELETE FROM domains d USING domains k
+    WHERE d.domain_name = k.domain_name AND d.id > k.id;
+    """,
+    """
+    ALTER TABLE domains ADD CONSTRAINT domains_domain_name_key UNIQUE (domain_name);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS articles_published_at_idx ON articles (published_at);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS articles_domain_id_idx ON articles (domain_id);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS traffic_data_domain_id_idx ON traffic_data (domain_id);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS domains_domain_locations_id_idx ON domains (domain_locations_id);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS domain_locations_location_country_idx ON domain_locations (location, country);
+    """
+]
+
+# SQL commands creating the daily per-domain article and sentiment rollup
+create_rollups_commands = [
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS daily_domain_article_stats AS
+    SELECT
+      published_at::date AS published_date,
+      domain_id,
+      COUNT(*) AS article_count,
+      COUNT(*) FILTER (WHERE title_sentiment = 'Positive') AS positive_count,
+      COUNT(*) FILTER (WHERE title_sentiment = 'Neutral') AS neutral_count,
+      COUNT(*) FILTER (WHERE title_sentiment = 'Negative') AS negative_count
+    FROM articles
+    WHERE published_at IS NOT NULL
+    GROUP BY 1, 2;
+    """,
+    # Required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS daily_domain_article_stats_key
+    ON daily_domain_article_stats (published_date, domain_id);
+    """
+]
+
+# Schema versions applied in order by create_database: (version, description, commands)
+migrations = [
+    (1, "create tables", create_tables_commands),
+    (2, "secondary indexes and unique domain names", create_indexes_commands),
+    (3, "daily per-domain article rollups", create_rollups_commands),
+]
+
+# Lock key serialising concurrent create_database calls
+MIGRATION_LOCK_ID = 7310520
+
+# Function to open a new connection to the PostgreSQL database
+def _connect(pgbouncer=False):
+    params = dict(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT
+    )
+    # PgBouncer rejects unknown startup parameters, so only talk to Postgres directly with them
+    if not pgbouncer:
+        params.update(application_name="news_correlation", keepalives=1)
+    return psycopg2.connect(**params)
+
+
+class ConnectionPool:
+    '''
+    A thread-safe pool of database connections.
+
+    Connections idle for longer than check_after seconds are pinged with
+    SELECT 1 on checkout and replaced when broken. In pgbouncer mode the
+    connections are opened without startup parameters PgBouncer would
+    reject, and only minconn idle connections are kept since PgBouncer
+    already pools the server connections behind them.
+    '''
+    def __init__(self, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, connect=None,
+                 pgbouncer=DB_PGBOUNCER, timeout=DB_POOL_TIMEOUT, check_after=DB_POOL_CHECK_AFTER):
+        '''
+        connect: Callable returning a new DB-API connection, psycopg2.connect by default
+        '''
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Pool sizes must satisfy 0 <= minconn <= maxconn and maxconn >= 1")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.pgbouncer = pgbouncer
+        self.timeout = timeout
+        self.check_after = check_after
+        self.connect = connect or (lambda: _connect(pgbouncer))
+        self.closed = False
+
+        self._idle = deque()  # (connection, returned_at) pairs
+        self._size = 0
+        self._cond = threading.Condition()
+
+        for _ in range(minconn):
+            self._idle.append((self.connect(), time.monotonic()))
+            self._size += 1
+
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self.closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn, returned_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise PoolError("connection pool exhausted")
+
+        # Connecting and pinging happen outside the lock so other threads are not blocked
+        try:
+            if conn is not None and not self._is_healthy(conn, returned_at):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self.connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, close=False):
+        if not close and not conn.closed:
+            try:
+                # Never hand out a connection in the middle of a transaction
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                close = True
+
+        with self._cond:
+            if self.pgbouncer and len(self._idle) >= self.minconn:
+                close = True
+            if close or conn.closed or self.closed:
+                self._discard(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        '''
+        Checks a connection out for the duration of a with block, committing
+        on success and rolling back if the block raises.
+        '''
+        conn = self.getconn()
+        broken = False
+        committed = False
+        try:
+            yield conn
+            conn.commit()
+            committed = True
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            # Domain ids created in the transaction become shared only once it is committed
+            if committed:
+                domain_resolver.commit(conn)
+            else:
+                domain_resolver.rollback(conn)
+            self.putconn(conn, close=broken)
+
+    def closeall(self):
+        with self._cond:
+            self.closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+                self._size -= 1
+            self._cond.notify_all()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Function to return the module-level pool, creating it on first use
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = ConnectionPool()
+        return _pool
+
+# Function to replace the module-level pool, e.g. with other sizes or a stub connect function
+def configure_pool(**kwargs):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = ConnectionPool(**kwargs)
+        return _pool
+
+# Function to close every pooled connection
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+# Function to borrow a pooled connection inside a with block
+def get_connection():
+    return get_pool().connection()
+
+# Function to read the schema versions already applied to the database
+def _applied_migrations(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          version INTEGER PRIMARY KEY,
+          description VARCHAR,
+          applied_at TIMESTAMP DEFAULT now()
+        );
+        """
+    )
+    cursor.execute("SELECT version FROM schema_migrations;")
+    applied = {row[0] for row in cursor.fetchall()}
+
+    # Tables created before migrations were tracked count as version 1
+    if 1 not in applied:
+        cursor.execute("SELECT to_regclass('articles') IS NOT NULL;")
+        if cursor.fetchone()[0]:
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                (1, "existing tables")
+            )
+            applied.add(1)
+
+    return applied
+
+# Function to create or upgrade the tables in the PostgreSQL database
 def create_database():
+    """
+    Applies every migration not yet recorded in schema_migrations, each in
+    its own transaction, so it is safe to run repeatedly.
+    """
     try:
-        # Connect to PostgreSQL server
-        conn = psycopg2.connect(
-            dbname=DB_NAME, 
-            user=DB_USER, 
-            password=DB_PASSWORD, 
-            host=DB_HOST, 
-            port=DB_PORT
-        )
-        conn.autocommit = True
-        cursor = conn.cursor()
-
-        # Create tables
-        for command in create_tables_commands:
-            cursor.execute(command)
+        with get_connection() as conn, conn.cursor() as cursor:
+            for version, description, commands in migrations:
+                # Serialise concurrent runs, then re-read what is applied under the lock
+                cursor.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_ID,))
+                if version in _applied_migrations(cursor):
+                    conn.commit()
+                    continue
+
+                for command in commands:
+                    cursor.execute(command)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                    (version, description)
+                )
+                conn.commit()
+                print(f"Applied migration {version}: {description}")
 
+        domain_resolver.reset()
         print("Tables created successfully!")
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error: {error}")
-    finally:
-        if conn is not None:
-            cursor.close()
-            conn.close()
+
+# Function to recompute the daily per-domain rollups from the articles table
+def refresh_rollups(concurrently=True):
+    """
+    CONCURRENTLY keeps the view readable while it is being refreshed,
+    at the cost of a slower refresh.
+    """
+    try:
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(
+                sql.SQL("REFRESH MATERIALIZED VIEW {}daily_domain_article_stats;").format(
+                    sql.SQL("CONCURRENTLY ") if concurrently else sql.SQL("")
+                )
+            )
+        print("Rollups refreshed successfully!")
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error: {error}")
+
+class DomainResolver:
+    '''
+    In-memory domain_name -> id cache shared by the insert functions.
+
+    The domains table is read once on first use; unknown names are then
+    created together in a single INSERT ... ON CONFLICT ... RETURNING, so
+    names another process or connection inserted since the table was read
+    return their existing id instead of violating UNIQUE(domain_name). Ids
+    created in a transaction are only visible to its own connection until
+    the pool commits it (commit) and are dropped if it rolls back
+    (rollback), so other threads never get an id that may not exist. The
+    cache is shared by the threads of the connection pool and guarded by a lock.
+    '''
+    def __init__(self):
+        '''
+        ids: Dictionary mapping domain names to their committed id in the domains table
+        pending: Ids created by the open transaction of every connection
+        '''
+        self.ids = {}
+        self.pending = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self, cursor):
+        with self.lock:
+            if self.loaded:
+                return
+            # Lowest id wins when a domain name was inserted more than once
+            cursor.execute("SELECT domain_name, id FROM domains ORDER BY id DESC;")
+            self.ids = dict(cursor.fetchall())
+            self.loaded = True
+
+    def reset(self):
+        # Drop the cache, e.g. after the tables were recreated
+        with self.lock:
+            self.ids = {}
+            self.pending = {}
+            self.loaded = False
+
+    def commit(self, conn):
+        # The transaction of conn committed: its new ids are now valid for every connection
+        with self.lock:
+            self.ids.update(self.pending.pop(conn, {}))
+
+    def rollback(self, conn):
+        # The transaction of conn rolled back: the ids it created do not exist
+        with self.lock:
+            self.pending.pop(conn, None)
+
+    def resolve(self, cursor, domain_names, location_ids=None):
+        '''
+        Returns {domain_name: id} for the given names, inserting the missing
+        ones. location_ids optionally maps names to their domain_locations_id.
+        '''
+        self.load(cursor)
+
+        names = list(pd.unique(pd.Series(domain_names, dtype=object).dropna()))
+        location_ids = location_ids or {}
+        conn = cursor.connection
+
+        with self.lock:
+            known = {**self.ids, **self.pending.get(conn, {})}
+        missing = [(name, location_ids.get(name)) for name in names if name not in known]
+        if missing:
+            # The no-op update makes RETURNING give the id of rows that already exist
+            created = dict(execute_values(
+                cursor,
+                """
+                INSERT INTO domains (domain_name, domain_locations_id)
+                VALUES %s
+                ON CONFLICT (domain_name) DO UPDATE SET domain_name = EXCLUDED.domain_name
+                RETURNING domain_name, id;
+                """,
+                missing,
+                page_size=len(missing),
+                fetch=True
+            ))
+            with self.lock:
+                self.pending.setdefault(conn, {}).update(created)
+            known.update(created)
+
+        return {name: known[name] for name in names}
+
+    def get(self, cursor, domain_name):
+        return self.resolve(cursor, [domain_name])[domain_name]
+
+
+# Resolver reused by every insert function in this module
+domain_resolver = DomainResolver()
 
 # Function to insert or get domain ID
 def get_or_insert_domain(cursor, domain_name):
-    cursor.execute(
-        """
-        SELECT id FROM domains WHERE domain_name = %s;
-        """,
-        (domain_name,)
-    )
-    domain_id = cursor.fetchone()
-    
-    if not domain_id:
-        cursor.execute(
-            """
-            INSERT INTO domains (domain_name, domain_locations_id)
-            VALUES (%s, NULL)
-            RETURNING id;
-            """,
-            (domain_name,)
-        )
-        domain_id = cursor.fetchone()[0]
-    else:
-        domain_id = domain_id[0]
-    
-    return domain_id
+    return domain_resolver.get(cursor, domain_name)
 
 # Function to insert data into the 'domain_locations' and 'domains' tables from a DataFrame
 def insert_domain_locations(df):
     location_ids = {}
     
     try:
-        conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
-        cursor = conn.cursor()
-        
-        for _, row in df.iterrows():
-            # Insert or update domain location
-            cursor.execute(
-                """
-                INSERT INTO domain_locations (location, country)
-                VALUES (%s, %s)
-                RETURNING id;
-                """,
-                (row['location'], row['Country'])
-            )
-            location_id = cursor.fetchone()[0]
-            location_ids[row['location']] = location_id
+        with get_connection() as conn, conn.cursor() as cursor:
+            for _, row in df.iterrows():
+                # Insert or update domain location
+                cursor.execute(
+                    """
+                    INSERT INTO domain_locations (location, country)
+                    VALUES (%s, %s)
+                    RETURNING id;
+                    """,
+                    (row['location'], row['Country'])
+                )
+                location_id = cursor.fetchone()[0]
+                location_ids[row['location']] = location_id
 
-        conn.commit()
         print("Domain locations data inserted/updated successfully!")
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error: {error}")
-    finally:
-        if conn is not None:
-            cursor.close()
-            conn.close()
     
     return location_ids
 
 #Function to insert data into the 'domain' table
 def insert_domains(df):
     try:
-        conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
-        cursor = conn.cursor()
-
-        for _, row in df.iterrows():
-            # Fetch domain_locations_id from the domain_locations table
-            cursor.execute(
+        with get_connection() as conn, conn.cursor() as cursor:
+            # Fetch all domain_locations ids at once instead of one SELECT per row
+            cursor.execute("SELECT location, country, id FROM domain_locations;")
+            locations = {(location, country): location_id for location, country, location_id in cursor.fetchall()}
+
+            location_ids = {}
+            for name, location, country in zip(df['SourceCommonName'], df['location'], df['Country']):
+                # Rows without a domain name have nothing to attach the location to
+                if pd.isna(name):
+                    continue
+                location_id = locations.get((location, country))
+                if location_id is not None:
+                    location_ids[name] = location_id
+
+            # Insert the new domains with their location, then attach locations to known domains lacking one
+            domain_ids = domain_resolver.resolve(cursor, list(location_ids), location_ids)
+            execute_values(
+                cursor,
                 """
-                SELECT id FROM domain_locations
-                WHERE location = %s AND country = %s;
+                UPDATE domains SET domain_locations_id = v.location_id
+                FROM (VALUES %s) AS v(id, location_id)
+                WHERE domains.id = v.id AND domains.domain_locations_id IS NULL;
                 """,
-                (row['location'], row['Country'])
+                [(domain_ids[name], location_id) for name, location_id in location_ids.items()],
+                page_size=max(len(location_ids), 1)
             )
-            location_id = cursor.fetchone()
 
-            if location_id:
-                location_id = location_id[0]
-                print(location_id)
-                # Insert into domains
-                cursor.execute(
-                    """
-                    INSERT INTO domains (domain_name, domain_locations_id)
-                    VALUES (%s, %s)
-                    """,
-                    (row['SourceCommonName'], location_id)
-                )
-        
-        conn.commit()
         print("Domains data inserted successfully!")
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error: {error}")
-    finally:
-        if conn is not None:
-            cursor.close()
-            conn.close()
 
 # Function to insert data into the 'traffic_data' table from a DataFrame
 def insert_traffic_data(df):
     try:
-        conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
-        cursor = conn.cursor()
+        with get_connection() as conn, conn.cursor() as cursor:
+            domain_ids = domain_resolver.resolve(cursor, df['Domain'])
 
-        for _, row in df.iterrows():
-            domain_name = row['Domain']
-            
-            # Check if the domain exists and get its ID, or insert it if not
-            cursor.execute(
-                """
-                SELECT id FROM domains WHERE domain_name = %s;
-                """,
-                (domain_name,)
-            )
-            domain_id = cursor.fetchone()
-            
-            if domain_id:
-                domain_id = domain_id[0]
-            else:
-                # Insert new domain if it doesn't exist
+            # Insert traffic data
+            for _, row in df.iterrows():
                 cursor.execute(
                     """
-                    INSERT INTO domains (domain_name)
-                    VALUES (%s)
-                    RETURNING id;
+                    INSERT INTO traffic_data (global_rank, tld_rank, tld, ref_subnets, ref_ips, idn_domain, idn_tld, prev_global_rank, prev_tld_rank, prev_ref_subnets, prev_ref_ips, domain_id)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
                     """,
-                    (domain_name,)
+                    (
+                        row['GlobalRank'], row['TldRank'], row['TLD'], row['RefSubNets'], row['RefIPs'], 
+                        row['IDN_Domain'], row['IDN_TLD'], row['PrevGlobalRank'], row['PrevTldRank'], 
+                        row['PrevRefSubNets'], row['PrevRefIPs'], domain_ids.get(row['Domain'])
+                    )
                 )
-                domain_id = cursor.fetchone()[0]
-            print(domain_id)
-            # Insert traffic data
-            cursor.execute(
-                """
-                INSERT INTO traffic_data (global_rank, tld_rank, tld, ref_subnets, ref_ips, idn_domain, idn_tld, prev_global_rank, prev_tld_rank, prev_ref_subnets, prev_ref_ips, domain_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-                """,
-                (
-                    row['GlobalRank'], row['TldRank'], row['TLD'], row['RefSubNets'], row['RefIPs'], 
-                    row['IDN_Domain'], row['IDN_TLD'], row['PrevGlobalRank'], row['PrevTldRank'], 
-                    row['PrevRefSubNets'], row['PrevRefIPs'], domain_id
-                )
-            )
 
-        conn.commit()
         print("Traffic data inserted successfully!")
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error: {error}")
-    finally:
-        if conn is not None:
-            cursor.close()
-            conn.close()
 
 # Function to insert data into the 'articles' table and handle domains
 def insert_articles(df):
     try:
-        conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
-        cursor = conn.cursor()
+        with get_connection() as conn, conn.cursor() as cursor:
+            domain_ids = domain_resolver.resolve(cursor, df['domain'])
 
-        for _, row in df.iterrows():
-            # Check if the domain exists in the domains table
-            cursor.execute(
-                """
-                SELECT id FROM domains WHERE domain_name = %s;
-                """,
-                (row['domain'],)
-            )
-            result = cursor.fetchone()
+            for _, row in df.iterrows():
+                domain_id = domain_ids.get(row['domain'])
 
-            if result:
-                domain_id = result[0]
-                print(f"Domain ID found for domain: {row['domain']}")
-            else:
-                # Insert the new domain into the domains table
+                # Insert the article into the articles table
                 cursor.execute(
                     """
-                    INSERT INTO domains (domain_name)
-                    VALUES (%s)
-                    RETURNING id;
+                    INSERT INTO articles (source_name, author, title, description, url, url_to_image, published_at, content, category, article, title_sentiment, domain_id)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
                     """,
-                    (row['domain'],)
+                    (
+                        row['source_name'], row['author'], row['title'], row['description'], 
+                        row['url'], row['url_to_image'], row['published_at'], row['content'], 
+                        row['category'], row['article'], row['title_sentiment'], domain_id
+                    )
                 )
-                domain_id = cursor.fetchone()[0]
-                print(f"Domain ID created for domain: {row['domain']}")
 
-            # Insert the article into the articles table
-            cursor.execute(
-                """
-                INSERT INTO articles (source_name, author, title, description, url, url_to_image, published_at, content, category, article, title_sentiment, domain_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-                """,
-                (
-                    row['source_name'], row['author'], row['title'], row['description'], 
-                    row['url'], row['url_to_image'], row['published_at'], row['content'], 
-                    row['category'], row['article'], row['title_sentiment'], domain_id
-                )
-            )
-
-        conn.commit()
         print("Articles data inserted successfully!")
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error: {error}")
-    finally:
-        if conn is not None:
-            cursor.close()
-            conn.close()
+
+# Function to stream one chunk of articles into the 'articles' table with COPY FROM STDIN
+def _copy_articles(cursor, records):
+    buffer = io.StringIO()
+    records.to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+    cursor.copy_expert(
+        sql.SQL("COPY articles ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')").format(
+            sql.SQL(', ').join(map(sql.Identifier, records.columns))
+        ),
+        buffer
+    )
+
+# Function to insert one chunk of articles with a multi-row INSERT
+def _insert_article_values(cursor, records):
+    execute_values(
+        cursor,
+        sql.SQL("INSERT INTO articles ({}) VALUES %s").format(
+            sql.SQL(', ').join(map(sql.Identifier, records.columns))
+        ),
+        list(records.astype(object).where(records.notna(), None).itertuples(index=False, name=None)),
+        page_size=len(records)
+    )
+
+# Function to bulk load articles in chunks, resolving all domain IDs up front
+def insert_articles_bulk(df, chunk_size=BULK_CHUNK_SIZE, method="copy"):
+    """
+    Loads articles with COPY FROM STDIN (method="copy") or batched
+    multi-row INSERTs (method="values"), chunk_size rows at a time.
+    Returns the number of inserted rows.
+    """
+    if method not in ("copy", "values"):
+        raise ValueError(f"Unknown bulk insert method: {method}")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+
+    write_chunk = _copy_articles if method == "copy" else _insert_article_values
+    inserted = 0
+    started = time.perf_counter()
+
+    try:
+        with get_connection() as conn, conn.cursor() as cursor:
+            domain_ids = domain_resolver.resolve(cursor, df['domain'])
+
+            for offset in range(0, len(df), chunk_size):
+                chunk = df.iloc[offset:offset + chunk_size]
+                records = chunk[ARTICLE_COLUMNS].copy()
+                records['domain_id'] = chunk['domain'].map(domain_ids).astype('Int64')
+                write_chunk(cursor, records)
+                inserted += len(records)
+
+        elapsed = time.perf_counter() - started
+        rate = inserted / elapsed if elapsed > 0 else float('inf')
+        print(f"Inserted {inserted} articles in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error: {error}")
+        inserted = 0
+
+    return inserted
+
+# Function to build the start_date <= column < end_date predicates and their parameters
+def _date_conditions(start_date=None, end_date=None, column="published_at"):
+    conditions = []
+    params = []
+    if start_date is not None:
+        conditions.append(sql.SQL("{} >= %s").format(sql.Identifier(column)))
+        params.append(start_date)
+    if end_date is not None:
+        conditions.append(sql.SQL("{} < %s").format(sql.Identifier(column)))
+        params.append(end_date)
+    return conditions, params
+
+# Function to run a query and return its result set as a DataFrame
+def _read_query(query, params=None):
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        colnames = [desc[0] for desc in cursor.description]
+        return pd.DataFrame(rows, columns=colnames)
+
+# Function to add an optional WHERE clause built by _date_conditions to a query
+def _where(query, conditions):
+    if not conditions:
+        return query
+    return sql.SQL("{} WHERE {}").format(query, sql.SQL(' AND ').join(conditions))
+
+# Function to stream a table through a server-side cursor as DataFrame chunks
+def stream_table(table, columns=None, chunk_size=STREAM_CHUNK_SIZE, conditions=None, params=None):
+    """
+    Yields DataFrames of at most chunk_size rows from a named (server-side)
+    cursor, so only one chunk is held in memory at a time. conditions is a
+    list of sql.Composable predicates joined with AND, filled from params.
+    At least one, possibly empty, chunk is yielded.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+
+    query = sql.SQL("SELECT {} FROM {}").format(
+        sql.SQL(', ').join(map(sql.Identifier, columns)) if columns else sql.SQL('*'),
+        sql.Identifier(table)
+    )
+    query = _where(query, conditions)
+
+    with get_connection() as conn:
+        with conn.cursor(name=f"stream_{table}_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(query, params)
+
+            first = True
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows and not first:
+                    break
+                column_names = [desc[0] for desc in cursor.description]
+                yield pd.DataFrame(rows, columns=column_names)
+                if len(rows) < chunk_size:
+                    break
+                first = False
+
+# Function to stream the 'articles' table with column projection and date-range pushdown
+def stream_articles(chunk_size=STREAM_CHUNK_SIZE, columns=None, include_text=False, start_date=None, end_date=None):
+    """
+    Yields article DataFrame chunks. Without explicit columns the long
+    'content' and 'article' columns are skipped unless include_text is set.
+    start_date/end_date select start_date <= published_at < end_date.
+    """
+    if columns is None and not include_text:
+        columns = [column for column in ARTICLE_TABLE_COLUMNS if column not in ARTICLE_TEXT_COLUMNS]
+
+    conditions, params = _date_conditions(start_date, end_date)
+    yield from stream_table('articles', columns, chunk_size, conditions, params)
 
 #function to read from the article table
-def read_articles():
+def read_articles(columns=None, include_text=True, start_date=None, end_date=None, chunk_size=STREAM_CHUNK_SIZE):
     try:
-        # Connect to the PostgreSQL database
-        conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
+        # Build the DataFrame from streamed chunks instead of one big list of tuples
+        chunks = stream_articles(chunk_size, columns, include_text, start_date, end_date)
+        return pd.concat(chunks, ignore_index=True)
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error: {error}")
+        return None
+
+# Function to read the earliest and latest publication time of the articles
+def read_article_date_range():
+    try:
+        df = _read_query("SELECT MIN(published_at) AS min_published_at, MAX(published_at) AS max_published_at FROM articles;")
+        return df.iloc[0]['min_published_at'], df.iloc[0]['max_published_at']
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error: {error}")
+        return None, None
+
+# Function to count the articles of each source published in [start_date, end_date)
+def count_articles_by_source(start_date=None, end_date=None):
+    try:
+        conditions, params = _date_conditions(start_date, end_date)
+        conditions.append(sql.SQL("source_name IS NOT NULL"))
+        query = sql.SQL("{} GROUP BY source_name ORDER BY article_count DESC;").format(
+            _where(sql.SQL("SELECT source_name, COUNT(*) AS article_count FROM articles"), conditions)
         )
-        cursor = conn.cursor()
+        return _read_query(query, params)
 
-        # Execute a query to read data from the 'articles' table
-        query = "SELECT * FROM articles;"
-        cursor.execute(query)
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error: {error}")
+        return None
 
-        # Fetch all rows from the executed query
-        rows = cursor.fetchall()
+# Function to count the articles published per day in [start_date, end_date)
+def daily_article_counts(start_date=None, end_date=None, use_rollup=False):
+    """
+    With use_rollup the counts are summed from daily_domain_article_stats,
+    which is only as fresh as the last refresh_rollups() call.
+    """
+    try:
+        if use_rollup:
+            conditions, params = _date_conditions(start_date, end_date, column="published_date")
+            query = sql.SQL("{} GROUP BY 1 ORDER BY 1;").format(
+                _where(sql.SQL("SELECT published_date, SUM(article_count)::bigint AS article_count FROM daily_domain_article_stats"), conditions)
+            )
+            return _read_query(query, params)
 
-        # Get column names from the cursor description
-        column_names = [desc[0] for desc in cursor.description]
+        conditions, params = _date_conditions(start_date, end_date)
+        conditions.append(sql.SQL("published_at IS NOT NULL"))
+        query = sql.SQL("{} GROUP BY 1 ORDER BY 1;").format(
+            _where(sql.SQL("SELECT published_at::date AS published_date, COUNT(*) AS article_count FROM articles"), conditions)
+        )
+        return _read_query(query, params)
 
-        # Convert to a Pandas DataFrame for easy handling
-        df = pd.DataFrame(rows, columns=column_names)
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error: {error}")
+        return None
 
-        return df
+# Function to count the articles of each source per publication day
+def daily_article_counts_by_source():
+    try:
+        return _read_query(
+            """
+            SELECT published_at::date AS published_date, source_name, COUNT(*) AS article_count
+            FROM articles
+            WHERE published_at IS NOT NULL AND source_name IS NOT NULL
+            GROUP BY 1, 2
+            ORDER BY 1, 2;
+            """
+        )
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error: {error}")
         return None
 
-    finally:
-        # Close the database connection
-        if conn is not None:
-            cursor.close()
-            conn.close()
+# Function to read a cheap version marker (the highest id) of each table
+def read_table_versions(tables=("articles", "domains", "domain_locations", "traffic_data")):
+    """
+    MAX(id) is answered from the primary key index, so this is one cheap
+    round trip. It changes on inserts only, not on updates or deletes.
+    """
+    try:
+        query = sql.SQL(" UNION ALL ").join(
+            sql.SQL("SELECT {}, MAX(id) FROM {}").format(sql.Literal(table), sql.Identifier(table))
+            for table in tables
+        )
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(query)
+            return dict(cursor.fetchall())
 
-# Function to read data from the 'traffic_data' table and return it as a DataFrame
-def read_traffic_data():
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error: {error}")
+        return None
+
+# Function to read the daily per-domain article and sentiment counts in [start_date, end_date)
+def read_daily_domain_stats(start_date=None, end_date=None):
     try:
-        conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
+        conditions, params = _date_conditions(start_date, end_date, column="published_date")
+        query = sql.SQL("{} ORDER BY published_date, domain_id;").format(
+            _where(sql.SQL("SELECT * FROM daily_domain_article_stats"), conditions)
         )
-        cursor = conn.cursor()
+        return _read_query(query, params)
 
-        cursor.execute("SELECT * FROM traffic_data;")
-        traffic_data = cursor.fetchall()
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error: {error}")
+        return None
 
-        # Get column names
-        colnames = [desc[0] for desc in cursor.description]
+# Function to count the domains of each country through their domain location
+def count_domains_by_country():
+    try:
+        return _read_query(
+            """
+            SELECT l.country, COUNT(d.domain_name) AS domain_count
+            FROM domains d
+            JOIN domain_locations l ON d.domain_locations_id = l.id
+            WHERE l.country IS NOT NULL
+            GROUP BY l.country
+            ORDER BY domain_count DESC;
+            """
+        )
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error: {error}")
+        return None
+
+# Function to read data from the 'traffic_data' table and return it as a DataFrame
+def read_traffic_data():
+    try:
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM traffic_data;")
+            traffic_data = cursor.fetchall()
+
+            # Get column names
+            colnames = [desc[0] for desc in cursor.description]
 
-        # Convert the result into a DataFrame
-        df = pd.DataFrame(traffic_data, columns=colnames)
+            # Convert the result into a DataFrame
+            df = pd.DataFrame(traffic_data, columns=colnames)
 
-        return df
+            return df
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error: {error}")
-    finally:
-        if conn is not None:
-            cursor.close()
-            conn.close()
 # Function to read data from the 'domain_locations' table and return it as a DataFrame
 def read_domain_locations():
     try:
-        conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT * FROM domain_locations;")
-        locations = cursor.fetchall()
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM domain_locations;")
+            locations = cursor.fetchall()
 
-        # Get column names
-        colnames = [desc[0] for desc in cursor.description]
+            # Get column names
+            colnames = [desc[0] for desc in cursor.description]
 
-        # Convert the result into a DataFrame
-        df = pd.DataFrame(locations, columns=colnames)
+            # Convert the result into a DataFrame
+            df = pd.DataFrame(locations, columns=colnames)
 
-        return df
+            return df
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error: {error}")
-    finally:
-        if conn is not None:
-            cursor.close()
-            conn.close()
             
 # Function to read data from the 'domains' table and return it as a DataFrame
 def read_domains():
     try:
-        conn = psycopg2.connect(
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            host=DB_HOST,
-            port=DB_PORT
-        )
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT * FROM domains;")
-        domains = cursor.fetchall()
+        with get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM domains;")
+            domains = cursor.fetchall()
 
-        # Get column names
-        colnames = [desc[0] for desc in cursor.description]
+            # Get column names
+            colnames = [desc[0] for desc in cursor.description]
 
-        # Convert the result into a DataFrame
-        df = pd.DataFrame(domains, columns=colnames)
+            # Convert the result into a DataFrame
+            df = pd.DataFrame(domains, columns=colnames)
 
-        return df
+            return df
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error: {error}")
-    finally:
-        if conn is not None:
-            cursor.close()
-            conn.close()
 # Run the function to create the database
 if __name__ == "__main__":
     create_database()
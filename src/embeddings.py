@@ -0,0 +1,214 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from src import models
+
+# Number of texts encoded per call to the embedding model
+EMBEDDING_BATCH_SIZE = 256
+
+# File names inside a store directory
+VECTORS_FILE = 'vectors.bin'
+IDS_FILE = 'ids.bin'
+META_FILE = 'meta.json'
+
+
+class EmbeddingStore:
+    '''
+    Sentence embeddings of articles kept on disk and read through np.memmap.
+
+    The vectors are appended row by row to a raw float32 or float16 file
+    and the article id of every row to an int64 file, so the store grows
+    without rewriting what is already there and reading it never loads the
+    whole array in memory. meta.json records the dimension, the dtype, the
+    embedding model and the number of complete rows; rows written after it
+    by an interrupted fill are ignored. One process writes to a store at a
+    time; opening a store only reads meta.json. Texts embedded differently
+    (e.g. normalised title and content for topics, raw content for
+    keywords) belong in separate stores: meta.json records the text a store
+    holds, and filling or reading it for another text is an error.
+    '''
+    def __init__(self, path, dim=None, dtype='float32', model_name=None, text=None):
+        '''
+        path: Directory of the store, created if it does not exist
+        dim: Dimension of the vectors, taken from the first vectors added if omitted
+        dtype: float32 or float16 for new stores, existing stores keep theirs
+        model_name: Embedding model of the vectors, the registry's by default
+        text: Name of the embedded text (e.g. 'content'), taken from the first fill if omitted
+        '''
+        self.path = path
+        meta_path = os.path.join(path, META_FILE)
+        created = not os.path.exists(meta_path)
+        if not created:
+            with open(meta_path) as file:
+                meta = json.load(file)
+            if dim is not None and meta['dim'] is not None and dim != meta['dim']:
+                raise ValueError(f"The store at {path} holds vectors of dimension {meta['dim']}, not {dim}")
+        else:
+            if np.dtype(dtype) not in (np.float32, np.float16):
+                raise ValueError(f"Unsupported dtype: {dtype}")
+            os.makedirs(path, exist_ok=True)
+            meta = {
+                'dim': dim,
+                'dtype': np.dtype(dtype).name,
+                'model': model_name or models.registry.name('embedding'),
+                'text': text,
+                'count': 0,
+            }
+        self.dim = meta['dim']
+        self.dtype = np.dtype(meta['dtype'])
+        self.model_name = meta['model']
+        # Stores written before the text was recorded are labelled by their next fill
+        self.text = meta.get('text')
+        self.count = meta['count']
+        self._index = None
+        self._check_text(text, record=True)
+        if created:
+            self._write_meta()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _check_text(self, text, record=False):
+        # A store only serves the text it was filled with; record=True labels an unlabelled store
+        if text is None:
+            return
+        if self.text is None and record:
+            self.text = text
+        elif self.text is not None and text != self.text:
+            raise ValueError(f"The store at {self.path} holds embeddings of {self.text!r}, not {text!r}")
+
+    def _write_meta(self):
+        meta = {'dim': self.dim, 'dtype': self.dtype.name, 'model': self.model_name, 'text': self.text,
+                'count': self.count}
+        tmp_path = self._file(META_FILE) + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, self._file(META_FILE))
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, article_id):
+        return self.index.get_indexer([article_id])[0] >= 0
+
+    @property
+    def ids(self):
+        if self.count == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.memmap(self._file(IDS_FILE), dtype=np.int64, mode='r', shape=(self.count,))
+
+    @property
+    def index(self):
+        '''
+        pd.Index of the stored ids, giving the row of every id
+        '''
+        if self._index is None:
+            self._index = pd.Index(np.asarray(self.ids))
+        return self._index
+
+    def vectors(self):
+        '''
+        Read-only memmap of all the vectors, one row per stored id
+        '''
+        if self.count == 0:
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        return np.memmap(self._file(VECTORS_FILE), dtype=self.dtype, mode='r', shape=(self.count, self.dim))
+
+    def positions(self, ids):
+        '''
+        Returns the row of every id, -1 for the ids not in the store
+        '''
+        return self.index.get_indexer(list(ids))
+
+    def missing(self, ids):
+        ids = list(ids)
+        positions = self.positions(ids)
+        return [article_id for article_id, position in zip(ids, positions) if position < 0]
+
+    def get(self, ids, text=None):
+        '''
+        Returns the vectors of ids in their order. A contiguous run of rows
+        is returned as a view of the memmap; other selections are copied.
+        text: Name of the text the caller expects, checked against the store's
+        '''
+        self._check_text(text)
+        positions = self.positions(ids)
+        if (positions < 0).any():
+            missing = [article_id for article_id, position in zip(ids, positions) if position < 0]
+            raise KeyError(f"No embedding stored for ids {missing[:10]}")
+        vectors = self.vectors()
+        if len(positions) and (np.diff(positions) == 1).all():
+            return vectors[positions[0]:positions[-1] + 1]
+        return vectors[positions]
+
+    def add(self, ids, vectors):
+        '''
+        Appends the vectors of ids that are not stored yet, returns how many were added
+        '''
+        ids = np.asarray(list(ids), dtype=np.int64)
+        vectors = np.asarray(vectors)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("Expected one vector per id")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+
+        # Skip ids already stored, and repeated ids within the batch
+        new = self.positions(ids) < 0
+        _, first = np.unique(ids, return_index=True)
+        unique = np.zeros(len(ids), dtype=bool)
+        unique[first] = True
+        keep = new & unique
+        if not keep.any():
+            return 0
+
+        # Cut rows left behind by an interrupted fill before appending
+        for name, itemsize in ((VECTORS_FILE, self.dtype.itemsize * self.dim), (IDS_FILE, 8)):
+            with open(self._file(name), 'ab') as file:
+                file.truncate(self.count * itemsize)
+        with open(self._file(VECTORS_FILE), 'ab') as file:
+            file.write(np.ascontiguousarray(vectors[keep], dtype=self.dtype).tobytes())
+        with open(self._file(IDS_FILE), 'ab') as file:
+            file.write(ids[keep].tobytes())
+
+        self.count += int(keep.sum())
+        self._index = None
+        self._write_meta()
+        return int(keep.sum())
+
+    def fill(self, data, id_column='article_id', text='content', encode=None, batch_size=EMBEDDING_BATCH_SIZE,
+             text_name=None):
+        '''
+        Embeds the articles of a DataFrame or an iterable of DataFrame chunks
+        (e.g. db.stream_articles or NewsDataLoader.iter_data) that are not in
+        the store yet and appends them. Returns the number of vectors added.
+
+        text: Column holding the text to embed, or a function of a chunk returning the texts
+        encode: Function from a list of texts to an array of vectors, the registry's embedding model by default
+        text_name: Name of the embedded text, the column name by default; required when text is a function
+        '''
+        text_name = text_name or (text if isinstance(text, str) else None)
+        if text_name is None:
+            raise ValueError("text_name is required when text is a function")
+        self._check_text(text_name, record=True)
+        if encode is None:
+            if self.model_name != models.registry.name('embedding'):
+                raise ValueError(f"The store holds {self.model_name} embeddings, "
+                                 f"the configured model is {models.registry.name('embedding')}")
+            model = models.registry.get('embedding')
+            encode = lambda texts: model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        added = 0
+        for chunk in chunks:
+            new = chunk[self.positions(chunk[id_column]) < 0]
+            if new.empty:
+                continue
+            texts = new[text] if isinstance(text, str) else text(new)
+            texts = [value if isinstance(value, str) else '' for value in texts]
+            for offset in range(0, len(texts), batch_size):
+                batch_ids = new[id_column].iloc[offset:offset + batch_size]
+                added += self.add(batch_ids, encode(texts[offset:offset + batch_size]))
+        return added
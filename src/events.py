@@ -0,0 +1,276 @@
+import numpy as np
+import pandas as pd
+from src.joins import DomainDictionary
+
+# Stored first time of a topic with no article yet
+NO_TIME = np.iinfo(np.int64).max
+
+
+# Function to return array with room for size items, doubling its capacity so appends cost O(1) amortised
+def _reserve(array, size, fill):
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, 2 * len(array)), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class EventIndex:
+    '''
+    Which sites report every event (topic) first, and how late the others follow.
+
+    Articles are not stored. Every update folds its own rows into running
+    per-topic totals (article count, earliest time and the domain that
+    reported it) and into the earliest article of every (topic, domain)
+    pair, so its cost only depends on the size of the batch: the batch's
+    minima are computed with one sort of the batch and merged into the
+    stored ones, which are kept in arrays that grow by doubling. Ties go
+    to the article added first. Per-site totals are derived from the pairs
+    with vectorised operations when they are asked for, and the pairs are
+    only sorted into reporting order when an order query needs it.
+    '''
+    def __init__(self, domain_column='domain', topic_column='topic', time_column='published_at', drop_outliers=False):
+        '''
+        drop_outliers: Skip BERTopic's outlier topic -1
+        '''
+        self.domain_column = domain_column
+        self.topic_column = topic_column
+        self.time_column = time_column
+        self.drop_outliers = drop_outliers
+        self.dictionary = DomainDictionary()
+        self.topics = []
+        self._topic_codes = {}
+        self.tz = None
+        self._rows = 0
+
+        # Per topic code: number of articles, time and domain of the first one
+        self._article_counts = np.zeros(0, dtype=np.int64)
+        self._first_time = np.full(0, NO_TIME, dtype=np.int64)
+        self._first_domain = np.full(0, -1, dtype=np.int64)
+
+        # Per (topic, domain) pair: time and insertion number of its first article, slot of every pair key
+        self._pair_slots = {}
+        self._n_pairs = 0
+        self._pair_topic = np.zeros(0, dtype=np.int64)
+        self._pair_domain = np.zeros(0, dtype=np.int64)
+        self._pair_time = np.zeros(0, dtype=np.int64)
+        self._pair_seq = np.zeros(0, dtype=np.int64)
+
+        # Pairs in reporting order, built on demand and dropped by every update
+        self._order = None
+
+    def __len__(self):
+        return self._rows
+
+    def _code(self, topic):
+        # Code of a topic, a new one the first time it is seen
+        if topic not in self._topic_codes:
+            self._topic_codes[topic] = len(self.topics)
+            self.topics.append(topic)
+        return self._topic_codes[topic]
+
+    def _nanoseconds(self, values):
+        # Publication times as int64 ns since the epoch, in UTC for timezone-aware columns
+        try:
+            times = pd.to_datetime(pd.Series(values))
+        except ValueError:
+            # Strings with different UTC offsets
+            times = pd.to_datetime(pd.Series(values), utc=True)
+        if times.dt.tz is not None:
+            self.tz = self.tz or times.dt.tz
+            times = times.dt.tz_convert('UTC').dt.tz_localize(None)
+        return times.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+    def _timestamps(self, nanoseconds):
+        times = pd.DatetimeIndex(np.asarray(nanoseconds, dtype=np.int64).view('datetime64[ns]'))
+        return times.tz_localize('UTC').tz_convert(self.tz) if self.tz is not None else times
+
+    def update(self, data, topics=None):
+        '''
+        Adds a DataFrame chunk or an iterable of chunks. topics: Topic of every
+        row of a single chunk, e.g. from IncrementalTopicModel.assign, used
+        instead of its topic column. Rows with a missing domain, topic or
+        time are skipped.
+        '''
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        new_topics, new_domains, new_times = [], [], []
+        for chunk in chunks:
+            topic_values = pd.Series(topics if topics is not None else chunk[self.topic_column], index=chunk.index)
+            keep = chunk[self.domain_column].notna() & chunk[self.time_column].notna() & topic_values.notna()
+            if self.drop_outliers:
+                keep &= topic_values != -1
+            chunk, topic_values = chunk[keep], topic_values[keep]
+
+            local_codes, uniques = pd.factorize(topic_values)
+            mapping = np.array([self._code(topic) for topic in uniques], dtype=np.int64)
+            new_topics.append(mapping[local_codes] if len(mapping) else local_codes.astype(np.int64))
+            new_domains.append(self.dictionary.encode(chunk[self.domain_column]))
+            new_times.append(self._nanoseconds(chunk[self.time_column]))
+
+        if not new_topics:
+            return self
+        topic, domain, time = np.concatenate(new_topics), np.concatenate(new_domains), np.concatenate(new_times)
+        if not len(topic):
+            return self
+        seq = self._rows + np.arange(len(topic))
+        self._rows += len(topic)
+        self._merge_topics(topic, domain, time)
+        self._merge_pairs(topic, domain, time, seq)
+        self._order = None
+        return self
+
+    def _merge_topics(self, topic, domain, time):
+        # Batch totals per topic (lexsort is stable, so equal times keep the order they were added in)
+        n_topics = len(self.topics)
+        self._article_counts = _reserve(self._article_counts, n_topics, 0)
+        self._first_time = _reserve(self._first_time, n_topics, NO_TIME)
+        self._first_domain = _reserve(self._first_domain, n_topics, -1)
+
+        order = np.lexsort((time, topic))
+        topic, domain, time = topic[order], domain[order], time[order]
+        starts = np.flatnonzero(np.r_[True, topic[1:] != topic[:-1]])
+        codes = topic[starts]
+        self._article_counts[codes] += np.diff(np.r_[starts, len(topic)])
+        # Stored articles were added first, so they keep ties
+        earlier = time[starts] < self._first_time[codes]
+        self._first_time[codes[earlier]] = time[starts][earlier]
+        self._first_domain[codes[earlier]] = domain[starts][earlier]
+
+    def _merge_pairs(self, topic, domain, time, seq):
+        # First article of every (topic, domain) pair of the batch
+        order = np.lexsort((time, domain, topic))
+        topic, domain, time, seq = topic[order], domain[order], time[order], seq[order]
+        starts = np.flatnonzero(np.r_[True, (topic[1:] != topic[:-1]) | (domain[1:] != domain[:-1])])
+        topic, domain, time, seq = topic[starts], domain[starts], time[starts], seq[starts]
+
+        # One int64 key per pair, cheaper to hash than a tuple
+        keys = ((topic << 32) | domain).tolist()
+        slots = np.array([self._pair_slots.get(key, -1) for key in keys], dtype=np.int64)
+        known = slots >= 0
+        earlier = np.zeros(len(slots), dtype=bool)
+        earlier[known] = time[known] < self._pair_time[slots[known]]
+        self._pair_time[slots[earlier]] = time[earlier]
+        self._pair_seq[slots[earlier]] = seq[earlier]
+
+        new = np.flatnonzero(~known)
+        start, end = self._n_pairs, self._n_pairs + len(new)
+        self._pair_topic = _reserve(self._pair_topic, end, 0)
+        self._pair_domain = _reserve(self._pair_domain, end, 0)
+        self._pair_time = _reserve(self._pair_time, end, 0)
+        self._pair_seq = _reserve(self._pair_seq, end, 0)
+        self._pair_topic[start:end] = topic[new]
+        self._pair_domain[start:end] = domain[new]
+        self._pair_time[start:end] = time[new]
+        self._pair_seq[start:end] = seq[new]
+        self._pair_slots.update(zip((keys[i] for i in new), range(start, end)))
+        self._n_pairs = end
+
+    def _pairs(self):
+        n = self._n_pairs
+        return self._pair_topic[:n], self._pair_domain[:n], self._pair_time[:n], self._pair_seq[:n]
+
+    def _reporting_order(self):
+        # Pairs sorted by topic, then by the time and insertion of their first article, with the offset of every topic
+        if self._order is None:
+            topic, _, time, seq = self._pairs()
+            order = np.lexsort((seq, time, topic))
+            offsets = np.searchsorted(topic[order], np.arange(len(self.topics) + 1))
+            self._order = (order, offsets)
+        return self._order
+
+    def _topic_index(self, codes):
+        return pd.Index([self.topics[code] for code in codes], name=self.topic_column)
+
+    def _present(self):
+        return np.flatnonzero(self._article_counts[:len(self.topics)] > 0)
+
+    def first_reporters(self):
+        '''
+        The first article of every topic: same topic, domain and published_at
+        as groupby('topic').apply(lambda df: df.loc[df['published_at'].idxmin()])
+        '''
+        codes = self._present()
+        index = self._topic_index(codes)
+        first = pd.DataFrame({
+            self.topic_column: index.to_numpy(),
+            self.domain_column: self.dictionary.decode(self._first_domain[codes]).to_numpy(),
+            self.time_column: self._timestamps(self._first_time[codes]),
+        }, index=index)
+        return first.sort_index()
+
+    def coverage(self):
+        '''
+        Number of articles and of distinct sites reporting every topic, most reported first
+        '''
+        codes = self._present()
+        site_counts = np.bincount(self._pairs()[0], minlength=len(self.topics))
+        coverage = pd.DataFrame({
+            'articles': self._article_counts[codes],
+            'sites': site_counts[codes],
+        }, index=self._topic_index(codes))
+        return coverage.sort_index().sort_values('articles', ascending=False, kind='stable')
+
+    def reporting_counts(self):
+        '''
+        Number of articles per topic, as value_counts of the topic column
+        '''
+        return self.coverage()['articles'].rename('count')
+
+    def _reporters(self, rows):
+        # rows: Positions in the reporting order
+        order, offsets = self._reporting_order()
+        topic, domain, time, _ = self._pairs()
+        pairs = order[rows]
+        lag = time[pairs] - self._first_time[topic[pairs]]
+        return pd.DataFrame({
+            self.topic_column: [self.topics[code] for code in topic[pairs]],
+            'rank': np.asarray(rows, dtype=np.int64) - offsets[topic[pairs]] + 1,
+            self.domain_column: self.dictionary.decode(domain[pairs]).to_numpy(),
+            self.time_column: self._timestamps(time[pairs]),
+            'lag': pd.to_timedelta(lag, unit='ns'),
+        })
+
+    def reporter_order(self, topic):
+        '''
+        The sites reporting topic in the order of their first article, with
+        their lag behind the first report
+        '''
+        if topic not in self._topic_codes:
+            raise KeyError(f"Unknown topic: {topic}")
+        code = self._topic_codes[topic]
+        _, offsets = self._reporting_order()
+        rows = np.arange(offsets[code], offsets[code + 1])
+        return self._reporters(rows).drop(columns=self.topic_column)
+
+    def lags(self, domain=None):
+        '''
+        Rank and lag of the first article of every (topic, site) pair, of one site's topics with domain
+        '''
+        if domain is None:
+            return self._reporters(np.arange(self._n_pairs))
+        order, _ = self._reporting_order()
+        code = self.dictionary.categories.get_indexer([domain])[0]
+        return self._reporters(np.flatnonzero(self._pairs()[1][order] == code)).reset_index(drop=True)
+
+    def first_reporter_ranking(self, k=None, min_topics=1):
+        '''
+        Who breaks stories first: for every site with at least min_topics
+        topics, the number of topics it reported first, the number it
+        covered, the share it broke and its mean lag behind the first
+        report. Sorted by topics broken, then by mean lag.
+        '''
+        n_domains = len(self.dictionary)
+        topic, domain, time, _ = self._pairs()
+        first_reports = np.bincount(self._first_domain[self._present()], minlength=n_domains)
+        topics_covered = np.bincount(domain, minlength=n_domains)
+        lag_sums = np.bincount(domain, weights=time - self._first_time[topic], minlength=n_domains)
+
+        codes = np.flatnonzero(topics_covered >= max(min_topics, 1))
+        ranking = pd.DataFrame({
+            'first_reports': first_reports[codes],
+            'topics_covered': topics_covered[codes],
+            'first_share': first_reports[codes] / topics_covered[codes],
+            'mean_lag': pd.to_timedelta(np.round(lag_sums[codes] / topics_covered[codes]), unit='ns'),
+        }, index=pd.Index(self.dictionary.categories[codes], name=self.domain_column))
+        ranking = ranking.sort_index().sort_values(['first_reports', 'mean_lag'], ascending=[False, True], kind='stable')
+        return ranking if k is None else ranking.head(k)
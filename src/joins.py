@@ -0,0 +1,199 @@
+import os
+import numpy as np
+import pandas as pd
+from src.loader import NewsDataLoader, has_pyarrow, sidecar_signature, source_signature, write_sidecar
+
+# The part of a URL urllib.parse.urlparse returns as netloc: after an optional scheme and '//', up to '/', '?' or '#'
+NETLOC_PATTERN = r'^(?:[A-Za-z][A-Za-z0-9+.\-]*:)?//(?P<netloc>[^/?#]*)'
+
+# Characters urlsplit removes before parsing
+URL_STRIP_CHARACTERS = ''.join(chr(i) for i in range(33))
+
+# Key columns of the rating, traffic and domain location datasets
+RATING_DOMAIN_COLUMN = 'domain'
+TRAFFIC_DOMAIN_COLUMN = 'Domain'
+LOCATION_DOMAIN_COLUMN = 'SourceCommonName'
+
+
+# Function to extract the domain (netloc) of every URL of a Series without a Python call per row
+def extract_domains(urls):
+    '''
+    Same values as urls.apply(lambda x: urlparse(x).netloc) for string
+    URLs; missing URLs stay missing instead of raising. Uses pyarrow's
+    regex kernels when pyarrow is installed.
+    '''
+    urls = pd.Series(urls)
+    if has_pyarrow():
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        array = pa.array(urls.to_numpy(dtype=object), type=pa.string(), from_pandas=True)
+        array = pc.replace_substring_regex(pc.utf8_ltrim(array, characters=URL_STRIP_CHARACTERS), r'[\t\r\n]', '')
+        matches = pc.extract_regex(array, pattern=NETLOC_PATTERN)
+        domains = pd.Series(matches.field('netloc').to_numpy(zero_copy_only=False), index=urls.index, dtype=object)
+    else:
+        cleaned = urls.str.lstrip(URL_STRIP_CHARACTERS).str.replace(r'[\t\r\n]', '', regex=True)
+        domains = cleaned.str.extract(NETLOC_PATTERN, expand=False).astype(object)
+    # URLs without a '//' part have an empty netloc
+    return domains.fillna('').where(urls.notna(), None)
+
+class DomainDictionary:
+    '''
+    Integer codes for domain names, shared by every dataset encoded with it.
+
+    A domain keeps the code it got the first time it was seen; missing
+    values are encoded as -1. The codes index categories, so encoded
+    columns can also be turned into Categoricals with the same categories.
+    '''
+    def __init__(self, domains=None):
+        self.categories = pd.Index([], dtype=object)
+        if domains is not None:
+            self.encode(domains)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def encode(self, values):
+        '''
+        Returns the int64 codes of values, adding the domains not seen yet
+        '''
+        # Look up each distinct value once, then broadcast the codes to the rows
+        local_codes, uniques = pd.factorize(pd.Series(values))
+        uniques = pd.Index(np.asarray(uniques, dtype=object), dtype=object)
+        unique_codes = self.categories.get_indexer(uniques)
+        if (unique_codes < 0).any():
+            self.categories = self.categories.append(uniques[unique_codes < 0])
+            unique_codes = self.categories.get_indexer(uniques)
+        return np.where(local_codes >= 0, unique_codes[local_codes.clip(0)] if len(uniques) else -1, -1).astype(np.int64)
+
+    def decode(self, codes):
+        codes = np.asarray(codes)
+        return pd.Series(np.where(codes >= 0, self.categories.to_numpy()[codes.clip(0)], None), dtype=object)
+
+    def categorical(self, values):
+        '''
+        values as a Categorical whose categories are all the known domains
+        '''
+        return pd.Categorical.from_codes(self.encode(values), categories=self.categories)
+
+
+# Function to compute the row indexers of an inner join on integer codes
+def inner_join_indexers(left_codes, right_codes):
+    '''
+    Returns (left_rows, right_rows) pairing every left row with each right
+    row of the same code, in the order of pd.merge(how='inner'): left rows
+    in their order, their matches in right order. Missing codes (-1) match
+    each other, as missing keys do in pd.merge.
+    '''
+    left_codes = np.asarray(left_codes, dtype=np.int64)
+    right_codes = np.asarray(right_codes, dtype=np.int64)
+    # Codes are small dense integers, so the right rows are grouped by a counting sort (-1 shifted to 0)
+    n_codes = max(left_codes.max(initial=-1), right_codes.max(initial=-1)) + 2
+    right_order = np.argsort(right_codes, kind='stable')
+    right_counts = np.bincount(right_codes + 1, minlength=n_codes)
+    right_starts = np.cumsum(right_counts) - right_counts
+    starts = right_starts[left_codes + 1]
+    counts = right_counts[left_codes + 1]
+
+    left_rows = np.repeat(np.arange(len(left_codes)), counts)
+    # Position of every output row within the matches of its left row
+    offsets = np.arange(len(left_rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    right_rows = right_order[np.repeat(starts, counts) + offsets]
+    return left_rows, right_rows
+
+# Function to rename the columns two frames share as pd.merge does, with _x on the left and _y on the right
+def _merge_suffixes(left_columns, right_columns):
+    shared = set(left_columns) & set(right_columns)
+    return ({column: f"{column}_x" for column in shared}, {column: f"{column}_y" for column in shared})
+
+# Function to inner join two DataFrames on integer key codes
+def join_on_codes(left, right, left_codes, right_codes):
+    left_rows, right_rows = inner_join_indexers(left_codes, right_codes)
+    left_names, right_names = _merge_suffixes(left.columns, right.columns)
+    return pd.concat([
+        left.take(left_rows).reset_index(drop=True).rename(columns=left_names),
+        right.take(right_rows).reset_index(drop=True).rename(columns=right_names),
+    ], axis=1)
+
+# Function to join the rating, traffic and domain location datasets on their domains
+def join_datasets(rating, traffic, locations, dictionary=None, categorical=False):
+    '''
+    Same rows and columns as
+
+        traffic_location = pd.merge(traffic, locations, left_on='Domain', right_on='SourceCommonName')
+        pd.merge(rating, traffic_location, left_on='domain', right_on='Domain')
+
+    with the rating 'domain' column extracted from 'url' when missing;
+    columns in both sides of a join get merge's _x/_y suffixes. The keys of
+    all three datasets are encoded with one DomainDictionary and the joins
+    match integer codes instead of strings.
+
+    categorical: Return the three domain columns as Categoricals sharing the dictionary's categories
+    Returns (joined, dictionary)
+    '''
+    if dictionary is None:
+        dictionary = DomainDictionary()
+    if RATING_DOMAIN_COLUMN not in rating.columns:
+        rating = rating.assign(**{RATING_DOMAIN_COLUMN: extract_domains(rating['url']).to_numpy()})
+
+    traffic_codes = dictionary.encode(traffic[TRAFFIC_DOMAIN_COLUMN])
+    location_codes = dictionary.encode(locations[LOCATION_DOMAIN_COLUMN])
+    rating_codes = dictionary.encode(rating[RATING_DOMAIN_COLUMN])
+
+    traffic_rows, location_rows = inner_join_indexers(traffic_codes, location_codes)
+    traffic_location_codes = traffic_codes[traffic_rows]
+    rating_rows, pair_rows = inner_join_indexers(rating_codes, traffic_location_codes)
+
+    # Column names after the suffixes of the traffic/location join, then of the rating join
+    traffic_names, location_names = _merge_suffixes(traffic.columns, locations.columns)
+    traffic_location_columns = [traffic_names.get(column, column) for column in traffic.columns] + \
+                               [location_names.get(column, column) for column in locations.columns]
+    rating_names, pair_names = _merge_suffixes(rating.columns, traffic_location_columns)
+    traffic_names = {column: pair_names.get(name, name) for column, name in
+                     ((column, traffic_names.get(column, column)) for column in traffic.columns)}
+    location_names = {column: pair_names.get(name, name) for column, name in
+                      ((column, location_names.get(column, column)) for column in locations.columns)}
+
+    # Take every dataset once with the combined row indexers instead of materialising the intermediate join
+    joined = pd.concat([
+        rating.take(rating_rows).reset_index(drop=True).rename(columns=rating_names),
+        traffic.take(traffic_rows[pair_rows]).reset_index(drop=True).rename(columns=traffic_names),
+        locations.take(location_rows[pair_rows]).reset_index(drop=True).rename(columns=location_names),
+    ], axis=1)
+
+    if categorical:
+        for column, codes in ((rating_names.get(RATING_DOMAIN_COLUMN, RATING_DOMAIN_COLUMN), rating_codes[rating_rows]),
+                              (traffic_names[TRAFFIC_DOMAIN_COLUMN], traffic_codes[traffic_rows[pair_rows]]),
+                              (location_names[LOCATION_DOMAIN_COLUMN], location_codes[location_rows[pair_rows]])):
+            joined[column] = pd.Categorical.from_codes(codes, categories=dictionary.categories)
+    return joined, dictionary
+
+# Function to load and join the three datasets, caching the result in memory and in a Parquet file
+def load_joined(rating_path, traffic_path, locations_path, loader=None, cache_path=None, categorical=False):
+    '''
+    The joined frame is kept in the loader's cache and, with cache_path, in
+    a Parquet file; both are reused until one of the source files changes.
+    '''
+    loader = loader or NewsDataLoader()
+    paths = (rating_path, traffic_path, locations_path)
+    key = ('joined',) + paths + (categorical,)
+    # The source signatures of all three files, so a change to any of them is a miss
+    signature = {'sources': [source_signature(path, loader.schema_for(path)) for path in paths],
+                 'categorical': categorical}
+
+    if key in loader.data and loader.data.signature(key) == signature:
+        loader.data.hits += 1
+        return loader.data[key]
+    loader.data.misses += 1
+
+    use_file = cache_path is not None and has_pyarrow() and None not in signature['sources']
+    if use_file and os.path.exists(cache_path) and sidecar_signature(cache_path) == signature:
+        joined = pd.read_parquet(cache_path)
+    else:
+        joined, _ = join_datasets(loader.load_data(rating_path), loader.load_data(traffic_path),
+                                  loader.load_data(locations_path), categorical=categorical)
+        if use_file:
+            write_sidecar(joined, cache_path, signature)
+
+    loader.data.put(key, joined, signature)
+    return joined
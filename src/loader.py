@@ -1,28 +1,352 @@
-import argparse
+import json
+import os
+from collections import OrderedDict
 import pandas as pd
 
 
+# Column types of the known datasets: low-cardinality text as categories, timestamps parsed
+SCHEMAS = {
+    'rating': {
+        'dtype': {
+            'article_id': 'Int64',
+            'source_id': 'category',
+            'source_name': 'category',
+            'category': 'category',
+            'title_sentiment': 'category',
+        },
+        'parse_dates': ['published_at'],
+    },
+    'traffic': {
+        'dtype': {
+            'TLD': 'category',
+            'IDN_TLD': 'category',
+        },
+        'parse_dates': [],
+    },
+    'domain_locations': {
+        'dtype': {
+            'location': 'category',
+            'Country': 'category',
+        },
+        'parse_dates': [],
+    },
+}
+
+# File names the datasets are shipped under, used when no dataset name is given
+DATASET_FILES = {
+    'rating.csv': 'rating',
+    'traffic.csv': 'traffic',
+    'Domains_location.csv': 'domain_locations',
+}
+
+# Parquet metadata key recording which source file a sidecar was built from
+SIDECAR_METADATA_KEY = b'news_loader_source'
+
+# Default number of rows per chunk yielded by NewsDataLoader.iter_data
+DEFAULT_CHUNKSIZE = 100000
+
+# Comparison operators accepted in NewsDataLoader.iter_data filters
+FILTER_OPERATORS = {
+    '==': lambda series, value: series == value,
+    '!=': lambda series, value: series != value,
+    '<': lambda series, value: series < value,
+    '<=': lambda series, value: series <= value,
+    '>': lambda series, value: series > value,
+    '>=': lambda series, value: series >= value,
+    'in': lambda series, value: series.isin(value),
+    'not in': lambda series, value: ~series.isin(value),
+}
+
+# Default memory budget of the loaded DataFrames kept by NewsDataLoader
+DEFAULT_CACHE_BYTES = int(os.getenv("NEWS_LOADER_CACHE_BYTES", str(2 * 1024 ** 3)))
+
+
+class FrameCache:
+    '''
+    A dict-like LRU cache of DataFrames bounded by their total deep memory usage.
+
+    When the budget is exceeded the least recently used frames are evicted,
+    except the one just stored, which is always kept. Each entry can carry
+    the signature of the file it was read from to detect stale entries.
+    '''
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        '''
+        max_bytes: Memory budget in bytes, None for no limit
+        '''
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (frame, nbytes, signature)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def __getitem__(self, key):
+        frame = self._entries[key][0]
+        self._entries.move_to_end(key)
+        return frame
+
+    def __setitem__(self, key, frame):
+        self.put(key, frame)
+
+    def __delitem__(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self.bytes -= nbytes
+
+    def put(self, key, frame, signature=None):
+        if key in self._entries:
+            del self[key]
+        nbytes = int(frame.memory_usage(deep=True).sum())
+        self._entries[key] = (frame, nbytes, signature)
+        self.bytes += nbytes
+
+        if self.max_bytes is not None:
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                self.evict(next(iter(self._entries)))
+                self.evictions += 1
+
+    def signature(self, key):
+        return self._entries[key][2]
+
+    def evict(self, key):
+        if key in self._entries:
+            del self[key]
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
 class NewsDataLoader:
     '''
     a class that will load  datasets when provided path
-    
+
+    CSV files of a known dataset are read with their schema and copied to a
+    Parquet sidecar on first read; later loads come from the sidecar as long
+    as the source file's size and modification time are unchanged.
     '''
-    def __init__(self):
+    def __init__(self, columnar=True, cache_dir=None, max_bytes=DEFAULT_CACHE_BYTES):
+        '''
+        data: LRU cache of the loaded data, bounded to max_bytes of memory
+        columnar: Whether to write and read Parquet sidecars (needs pyarrow)
+        cache_dir: Directory for the sidecars, next to the source file by default
         '''
-        data: Dictionary to store loaded data
+        self.data = FrameCache(max_bytes)
+        self.columnar = columnar
+        self.cache_dir = cache_dir
+
+    def load_data(self, path, dataset=None, columns=None):
         '''
-        self.data = {}
-    
-    def load_data(self,path):
-        if(path not in self.data):
-            self.data[path] = pd.read_csv(path)
-        return self.data[path]
+        dataset: Name of an entry in SCHEMAS, inferred from the file name if omitted
+        columns: Only load these columns
+        '''
+        key = path if columns is None else (path, tuple(columns))
+        schema = self.schema_for(path, dataset)
+
+        if(key in self.data):
+            cached = self.data.signature(key)
+            # Entries stored without a signature are trusted as they are
+            if cached is None or cached == source_signature(path, schema):
+                self.data.hits += 1
+                return self.data[key]
+            self.data.evict(key)
+
+        self.data.misses += 1
+        df = self._read(path, schema, columns)
+        self.data.put(key, df, source_signature(path, schema))
+        return df
+
+    def iter_data(self, path, dataset=None, chunksize=DEFAULT_CHUNKSIZE, columns=None, filters=None):
+        '''
+        Yields typed DataFrame chunks of at most chunksize rows without
+        loading the whole file. Chunks come from the Parquet sidecar when an
+        up to date one exists, from the CSV otherwise; nothing is cached.
+
+        filters: List of (column, op, value) conditions applied to every
+                 chunk, with op one of ==, !=, <, <=, >, >=, in, not in
+        columns: Only yield these columns (filter columns are read as needed)
+        '''
+        schema = self.schema_for(path, dataset)
+        filters = filters or []
+        read_columns = None
+        if columns is not None:
+            read_columns = list(columns) + [column for column, _, _ in filters if column not in columns]
+
+        source = source_signature(path, schema)
+        sidecar = self.sidecar_path(path)
+        if self.columnar and source is not None and has_pyarrow() and sidecar_signature(sidecar) == source:
+            chunks = _iter_parquet(sidecar, chunksize, read_columns)
+        else:
+            chunks = _iter_csv(path, schema, chunksize, read_columns)
+
+        for chunk in chunks:
+            if filters:
+                chunk = chunk[_filter_mask(chunk, filters)]
+            if columns is not None:
+                chunk = chunk[list(columns)]
+            yield chunk
+
+    def evict(self, path):
+        '''
+        Drops every cached frame loaded from path, with or without projection
+        '''
+        for key in [key for key in self.data if key == path or (isinstance(key, tuple) and key[0] == path)]:
+            self.data.evict(key)
+
+    def clear(self):
+        self.data.clear()
+
+    def cache_stats(self):
+        return self.data.stats()
+
+    def schema_for(self, path, dataset=None):
+        if dataset is None:
+            dataset = DATASET_FILES.get(os.path.basename(path))
+            if dataset is None:
+                return None
+        if dataset not in SCHEMAS:
+            raise ValueError(f"Unknown dataset: {dataset}")
+        return SCHEMAS[dataset]
+
+    def sidecar_path(self, path):
+        directory = self.cache_dir or os.path.dirname(path)
+        return os.path.join(directory, os.path.basename(path) + '.parquet')
+
+    def _read(self, path, schema, columns):
+        source = source_signature(path, schema)
+        if not (self.columnar and source is not None and has_pyarrow()):
+            return _read_csv(path, schema, columns)
+
+        sidecar = self.sidecar_path(path)
+        if sidecar_signature(sidecar) == source:
+            return pd.read_parquet(sidecar, columns=list(columns) if columns is not None else None)
+
+        # Read the whole file once so any later projection can be served from the sidecar
+        df = _read_csv(path, schema, None)
+        write_sidecar(df, sidecar, source)
+        return df if columns is None else df[list(columns)]
+
+
+# Function to read a CSV file, applying the dtypes of a schema when given
+def _read_csv(path, schema, columns):
+    kwargs = {}
+    if columns is not None:
+        kwargs['usecols'] = list(columns)
+    if schema is not None:
+        dtype = schema['dtype']
+        parse_dates = schema['parse_dates']
+        if columns is not None:
+            dtype = {column: value for column, value in dtype.items() if column in columns}
+            parse_dates = [column for column in parse_dates if column in columns]
+        kwargs['dtype'] = dtype
+        if parse_dates:
+            kwargs['parse_dates'] = parse_dates
+    df = pd.read_csv(path, **kwargs)
+    return df if columns is None else df[list(columns)]
+
+# Function to read a CSV file in typed chunks
+def _iter_csv(path, schema, chunksize, columns):
+    kwargs = {'chunksize': chunksize}
+    if columns is not None:
+        kwargs['usecols'] = list(columns)
+    if schema is not None:
+        kwargs['dtype'] = {column: value for column, value in schema['dtype'].items()
+                           if columns is None or column in columns}
+        parse_dates = [column for column in schema['parse_dates'] if columns is None or column in columns]
+        if parse_dates:
+            kwargs['parse_dates'] = parse_dates
+    with pd.read_csv(path, **kwargs) as reader:
+        for chunk in reader:
+            yield chunk if columns is None else chunk[list(columns)]
+
+# Function to read a Parquet file in record batches converted to DataFrames
+def _iter_parquet(path, chunksize, columns):
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+# Function to combine (column, op, value) filters into one boolean mask
+def _filter_mask(chunk, filters):
+    mask = pd.Series(True, index=chunk.index)
+    for column, op, value in filters:
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Unknown filter operator: {op}")
+        mask &= FILTER_OPERATORS[op](chunk[column], value)
+    return mask
+
+# Function to describe the state of a source file so a stale sidecar can be detected
+def source_signature(path, schema):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'schema': schema}
+
+# Function to read the source signature stored in a sidecar, None if there is no usable sidecar
+def sidecar_signature(sidecar):
+    import pyarrow.parquet as pq
+    try:
+        metadata = pq.read_schema(sidecar).metadata or {}
+    except (OSError, ValueError):
+        return None
+    if SIDECAR_METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[SIDECAR_METADATA_KEY])
+
+# Function to write a DataFrame to a Parquet sidecar tagged with its source signature
+def write_sidecar(df, sidecar, source):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Write next to the target and rename, so a crash never leaves a half-written sidecar behind
+    tmp_path = sidecar + '.tmp'
+    try:
+        # Columns Arrow cannot type (e.g. mixed int/str objects from read_csv) leave the frame without a sidecar
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[SIDECAR_METADATA_KEY] = json.dumps(source).encode()
+        table = table.replace_schema_metadata(metadata)
+
+        os.makedirs(os.path.dirname(sidecar) or '.', exist_ok=True)
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, sidecar)
+    except (OSError, pa.ArrowException) as error:
+        print(f"Could not write {sidecar}: {error}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-   
+def has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
 
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='Export news history')
-    parser.add_argument('--zip', help="Name of a zip file to import")
-    args = parser.parse_args()
\ No newline at end of file
+    # The command line runner, with its --zip import, lives in src.pipeline
+    from src.pipeline import main
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+
+# Sentence-transformer shared by KeyBERT and BERTopic
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+
+# Function to load the sentence-transformer embedding model
+def _load_embedding(registry, name):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
+
+# Function to build a KeyBERT model on top of the shared embedding model, name is unused
+def _load_keybert(registry, name):
+    from keybert import KeyBERT
+    return KeyBERT(model=registry.get('embedding'))
+
+# Function to estimate the memory held by a model from its parameters, None when unknown
+def _model_bytes(model):
+    # KeyBERT and BERTopic wrap the torch module a few levels down
+    for attribute in ('model', 'embedding_model'):
+        inner = getattr(model, attribute, None)
+        if inner is not None and inner is not model:
+            return _model_bytes(inner)
+    parameters = getattr(model, 'parameters', None)
+    if not callable(parameters):
+        return None
+    try:
+        return sum(p.numel() * p.element_size() for p in parameters())
+    except (TypeError, AttributeError):
+        return None
+
+
+class ModelRegistry:
+    '''
+    A process-wide store of loaded NLP models.
+
+    Each kind of model is loaded on first use by its loader, called as
+    loader(registry, name), and kept until it is unloaded, so repeated
+    calls in one process share the same instance. Loading is serialised by
+    a lock so concurrent threads never load the same model twice.
+    '''
+    def __init__(self, loaders=None, names=None):
+        '''
+        loaders: {kind: loader} used to build each kind of model
+        names: {kind: model name} handed to the loaders
+        '''
+        self._loaders = dict(loaders or {})
+        self._names = dict(names or {})
+        self._models = {}
+        self._info = {}
+        self._dependents = {}  # kind -> kinds whose loader used it
+        self._loading = []
+        self._lock = threading.RLock()
+
+    def register(self, kind, loader, name=None):
+        with self._lock:
+            self._loaders[kind] = loader
+            if name is not None:
+                self._names[kind] = name
+            self.unload(kind)
+
+    def name(self, kind):
+        return self._names.get(kind)
+
+    def configure(self, kind, name):
+        '''
+        Changes the model name of a kind; a model loaded under another name is unloaded
+        '''
+        with self._lock:
+            if self._names.get(kind) != name:
+                self._names[kind] = name
+                self.unload(kind)
+
+    def get(self, kind):
+        model = self._models.get(kind)
+        if model is not None and not self._loading:
+            return model
+        with self._lock:
+            # A model requested while loading another one is a dependency of it
+            if self._loading:
+                self._dependents.setdefault(kind, set()).add(self._loading[-1])
+            # Another thread may have loaded it while this one waited
+            if kind not in self._models:
+                if kind not in self._loaders:
+                    raise KeyError(f"Unknown model: {kind}")
+                start = time.perf_counter()
+                self._loading.append(kind)
+                try:
+                    model = self._loaders[kind](self, self._names.get(kind))
+                finally:
+                    self._loading.pop()
+                self._models[kind] = model
+                self._info[kind] = {
+                    'name': self._names.get(kind),
+                    'load_seconds': time.perf_counter() - start,
+                    'bytes': _model_bytes(model),
+                }
+            return self._models[kind]
+
+    def warm_up(self, kinds=None):
+        '''
+        Loads the given kinds of model (all registered ones by default) ahead of their first use
+        '''
+        for kind in kinds if kinds is not None else list(self._loaders):
+            self.get(kind)
+
+    def is_loaded(self, kind):
+        return kind in self._models
+
+    def unload(self, kind=None):
+        '''
+        Drops a loaded model, or every loaded model when kind is None.
+        Models built on top of an unloaded one are dropped with it.
+        '''
+        with self._lock:
+            kinds = list(self._models) if kind is None else [kind]
+            for name in kinds:
+                self._models.pop(name, None)
+                self._info.pop(name, None)
+                for dependent in self._dependents.pop(name, ()):
+                    self.unload(dependent)
+
+    def memory_usage(self):
+        '''
+        Returns {kind: bytes} for the loaded models, None where it cannot be estimated
+        '''
+        return {kind: info['bytes'] for kind, info in self._info.items()}
+
+    def stats(self):
+        return {kind: dict(info) for kind, info in self._info.items()}
+
+
+registry = ModelRegistry(
+    loaders={'embedding': _load_embedding, 'keybert': _load_keybert},
+    names={'embedding': EMBEDDING_MODEL},
+)
@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from src.nlp_cache import cached_call, cache_config, init_worker, call_with_stats, merge_stats
+
+# Default number of articles handed to a worker at a time
+NER_CHUNK_SIZE = 64
+
+# Tagger and chunker of the current process, loaded once by _load_models
+_tagger = None
+_chunker = None
+
+
+# Function to load the POS tagger and the named entity chunker of this process
+def _load_models():
+    global _tagger, _chunker
+    if _tagger is None:
+        from nltk.tag import PerceptronTagger
+        _tagger = PerceptronTagger()
+    if _chunker is None:
+        try:
+            from nltk.chunk import ne_chunker
+            _chunker = ne_chunker()
+        except ImportError:
+            # NLTK < 3.9 ships the chunker as a pickle
+            import nltk
+            _chunker = nltk.data.load('chunkers/maxent_ne_chunker/english_ace_multiclass.pickle')
+
+# Function to extract the GPE chunks of one text with the already loaded models
+def extract_gpes(text):
+    """
+    Same result as utils.extract_countries_from_article_content: the first
+    (word, tag) pair of every GPE chunk.
+    """
+    from nltk.tokenize import word_tokenize
+    _load_models()
+    named_entities = _chunker.parse(_tagger.tag(word_tokenize(text)))
+    return [chunk[0] for chunk in named_entities if hasattr(chunk, 'label') and chunk.label() == 'GPE']
+
+# Function run by the workers: counts the GPEs of a batch of texts
+def _count_batch(texts):
+    counts = Counter()
+    for text in texts:
+        # Missing content (NaN/None) has nothing to extract
+        if isinstance(text, str):
+            # Shares its cache entries with utils.extract_countries_from_article_content
+            counts.update(cached_call("countries", 1, text, lambda: extract_gpes(text)))
+    return counts
+
+# Function to set up a spawned pool worker: it inherits nothing, so it opens the parent's cache and loads the models
+def _init_worker(cache):
+    init_worker(cache)
+    _load_models()
+
+# Function to split an iterable into lists of at most size items without materialising it
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+# Function to count the countries mentioned in many texts on several cores
+def count_countries(texts, n_jobs=None, chunk_size=NER_CHUNK_SIZE):
+    """
+    Counts GPE mentions over an iterable of texts with a pool of n_jobs
+    processes (all cores by default), each loading the tagger and chunker
+    once. Texts are sent in chunks of chunk_size, with at most two chunks
+    per worker in flight, so the iterable can be larger than memory.
+    n_jobs=1 runs in the current process. Workers use the NLP result
+    cache configured in this process, and their hits and misses are added
+    to its stats. Workers are spawned rather than forked, as the caller
+    (e.g. a pipeline stage) may run other threads holding locks and
+    connections a forked child would inherit.
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        counts = Counter()
+        for batch in _batches(texts, chunk_size):
+            counts.update(_count_batch(batch))
+        return counts
+
+    counts = Counter()
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(cache_config(),)) as executor:
+        pending = set()
+        for batch in _batches(texts, chunk_size):
+            if len(pending) >= 2 * n_jobs:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_counts, stats = future.result()
+                    counts.update(batch_counts)
+                    merge_stats(stats)
+            pending.add(executor.submit(call_with_stats, _count_batch, batch))
+        for future in pending:
+            batch_counts, stats = future.result()
+            counts.update(batch_counts)
+            merge_stats(stats)
+    return counts
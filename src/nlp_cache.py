@@ -0,0 +1,238 @@
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# Cache file used when NLP_CACHE_PATH is set; without it results are not cached
+NLP_CACHE_PATH = os.getenv("NLP_CACHE_PATH")
+NLP_CACHE_MAX_BYTES = int(os.getenv("NLP_CACHE_MAX_BYTES", str(1024 ** 3)))
+
+
+class ResultCache:
+    '''
+    A disk-backed cache of per-article NLP results stored in SQLite.
+
+    Results are keyed by a hash of the extractor name, its version and
+    parameters and the article text, so changing any of them is a miss.
+    When the stored results grow past max_bytes the least recently used
+    ones are deleted.
+
+    hits and misses count the lookups of this process only; pool workers
+    set up with init_worker report theirs through call_with_stats, which
+    the parent adds with record. The size used for eviction is tracked per
+    process as well and re-read from the table before evicting, so writes
+    by other processes are accounted for.
+    '''
+    def __init__(self, path, max_bytes=NLP_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._conn = None
+        self._bytes = self._execute("SELECT COALESCE(SUM(size), 0) FROM results;").fetchone()[0]
+
+    def _connection(self):
+        # A connection inherited through fork must not be used, open a new one per process
+        if self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL;")
+            self._conn.execute("PRAGMA synchronous=NORMAL;")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                  key TEXT PRIMARY KEY,
+                  value BLOB,
+                  size INTEGER,
+                  last_used REAL
+                );
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used_idx ON results (last_used);")
+            self._pid = os.getpid()
+        return self._conn
+
+    def _execute(self, query, params=()):
+        return self._connection().execute(query, params)
+
+    @staticmethod
+    def key(extractor, version, text, params=None):
+        digest = hashlib.sha256()
+        for part in (extractor, str(version), repr(params), text):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get_many(self, keys):
+        '''
+        Returns {key: result} for the keys found in the cache
+        '''
+        found = {}
+        with self._lock:
+            keys = list(keys)
+            # Stay below SQLite's limit on bound parameters
+            for offset in range(0, len(keys), 500):
+                batch = keys[offset:offset + 500]
+                placeholders = ', '.join('?' * len(batch))
+                rows = self._execute(f"SELECT key, value FROM results WHERE key IN ({placeholders});", batch)
+                found.update((key, pickle.loads(value)) for key, value in rows)
+            if found:
+                now = time.time()
+                self._connection().executemany("UPDATE results SET last_used = ? WHERE key = ?;",
+                                               [(now, key) for key in found])
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items):
+        '''
+        Stores the results of a {key: result} dictionary
+        '''
+        now = time.time()
+        rows = []
+        for key, result in items.items():
+            value = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((key, value, len(value), now))
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connection()
+            # Results being replaced no longer count towards the size
+            replaced = 0
+            for offset in range(0, len(rows), 500):
+                batch = [row[0] for row in rows[offset:offset + 500]]
+                placeholders = ', '.join('?' * len(batch))
+                replaced += conn.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM results WHERE key IN ({placeholders});", batch
+                ).fetchone()[0]
+            conn.executemany("INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?);", rows)
+            self._bytes += sum(row[2] for row in rows) - replaced
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Delete the least recently used results until the cache is back to 90% of its budget
+        conn = self._connection()
+        self._bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results;").fetchone()[0]
+        target = int(self.max_bytes * 0.9)
+        while self._bytes > target:
+            rows = conn.execute("SELECT key, size FROM results ORDER BY last_used LIMIT 500;").fetchall()
+            if not rows:
+                self._bytes = 0
+                break
+            deleted = []
+            for key, size in rows:
+                if self._bytes <= target:
+                    break
+                deleted.append((key,))
+                self._bytes -= size
+            conn.executemany("DELETE FROM results WHERE key = ?;", deleted)
+
+    def get_or_compute(self, extractor, version, text, compute, params=None):
+        key = self.key(extractor, version, text, params)
+        found = self.get_many([key])
+        if key in found:
+            return found[key]
+        result = compute()
+        self.set_many({key: result})
+        return result
+
+    def record(self, hits, misses):
+        '''
+        Adds the lookups made by another process, e.g. a pool worker
+        '''
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def clear(self):
+        with self._lock:
+            self._execute("DELETE FROM results;")
+            self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': self._execute("SELECT COUNT(*) FROM results;").fetchone()[0],
+            'bytes': self._execute("SELECT COALESCE(SUM(size), 0) FROM results;").fetchone()[0],
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._pid = None
+
+
+_cache = None
+_cache_configured = False
+
+# Function to return the process-wide cache, None when caching is disabled
+def get_cache():
+    global _cache, _cache_configured
+    if not _cache_configured:
+        _cache = ResultCache(NLP_CACHE_PATH) if NLP_CACHE_PATH else None
+        _cache_configured = True
+    return _cache
+
+# Function to enable the cache at path, or disable it with path=None
+def configure_cache(path, max_bytes=NLP_CACHE_MAX_BYTES):
+    global _cache, _cache_configured
+    if _cache is not None:
+        _cache.close()
+    _cache = ResultCache(path, max_bytes) if path else None
+    _cache_configured = True
+    return _cache
+
+# Function to return the (path, max_bytes) of the process-wide cache, None when caching is disabled
+def cache_config():
+    cache = get_cache()
+    return (cache.path, cache.max_bytes) if cache is not None else None
+
+# Function to use as a pool initializer: gives the worker the cache of the parent, from cache_config()
+def init_worker(config):
+    if config is None:
+        configure_cache(None)
+    else:
+        configure_cache(*config)
+
+# Function run in a pool worker: calls func and returns its result with the cache lookups it made
+def call_with_stats(func, *args):
+    cache = get_cache()
+    before = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    result = func(*args)
+    after = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    return result, (after[0] - before[0], after[1] - before[1])
+
+# Function to add the lookups returned by call_with_stats to the cache of this process
+def merge_stats(stats):
+    cache = get_cache()
+    if cache is not None:
+        cache.record(*stats)
+
+# Function to compute a result through the cache if one is configured
+def cached_call(extractor, version, text, compute, params=None):
+    cache = get_cache()
+    if cache is None or not isinstance(text, str):
+        return compute()
+    return cache.get_or_compute(extractor, version, text, compute, params)
+
+# Decorator caching a function of one article text under the given extractor name and version
+def cached(extractor, version=1):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(text):
+            return cached_call(extractor, version, text, lambda: func(text))
+        return wrapper
+    return decorate
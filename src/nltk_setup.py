@@ -0,0 +1,88 @@
+import argparse
+from importlib.metadata import PackageNotFoundError, version
+
+# NLTK packages providing each resource the project uses, with the path nltk.data.find looks for
+NLTK_RESOURCES = {
+    'stopwords': ('stopwords', 'corpora/stopwords'),
+    'words': ('words', 'corpora/words'),
+    'tokenizer': ('punkt', 'tokenizers/punkt'),
+    'tagger': ('averaged_perceptron_tagger', 'taggers/averaged_perceptron_tagger'),
+    'chunker': ('maxent_ne_chunker', 'chunkers/maxent_ne_chunker'),
+}
+
+# NLTK 3.9 replaced the pickled models with these packages
+NLTK_39_RESOURCES = {
+    'tokenizer': ('punkt_tab', 'tokenizers/punkt_tab'),
+    'tagger': ('averaged_perceptron_tagger_eng', 'taggers/averaged_perceptron_tagger_eng'),
+    'chunker': ('maxent_ne_chunker_tab', 'chunkers/maxent_ne_chunker_tab'),
+}
+
+# Resources found locally in this process, so each is only looked up once
+_available = set()
+
+
+# Function to return the resources needed by the installed NLTK version
+def required_resources():
+    resources = dict(NLTK_RESOURCES)
+    try:
+        major, minor = (int(part) for part in version('nltk').split('.')[:2])
+    except (PackageNotFoundError, ValueError):
+        return resources
+    if (major, minor) >= (3, 9):
+        resources.update(NLTK_39_RESOURCES)
+    return resources
+
+# Function to list the resources that are not installed locally, never downloads anything
+def missing_resources(names=None):
+    import nltk
+
+    resources = required_resources()
+    missing = []
+    for name in names if names is not None else resources:
+        package, path = resources[name]
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+# Function to check that resources are installed before using them
+def require(*names):
+    '''
+    Raises LookupError naming the setup command when a resource is missing
+    '''
+    names = [name for name in names if name not in _available]
+    if not names:
+        return
+    missing = missing_resources(names)
+    if missing:
+        packages = ', '.join(required_resources()[name][0] for name in missing)
+        raise LookupError(f"NLTK data not installed: {packages}. Run `python -m src.nltk_setup` to download it.")
+    _available.update(names)
+
+# Function to download the missing resources
+def download(names=None, download_dir=None, quiet=False):
+    import nltk
+
+    resources = required_resources()
+    for name in missing_resources(names):
+        package, _ = resources[name]
+        if not nltk.download(package, download_dir=download_dir, quiet=quiet):
+            print(f"Error: could not download NLTK package {package}")
+    return missing_resources(names)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Download the NLTK data used by the project')
+    parser.add_argument('--dir', help="Directory to download to, NLTK's default location if omitted")
+    parser.add_argument('--check', action='store_true', help="Only list the missing resources")
+    args = parser.parse_args()
+
+    if args.check:
+        missing = missing_resources()
+    else:
+        missing = download(download_dir=args.dir)
+    for name in missing:
+        print(f"Missing: {required_resources()[name][0]}")
+    raise SystemExit(1 if missing else 0)
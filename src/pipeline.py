@@ -0,0 +1,401 @@
+import argparse
+import json
+import os
+import pickle
+import shutil
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from src.loader import DATASET_FILES, NewsDataLoader, source_signature
+
+# File names inside a checkpoint directory
+MANIFEST_FILE = 'manifest.json'
+CHECKPOINT_SUFFIX = '.pickle'
+TOPIC_MODEL_DIR = 'topic_model'
+
+# Default settings of the analysis stages, the values the notebook used
+POPULAR_ARTICLE_ROWS = 100
+KEYWORD_ROWS = 100
+
+
+class Stage:
+    '''
+    One step of a Pipeline.
+
+    func is called with the results of the stages in requires, in that
+    order. params are the JSON-able settings the result depends on; a
+    checkpoint made with other params, or whose upstream stages were rerun,
+    is stale. Stages with checkpoint=False (e.g. loading a file that
+    already has a fast cache) are never written to disk and are rerun
+    whenever a later stage needs their result.
+    '''
+    def __init__(self, name, func, requires=(), params=None, checkpoint=True):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.params = json.loads(json.dumps(params or {}, default=str))
+        self.checkpoint = checkpoint
+
+
+class Pipeline:
+    '''
+    A DAG of stages run with a thread pool: every stage starts as soon as
+    the stages it requires are done, so independent stages run
+    concurrently. The result of every stage is pickled to checkpoint_dir
+    when it finishes and recorded in manifest.json, so a run that crashed
+    or was interrupted resumes from the checkpoints still up to date and
+    only reruns the stages after them.
+    '''
+    def __init__(self, stages, checkpoint_dir, max_workers=4):
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+        self.checkpoint_dir = checkpoint_dir
+        self.max_workers = max_workers
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order, state = [], {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"Stages form a cycle: {' -> '.join(path + [name])}")
+            state[name] = 'visiting'
+            for required in self.stages[name].requires:
+                if required not in self.stages:
+                    raise ValueError(f"Stage {name} requires unknown stage {required}")
+                visit(required, path + [name])
+            state[name] = 'done'
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    def _checkpoint_path(self, name):
+        return os.path.join(self.checkpoint_dir, name + CHECKPOINT_SUFFIX)
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.checkpoint_dir, MANIFEST_FILE)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest):
+        # Write next to the target and rename, so a crash never leaves a half-written manifest behind
+        path = os.path.join(self.checkpoint_dir, MANIFEST_FILE)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def _save(self, name, result):
+        path = self._checkpoint_path(name)
+        with open(path + '.tmp', 'wb') as file:
+            pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+    def load(self, name):
+        '''
+        Result of a stage from its checkpoint
+        '''
+        with open(self._checkpoint_path(name), 'rb') as file:
+            return pickle.load(file)
+
+    def status(self):
+        '''
+        'done' for every stage whose checkpoint is up to date, 'pending' for the others
+        '''
+        manifest = self._read_manifest()
+        fresh = {}
+        for name in self.order:
+            stage = self.stages[name]
+            entry = manifest.get(name)
+            fresh[name] = (entry is not None and entry['params'] == stage.params
+                           and all(fresh[required] for required in stage.requires)
+                           and entry['inputs'] == self._input_versions(stage, manifest)
+                           and (not stage.checkpoint or os.path.exists(self._checkpoint_path(name))))
+        return {name: 'done' if fresh[name] else 'pending' for name in self.order}
+
+    def _input_versions(self, stage, manifest):
+        # Version of every input a result was built from, so rerunning an upstream stage alone makes it stale
+        return {required: manifest[required]['version'] if required in manifest else None
+                for required in stage.requires}
+
+    def _version(self, stage):
+        # Uncheckpointed stages give the same result for the same params; the others a new version per run
+        return json.dumps(stage.params, sort_keys=True) if not stage.checkpoint else time.time_ns()
+
+    def _plan(self, targets, status):
+        # Stages to run: the stale ones leading to the targets, plus the uncheckpointed stages they need
+        needed = set()
+
+        def collect(name):
+            if name not in needed:
+                needed.add(name)
+                for required in self.stages[name].requires:
+                    collect(required)
+
+        for target in targets:
+            if target not in self.stages:
+                raise KeyError(f"Unknown stage: {target}")
+            collect(target)
+
+        to_run = {name for name in needed if status[name] != 'done'}
+        changed = True
+        while changed:
+            changed = False
+            for name in list(to_run):
+                for required in self.stages[name].requires:
+                    if required not in to_run and not self.stages[required].checkpoint:
+                        to_run.add(required)
+                        changed = True
+        return needed, to_run
+
+    def run(self, targets=None, resume=True):
+        '''
+        Runs the stages needed for targets (every stage by default) and
+        returns {stage name: result} for the stages that were run or whose
+        result a run stage needed. resume=False ignores the checkpoints.
+        When a stage fails, the stages already running are finished and
+        checkpointed, then the error is raised.
+        '''
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        manifest = self._read_manifest() if resume else {}
+        if not resume:
+            self._write_manifest(manifest)
+        status = self.status()
+        needed, to_run = self._plan(targets or self.order, status)
+
+        results = {}
+        # Inputs of the stages to run that come from checkpoints
+        for name in self.order:
+            if name in needed and name not in to_run and any(
+                    name in self.stages[other].requires for other in to_run):
+                results[name] = self.load(name)
+        for name in self.order:
+            if name in needed and name not in to_run:
+                print(f"Stage {name}: up to date")
+
+        waiting = [name for name in self.order if name in to_run]
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while waiting or running:
+                if error is None:
+                    for name in [name for name in waiting
+                                 if all(required in results for required in self.stages[name].requires)]:
+                        waiting.remove(name)
+                        stage = self.stages[name]
+                        inputs = [results[required] for required in stage.requires]
+                        running[executor.submit(_timed, stage.func, inputs)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result, seconds = future.result()
+                    except Exception as stage_error:
+                        print(f"Stage {name} failed: {stage_error}")
+                        error = error or stage_error
+                        continue
+                    stage = self.stages[name]
+                    if stage.checkpoint:
+                        self._save(name, result)
+                    # Recorded after the checkpoint is in place, so the manifest never lists a missing result
+                    manifest[name] = {'params': stage.params, 'inputs': self._input_versions(stage, manifest),
+                                      'version': self._version(stage), 'seconds': round(seconds, 3)}
+                    self._write_manifest(manifest)
+                    results[name] = result
+                    print(f"Stage {name}: done in {seconds:.1f}s")
+
+        if error is not None:
+            raise error
+        return results
+
+
+# Function to call a stage function and time it
+def _timed(func, inputs):
+    start = time.perf_counter()
+    result = func(*inputs)
+    return result, time.perf_counter() - start
+
+# Function to return where ZipFile.extract writes a member: drive, absolute and '..' parts are dropped
+def _extract_path(directory, filename):
+    name = filename.replace('/', os.path.sep)
+    if os.path.altsep:
+        name = name.replace(os.path.altsep, os.path.sep)
+    name = os.path.splitdrive(name)[1]
+    parts = [part for part in name.split(os.path.sep) if part not in ('', os.path.curdir, os.path.pardir)]
+    return os.path.join(directory, *parts)
+
+# Function to extract the CSV files of a zip archive and return the path of every known dataset in it
+def extract_datasets(zip_path, directory):
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            target = _extract_path(directory, info.filename)
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            # Files already extracted are kept as they are, so their loader caches and checkpoints stay valid
+            if (os.path.exists(target) and os.path.getsize(target) == info.file_size
+                    and os.path.getmtime(target) == mtime):
+                continue
+            target = archive.extract(info, directory)
+            os.utime(target, (mtime, mtime))
+    paths = {}
+    for root, _, files in os.walk(directory):
+        for file_name in sorted(files):
+            if file_name in DATASET_FILES:
+                paths.setdefault(DATASET_FILES[file_name], os.path.join(root, file_name))
+    return paths
+
+# Function to build the notebook's analysis as a pipeline over the rating dataset
+def analysis_pipeline(rating_path, checkpoint_dir, model_path=None, max_rows=POPULAR_ARTICLE_ROWS,
+                      keyword_rows=KEYWORD_ROWS, n_jobs=1, n_topics=50, max_workers=4, loader=None):
+    '''
+    Stages: articles -> popular_countries, sentiment, keywords -> similarity,
+    and topics. With model_path the incremental topic model saved there
+    is updated with the articles and assigns a topic to every article, and
+    the site_correlation and earliest_reporters stages are added on top of
+    it. model_path is only read: every run of the topics stage starts from
+    a copy of it and saves the updated model to checkpoint_dir/topic_model,
+    so a rerun never feeds the same articles to the model twice.
+
+    max_rows: Articles scanned for country mentions, None for all of them
+    keyword_rows: Articles whose keywords are extracted, None for all of them
+    '''
+    from src import utils
+
+    loader = loader or NewsDataLoader()
+    articles = [
+        # The loader already caches the parsed file in a Parquet sidecar, so the frame itself is not checkpointed
+        Stage('articles', lambda: loader.load_data(rating_path),
+              params={'path': os.path.abspath(rating_path),
+                      'source': source_signature(rating_path, loader.schema_for(rating_path))},
+              checkpoint=False),
+    ]
+    stages = articles + [
+        Stage('popular_countries', lambda data: utils.find_popular_articles(data, max_rows=max_rows, n_jobs=n_jobs),
+              requires=['articles'], params={'max_rows': max_rows}),
+        Stage('sentiment', utils.website_sentiment_distribution, requires=['articles']),
+        Stage('keywords', lambda data: utils.keybert_keyword_extraction(
+                  data if keyword_rows is None else data.head(keyword_rows)),
+              requires=['articles'], params={'rows': keyword_rows, 'model': utils.models.registry.name('embedding')}),
+        Stage('similarity', lambda keywords: utils.calculate_similarity(*keywords), requires=['keywords']),
+    ]
+
+    if model_path is None:
+        # BERTopic picks the number of topics itself, so n_topics does not change this stage
+        stages.append(Stage('topics', lambda data: utils.perform_topic_modeling_with_mlflow(data)[0],
+                            requires=['articles']))
+        return Pipeline(stages, checkpoint_dir, max_workers)
+
+    output_path = os.path.join(checkpoint_dir, TOPIC_MODEL_DIR)
+    if os.path.abspath(model_path) == os.path.abspath(output_path):
+        raise ValueError(f"The topic model to start from cannot be the pipeline's output model {output_path}")
+    stages += [
+        Stage('topics', lambda data: _update_topic_model(data, model_path, output_path, n_topics),
+              requires=['articles'], params={'n_topics': n_topics, 'model_path': os.path.abspath(model_path),
+                                             'model_version': _model_version(model_path)}),
+        Stage('site_correlation', _site_correlation, requires=['articles', 'topics']),
+        Stage('earliest_reporters', _earliest_reporters, requires=['articles', 'topics']),
+    ]
+    return Pipeline(stages, checkpoint_dir, max_workers)
+
+# Function to describe the state of a saved topic model, None when there is none
+def _model_version(path):
+    from src.topics import MODEL_FILE, STATE_FILE
+
+    try:
+        with open(os.path.join(path, STATE_FILE)) as file:
+            state = json.load(file)
+        stat = os.stat(os.path.join(path, MODEL_FILE))
+    except (OSError, ValueError):
+        return None
+    return {'state': state, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+# Function to update a copy of the topic model at model_path with the articles and return their topics
+def _update_topic_model(articles, model_path, output_path, n_topics):
+    from src import utils
+    from src.topics import STATE_FILE
+
+    shutil.rmtree(output_path, ignore_errors=True)
+    if os.path.exists(os.path.join(model_path, STATE_FILE)):
+        shutil.copytree(model_path, output_path)
+    return utils.update_topic_model_with_mlflow(articles, output_path, n_topics=n_topics)[2]
+
+# Function to attach the topic of every article and its domain, as the notebook does before comparing sites
+def _with_topics(articles, topics):
+    from src.joins import extract_domains
+
+    return articles.assign(topic=list(topics), domain=extract_domains(articles['url']).to_numpy())
+
+def _site_correlation(articles, topics):
+    from src.correlation import site_correlation
+
+    return site_correlation(_with_topics(articles, topics))
+
+def _earliest_reporters(articles, topics):
+    from src.events import EventIndex
+
+    index = EventIndex().update(_with_topics(articles, topics))
+    return {'first_reporters': index.first_reporters(), 'coverage': index.coverage(),
+            'ranking': index.first_reporter_ranking()}
+
+# Function to build the command line parser of the pipeline runner
+def build_parser():
+    parser = argparse.ArgumentParser(description='Run the news analysis pipeline')
+    parser.add_argument('--zip', help="Name of a zip file to import")
+    parser.add_argument('--rating', help="Path of rating.csv, found in the zip file when --zip is given")
+    parser.add_argument('--checkpoint-dir', default='pipeline_checkpoints', help="Directory of the stage checkpoints")
+    parser.add_argument('--model-path', help="Directory of the incremental topic model to start from (not modified), "
+                                             "enables the per-article topic stages")
+    parser.add_argument('--stage', action='append', dest='stages', help="Run only this stage and what it needs (repeatable)")
+    parser.add_argument('--max-rows', type=int, default=POPULAR_ARTICLE_ROWS, help="Articles scanned for countries, 0 for all")
+    parser.add_argument('--keyword-rows', type=int, default=KEYWORD_ROWS, help="Articles whose keywords are extracted, 0 for all")
+    parser.add_argument('--n-topics', type=int, default=50)
+    parser.add_argument('--n-jobs', type=int, default=1, help="Processes for the country extraction")
+    parser.add_argument('--workers', type=int, default=4, help="Stages run at the same time")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoints of a previous run")
+    parser.add_argument('--status', action='store_true', help="Only print which stages are up to date")
+    return parser
+
+# Function to run the pipeline from the command line
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    rating_path = args.rating
+    if args.zip:
+        paths = extract_datasets(args.zip, os.path.join(args.checkpoint_dir, 'data'))
+        rating_path = rating_path or paths.get('rating')
+    if not rating_path:
+        print("Error: no rating dataset, give --rating or a --zip file containing rating.csv")
+        return 1
+
+    try:
+        pipeline = analysis_pipeline(rating_path, args.checkpoint_dir, model_path=args.model_path,
+                                     max_rows=args.max_rows or None, keyword_rows=args.keyword_rows or None,
+                                     n_jobs=args.n_jobs, n_topics=args.n_topics, max_workers=args.workers)
+    except ValueError as error:
+        print(f"Error: {error}")
+        return 1
+    if args.status:
+        for name, state in pipeline.status().items():
+            print(f"{name}: {state}")
+        return 0
+    try:
+        pipeline.run(args.stages, resume=not args.restart)
+    except Exception as error:
+        print(f"Error: {error}")
+        return 1
+    print(f"Checkpoints written to {args.checkpoint_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+
+# Sentiment labels the distribution always reports, in the order website_sentiment_distribution adds them
+SENTIMENT_TYPES = ['Positive', 'Neutral', 'Negative']
+
+# Window frequencies accepted by SentimentAggregator.windows
+WINDOW_FREQUENCIES = {'D': 'D', 'W': 'W-SUN'}
+
+
+# Function to add the missing sentiments and the Total/Mean/Median columns to per-domain counts
+def summarise_sentiment_counts(sentiment_counts):
+    # The columns mix sentiments with the Total/Mean/Median summaries, so they are not named after title_sentiment
+    sentiment_counts.columns.name = None
+
+    # Ensure that sentiment types are present, and handle dynamic cases if needed
+    for sentiment in SENTIMENT_TYPES:
+        if sentiment not in sentiment_counts.columns:
+            sentiment_counts[sentiment] = 0
+
+    # Calculate total, mean, and median sentiment counts for each domain
+    sentiment_counts['Total'] = sentiment_counts.sum(axis=1)
+    sentiment_counts['Mean'] = sentiment_counts[SENTIMENT_TYPES].mean(axis=1)
+    sentiment_counts['Median'] = sentiment_counts[SENTIMENT_TYPES].median(axis=1)
+
+    return sentiment_counts
+
+
+class SentimentAggregator:
+    '''
+    Per-domain sentiment counts updated batch by batch.
+
+    Domains and sentiment labels are given compact integer codes the first
+    time they are seen, and counts are kept in (domain, sentiment) integer
+    arrays, one per day when batches have a time column. Aggregators built
+    on different parts of the data can be merged. result() gives the same
+    DataFrame as utils.website_sentiment_distribution over everything
+    added so far, or over a date range.
+    '''
+    def __init__(self, domain_column='source_name', sentiment_column='title_sentiment', time_column='published_at'):
+        '''
+        time_column: Column used for the daily and weekly windows, ignored when a batch does not have it
+        '''
+        self.domain_column = domain_column
+        self.sentiment_column = sentiment_column
+        self.time_column = time_column
+        self.domains = []
+        self.sentiments = []
+        self._domain_codes = {}
+        self._sentiment_codes = {}
+        # day (pd.Timestamp, or None for rows without a time) -> counts[domain_code, sentiment_code]
+        self._counts = {}
+
+    def domain_code(self, domain):
+        return self._domain_codes[domain]
+
+    def _code(self, value, codes, labels):
+        # Code of a domain or sentiment, a new one the first time it is seen
+        if value not in codes:
+            codes[value] = len(labels)
+            labels.append(value)
+        return codes[value]
+
+    def _encode(self, values, codes, labels):
+        # Codes local to the batch, mapped to the aggregator's codes; missing values get -1
+        local_codes, uniques = pd.factorize(values)
+        mapping = np.array([self._code(value, codes, labels) for value in uniques], dtype=np.int64)
+        return np.where(local_codes >= 0, mapping[local_codes] if len(mapping) else -1, -1)
+
+    def _array(self, day):
+        # Counts of one day, grown to the current number of domains and sentiments
+        shape = (len(self.domains), len(self.sentiments))
+        counts = self._counts.get(day)
+        if counts is None:
+            counts = np.zeros(shape, dtype=np.int64)
+        elif counts.shape != shape:
+            grown = np.zeros(shape, dtype=np.int64)
+            grown[:counts.shape[0], :counts.shape[1]] = counts
+            counts = grown
+        self._counts[day] = counts
+        return counts
+
+    def update(self, batch, columns=None):
+        '''
+        Adds a DataFrame chunk, an iterable of chunks, or a batch of DB rows
+        (tuples or dicts, e.g. from cursor.fetchmany) with the given columns,
+        by default domain, sentiment and time. Rows with a missing domain or
+        sentiment are skipped, as groupby does.
+        '''
+        if isinstance(batch, pd.DataFrame):
+            return self._update_frame(batch)
+        if isinstance(batch, list) and (not batch or not isinstance(batch[0], pd.DataFrame)):
+            columns = columns or [self.domain_column, self.sentiment_column, self.time_column]
+            return self._update_frame(pd.DataFrame.from_records(batch, columns=columns))
+        for chunk in batch:
+            self._update_frame(chunk)
+        return self
+
+    def _update_frame(self, chunk):
+        domains = self._encode(chunk[self.domain_column], self._domain_codes, self.domains)
+        sentiments = self._encode(chunk[self.sentiment_column], self._sentiment_codes, self.sentiments)
+        keep = (domains >= 0) & (sentiments >= 0)
+        domains, sentiments = domains[keep], sentiments[keep]
+
+        if self.time_column in chunk.columns:
+            days = pd.to_datetime(chunk[self.time_column]).dt.floor('D').to_numpy()[keep]
+            day_codes, day_values = pd.factorize(days, use_na_sentinel=False)
+        else:
+            day_codes, day_values = np.zeros(len(domains), dtype=np.int64), [None]
+
+        # One count per (day, domain, sentiment) combination present in the chunk
+        n_domains, n_sentiments = len(self.domains), len(self.sentiments)
+        keys = (day_codes * n_domains + domains) * n_sentiments + sentiments
+        unique_keys, counts = np.unique(keys, return_counts=True)
+        unique_days, rest = np.divmod(unique_keys, n_domains * n_sentiments)
+        unique_domains, unique_sentiments = np.divmod(rest, n_sentiments)
+        for day_code in np.unique(unique_days):
+            rows = unique_days == day_code
+            day = day_values[day_code]
+            day = None if day is None or pd.isna(day) else pd.Timestamp(day)
+            np.add.at(self._array(day), (unique_domains[rows], unique_sentiments[rows]), counts[rows])
+        return self
+
+    def merge(self, other):
+        '''
+        Adds the counts of another aggregator to this one
+        '''
+        domain_map = np.array([self._code(domain, self._domain_codes, self.domains)
+                               for domain in other.domains], dtype=np.int64)
+        sentiment_map = np.array([self._code(sentiment, self._sentiment_codes, self.sentiments)
+                                  for sentiment in other.sentiments], dtype=np.int64)
+        for day, counts in other._counts.items():
+            rows, columns = np.nonzero(counts)
+            np.add.at(self._array(day), (domain_map[rows], sentiment_map[columns]), counts[rows, columns])
+        return self
+
+    def state(self):
+        '''
+        Plain-Python state, e.g. to pickle between runs or send between processes
+        '''
+        return {
+            'columns': (self.domain_column, self.sentiment_column, self.time_column),
+            'domains': list(self.domains),
+            'sentiments': list(self.sentiments),
+            'counts': {day: counts.copy() for day, counts in self._counts.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        aggregator = cls(*state['columns'])
+        aggregator.domains = list(state['domains'])
+        aggregator.sentiments = list(state['sentiments'])
+        aggregator._domain_codes = {domain: code for code, domain in enumerate(aggregator.domains)}
+        aggregator._sentiment_codes = {sentiment: code for code, sentiment in enumerate(aggregator.sentiments)}
+        aggregator._counts = {day: counts.copy() for day, counts in state['counts'].items()}
+        return aggregator
+
+    def counts(self, start=None, end=None):
+        '''
+        (domain, sentiment) count array over the days start <= day < end,
+        everything when both are None (rows without a time are only counted then)
+        '''
+        total = np.zeros((len(self.domains), len(self.sentiments)), dtype=np.int64)
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        for day in list(self._counts):
+            if start is not None or end is not None:
+                if day is None or (start is not None and day < start) or (end is not None and day >= end):
+                    continue
+            total += self._array(day)
+        return total
+
+    def _distribution(self, counts):
+        # Only the domains and sentiments with rows, sorted as groupby().size().unstack() sorts them
+        domains = counts.sum(axis=1) > 0
+        sentiments = counts.sum(axis=0) > 0
+        sentiment_counts = pd.DataFrame(
+            counts[np.ix_(domains, sentiments)],
+            index=pd.Index([domain for domain, used in zip(self.domains, domains) if used], name=self.domain_column),
+            columns=pd.Index([s for s, used in zip(self.sentiments, sentiments) if used], name=self.sentiment_column),
+        )
+        sentiment_counts = sentiment_counts.sort_index(axis=0).sort_index(axis=1)
+        return summarise_sentiment_counts(sentiment_counts)
+
+    def result(self, start=None, end=None):
+        '''
+        The website_sentiment_distribution of the articles published in
+        [start, end), of every article added when both are None
+        '''
+        return self._distribution(self.counts(start, end))
+
+    def windows(self, freq='D'):
+        '''
+        The distribution of every daily ('D') or weekly ('W', Monday to
+        Sunday) window, indexed by (window start, domain)
+        '''
+        if freq not in WINDOW_FREQUENCIES:
+            raise ValueError(f"Unknown window frequency: {freq}")
+        periods = {}
+        for day in self._counts:
+            if day is not None:
+                start = day.to_period(WINDOW_FREQUENCIES[freq]).start_time
+                periods.setdefault(start, []).append(day)
+
+        frames = {}
+        for start in sorted(periods):
+            counts = sum(self._array(day) for day in periods[start])
+            frames[start] = self._distribution(counts)
+        if not frames:
+            return self._distribution(np.zeros((len(self.domains), len(self.sentiments)), dtype=np.int64))
+        return pd.concat(frames, names=['window_start'])
@@ -0,0 +1,93 @@
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from src.nltk_setup import require as require_nltk
+
+# Number of documents handed to a worker at a time by TextNormalizer.normalize_batch
+NORMALIZE_CHUNK_SIZE = 1000
+
+_english_stopwords = None
+
+
+# Function to load NLTK's English stopwords once per process
+def english_stopwords():
+    global _english_stopwords
+    if _english_stopwords is None:
+        from nltk.corpus import stopwords
+        require_nltk('stopwords')
+        _english_stopwords = frozenset(stopwords.words('english'))
+    return _english_stopwords
+
+
+class TextNormalizer:
+    '''
+    A reusable text normalisation stage: tokenises a document, drops
+    stopwords and optionally lowercases the remaining tokens.
+
+    The stopword set and the token pattern are built once, so normalising
+    a document costs one split and one set lookup per token. With the
+    defaults the output is the same as utils.remove_stopwords: whitespace
+    tokens compared case-insensitively to NLTK's English stopwords, kept in
+    their original case and joined by single spaces.
+    '''
+    def __init__(self, stop_words=None, lowercase=False, token_pattern=None):
+        '''
+        stop_words: Iterable of stopwords, NLTK's English list if None
+        lowercase: Whether to lowercase the kept tokens
+        token_pattern: Regular expression matching a token, whitespace splitting if None
+        '''
+        if stop_words is None:
+            stop_words = english_stopwords()
+        self.stop_words = frozenset(word.lower() for word in stop_words)
+        self.lowercase = lowercase
+        self.token_pattern = re.compile(token_pattern) if token_pattern is not None else None
+
+    def tokenize(self, text):
+        if self.token_pattern is None:
+            return text.split()
+        return self.token_pattern.findall(text)
+
+    def normalize(self, text):
+        stop_words = self.stop_words
+        if self.lowercase:
+            tokens = [token for token in (token.lower() for token in self.tokenize(text)) if token not in stop_words]
+        else:
+            tokens = [token for token in self.tokenize(text) if token.lower() not in stop_words]
+        return ' '.join(tokens)
+
+    __call__ = normalize
+
+    def _normalize_many(self, texts):
+        return [self.normalize(text) for text in texts]
+
+    def normalize_batch(self, texts, n_jobs=1, chunk_size=NORMALIZE_CHUNK_SIZE):
+        '''
+        Normalises an iterable of texts. A pandas Series gives a Series with
+        the same index, anything else a list. n_jobs other than 1 spreads
+        the work over a pool of spawned processes (None for all cores), safe
+        to use from a multi-threaded caller.
+        '''
+        index = texts.index if isinstance(texts, pd.Series) else None
+        texts = list(texts)
+
+        if n_jobs == 1 or len(texts) <= chunk_size:
+            normalized = self._normalize_many(texts)
+        else:
+            chunks = [texts[offset:offset + chunk_size] for offset in range(0, len(texts), chunk_size)]
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn')) as executor:
+                normalized = [text for chunk in executor.map(self._normalize_many, chunks) for text in chunk]
+
+        if index is not None:
+            return pd.Series(normalized, index=index)
+        return normalized
+
+
+_default_normalizer = None
+
+# Function to return the normaliser used by utils.remove_stopwords, built on first use
+def default_normalizer():
+    global _default_normalizer
+    if _default_normalizer is None:
+        _default_normalizer = TextNormalizer()
+    return _default_normalizer
@@ -0,0 +1,196 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from src import models
+from src.text import default_normalizer
+
+# Number of articles per partial_fit call
+TOPIC_BATCH_SIZE = 1000
+
+# File names inside a saved model directory
+MODEL_FILE = 'model.pickle'
+STATE_FILE = 'state.json'
+
+
+# Function to build the text of every article of a DataFrame: title and content with stopwords removed
+def article_texts(dataframe, normalizer=None):
+    normalizer = normalizer or default_normalizer()
+    texts = dataframe['title'].fillna('') + ' ' + dataframe['content'].fillna('')
+    return normalizer.normalize_batch(texts.tolist())
+
+# Function to regroup DataFrame chunks into batches of batch_size rows, a short last batch joining the previous one
+def _article_batches(data, batch_size, min_size):
+    chunks = [data] if isinstance(data, pd.DataFrame) else data
+    pending = []
+    pending_rows = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_rows += len(chunk)
+        while pending_rows >= batch_size + min_size:
+            frame = pd.concat(pending)
+            yield frame.iloc[:batch_size]
+            pending = [frame.iloc[batch_size:]]
+            pending_rows -= batch_size
+    if pending_rows:
+        yield pd.concat(pending)
+
+
+class IncrementalTopicModel:
+    '''
+    A BERTopic model updated on mini-batches instead of being refitted.
+
+    It uses BERTopic's online components: IncrementalPCA in place of UMAP,
+    MiniBatchKMeans in place of HDBSCAN and an OnlineCountVectorizer whose
+    counts decay between batches, so every partial_fit refines the same
+    n_topics topics. New articles are assigned topics with transform,
+    without refitting. The state is saved to and loaded from a directory.
+    '''
+    def __init__(self, n_topics=50, n_components=5, decay=0.01, random_state=42):
+        '''
+        n_topics: Number of clusters of MiniBatchKMeans, fixed for the life of the model
+        n_components: Dimensions kept by IncrementalPCA
+        decay: Share of the word counts forgotten at every batch
+        '''
+        self.n_topics = n_topics
+        self.n_components = n_components
+        self.decay = decay
+        self.random_state = random_state
+        self.n_documents = 0
+        self.n_batches = 0
+        self.topic_model = None
+
+    def _build(self):
+        from bertopic import BERTopic
+        from bertopic.vectorizers import OnlineCountVectorizer
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.decomposition import IncrementalPCA
+
+        return BERTopic(
+            embedding_model=models.registry.get('embedding'),
+            umap_model=IncrementalPCA(n_components=self.n_components),
+            hdbscan_model=MiniBatchKMeans(n_clusters=self.n_topics, random_state=self.random_state, n_init=3),
+            vectorizer_model=OnlineCountVectorizer(stop_words='english', decay=self.decay),
+        )
+
+    def min_batch_size(self):
+        '''
+        Smallest batch partial_fit accepts: the first one has to fill every cluster
+        '''
+        return max(self.n_components, self.n_topics if self.n_batches == 0 else 1)
+
+    def partial_fit(self, texts, embeddings=None):
+        '''
+        Updates the model with a batch of normalised texts and returns their topics.
+        embeddings: Precomputed embeddings of the texts, computed if omitted
+        '''
+        texts = list(texts)
+        if len(texts) < self.min_batch_size():
+            raise ValueError(f"Batches need at least {self.min_batch_size()} texts, got {len(texts)}")
+        if self.topic_model is None:
+            self.topic_model = self._build()
+
+        self.topic_model.partial_fit(texts, embeddings)
+        self.n_documents += len(texts)
+        self.n_batches += 1
+        return list(self.topic_model.topics_)
+
+    def update(self, data, batch_size=TOPIC_BATCH_SIZE, normalizer=None, embedding_store=None, id_column='article_id'):
+        '''
+        Updates the model with the articles of a DataFrame or an iterable of
+        DataFrame chunks, batch_size articles per partial_fit call. Returns
+        the topic of every article, indexed like the articles.
+
+        embedding_store: EmbeddingStore of the article texts; embeddings are
+                         read from it, and the missing ones added to it
+        '''
+        topics = []
+        min_size = self.min_batch_size()
+        for batch in _article_batches(data, max(batch_size, min_size), min_size):
+            texts = article_texts(batch, normalizer)
+            embeddings = None
+            if embedding_store is not None:
+                embedding_store.fill(batch.assign(normalized_text=texts), id_column=id_column, text='normalized_text')
+                embeddings = np.asarray(embedding_store.get(batch[id_column], text='normalized_text'))
+            topics.append(pd.Series(self.partial_fit(texts, embeddings), index=batch.index))
+        if not topics:
+            return pd.Series(dtype='int64')
+        return pd.concat(topics)
+
+    def transform(self, texts, embeddings=None):
+        '''
+        Assigns topics to normalised texts without updating the model
+        '''
+        if self.topic_model is None:
+            raise ValueError("The topic model has not been fitted yet")
+        topics, _ = self.topic_model.transform(list(texts), embeddings)
+        return list(topics)
+
+    def assign(self, dataframe, normalizer=None):
+        '''
+        Returns the topic of every article of a DataFrame, indexed like it
+        '''
+        return pd.Series(self.transform(article_texts(dataframe, normalizer)), index=dataframe.index)
+
+    def topic_info(self):
+        if self.topic_model is None:
+            raise ValueError("The topic model has not been fitted yet")
+        return self.topic_model.get_topic_info()
+
+    def state(self):
+        return {
+            'n_topics': self.n_topics,
+            'n_components': self.n_components,
+            'decay': self.decay,
+            'random_state': self.random_state,
+            'n_documents': self.n_documents,
+            'n_batches': self.n_batches,
+            'embedding_model': models.registry.name('embedding'),
+        }
+
+    def save(self, path):
+        '''
+        Saves the model to the directory path. The embedding model is not
+        saved, it is taken from the model registry when loading.
+        '''
+        if self.topic_model is None:
+            raise ValueError("The topic model has not been fitted yet")
+
+        # Write a new directory and swap it in, so a crash never leaves a half-saved model behind
+        tmp_path = path.rstrip(os.sep) + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        # Pickling keeps the online clustering and vectorizer, which safetensors would drop
+        self.topic_model.save(os.path.join(tmp_path, MODEL_FILE), serialization='pickle', save_embedding_model=False)
+        with open(os.path.join(tmp_path, STATE_FILE), 'w') as file:
+            json.dump(self.state(), file, indent=2)
+
+        old_path = path.rstrip(os.sep) + '.old'
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path):
+        from bertopic import BERTopic
+
+        with open(os.path.join(path, STATE_FILE)) as file:
+            state = json.load(file)
+        if state['embedding_model'] != models.registry.name('embedding'):
+            print(f"Warning: the topic model was fitted with the embedding model {state['embedding_model']}, "
+                  f"not {models.registry.name('embedding')}")
+
+        model = cls(state['n_topics'], state['n_components'], state['decay'], state['random_state'])
+        model.n_documents = state['n_documents']
+        model.n_batches = state['n_batches']
+        model.topic_model = BERTopic.load(os.path.join(path, MODEL_FILE), embedding_model=models.registry.get('embedding'))
+        return model
+
+    @classmethod
+    def load_or_create(cls, path, **kwargs):
+        if path is not None and os.path.exists(os.path.join(path, STATE_FILE)):
+            return cls.load(path)
+        return cls(**kwargs)
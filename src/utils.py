@@ -1,50 +1,73 @@
 import pandas as pd
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk import pos_tag, ne_chunk
 from collections import Counter
-from keybert import KeyBERT
-from sklearn.metrics.pairwise import cosine_similarity
+from itertools import islice
+from src.nlp_cache import cached, cached_call, get_cache
+from src import models
+from src.nltk_setup import require as require_nltk
+from src.text import default_normalizer
+from src.sentiment import SentimentAggregator, summarise_sentiment_counts
+from src.topics import IncrementalTopicModel, TOPIC_BATCH_SIZE
+from src.embeddings import EMBEDDING_BATCH_SIZE
 import numpy as np
-import matplotlib.pyplot as plt
-from nltk.corpus import stopwords
-import mlflow
-import mlflow.sklearn
-from bertopic import BERTopic
-from sklearn.feature_extraction.text import TfidfVectorizer
-
-nltk.download('stopwords')
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-nltk.download('maxent_ne_chunker')
-nltk.download('words')
 
+# NLTK, scikit-learn, BERTopic and mlflow are imported inside the functions using them,
+# so importing this module stays fast and needs no network; NLTK data is installed with
+# `python -m src.nltk_setup`
+
+
+@cached("countries", version=1)
 def extract_countries_from_article_content(text):
     """
     Extracts countries (Geopolitical Entities) from a given article text.
     """
+    from nltk import pos_tag, ne_chunk
+    from nltk.tokenize import word_tokenize
+
+    require_nltk('tokenizer', 'tagger', 'chunker', 'words')
     words = word_tokenize(text)
     tagged_words = pos_tag(words)
     named_entities = ne_chunk(tagged_words)
     countries = [chunk[0] for chunk in named_entities if hasattr(chunk, 'label') and chunk.label() == 'GPE']
     return countries
 
-def find_popular_articles(df, max_rows=100):
+def find_popular_articles(df, max_rows=100, n_jobs=1):
     """
     Processes articles to find the most common countries mentioned.
+    df can also be an iterable of DataFrame chunks, e.g. from
+    NewsDataLoader.iter_data; then max_rows=None processes every chunk.
+    n_jobs other than 1 spreads the extraction over a process pool
+    (None for all cores), see src.ner.count_countries.
     """
+    if n_jobs != 1:
+        from src.ner import count_countries
+        chunks = [df] if isinstance(df, pd.DataFrame) else df
+        contents = (content for chunk in chunks for content in chunk['content'])
+        if max_rows is not None:
+            contents = islice(contents, max_rows)
+        return count_countries(contents, n_jobs=n_jobs)
+
+    if not isinstance(df, pd.DataFrame):
+        country_counts = Counter()
+        processed = 0
+        for chunk in df:
+            if max_rows is not None:
+                chunk = chunk.head(max_rows - processed)
+            for content in chunk['content']:
+                country_counts.update(extract_countries_from_article_content(content))
+            processed += len(chunk)
+            if max_rows is not None and processed >= max_rows:
+                break
+        return country_counts
+
     # List to store all mentioned countries
     all_countries = []
     
-    # Iterate over rows of the DataFrame
-    for index, row in df.iterrows():
+    # Iterate over the first max_rows rows of the DataFrame, every row when max_rows is None
+    rows = df if max_rows is None else df.head(max_rows)
+    for content in rows['content']:
         # Extract countries from the article content
-        countries = extract_countries_from_article_content(row['content'])
+        countries = extract_countries_from_article_content(content)
         all_countries.extend(countries)
-        
-        # Stop processing if max_rows is reached
-        if index + 1 >= max_rows:
-            break
     
     # Count occurrences of each country
     country_counts = Counter(all_countries)
@@ -53,24 +76,111 @@ def find_popular_articles(df, max_rows=100):
     return country_counts
 
 def website_sentiment_distribution(data):
+    # data can also be an iterable of DataFrame chunks, counted incrementally by a SentimentAggregator
+    if not isinstance(data, pd.DataFrame):
+        return SentimentAggregator().update(data).result()
+
     # Generate sentiment counts for each domain
-    sentiment_counts = data.groupby(['source_name', 'title_sentiment']).size().unstack(fill_value=0)
-    
-    # Ensure that sentiment types are present, and handle dynamic cases if needed
-    sentiment_types = ['Positive', 'Neutral', 'Negative']
-    for sentiment in sentiment_types:
-        if sentiment not in sentiment_counts.columns:
-            sentiment_counts[sentiment] = 0
-    
-    # Calculate total, mean, and median sentiment counts for each domain
-    sentiment_counts['Total'] = sentiment_counts.sum(axis=1)
-    sentiment_counts['Mean'] = sentiment_counts[sentiment_types].mean(axis=1)
-    sentiment_counts['Median'] = sentiment_counts[sentiment_types].median(axis=1)
+    # observed=True: with categorical columns, domains filtered out of data get no all-zero row
+    sentiment_counts = data.groupby(['source_name', 'title_sentiment'], observed=True).size().unstack(fill_value=0)
+    return summarise_sentiment_counts(sentiment_counts)
+
+# KeyBERT arguments that decide the candidate keywords, shared by extract_embeddings and extract_keywords
+KEYBERT_VECTORIZER_ARGS = ('candidates', 'keyphrase_ngram_range', 'stop_words', 'min_df', 'vectorizer')
+
+# Function to return the KeyBERT model shared by this process, loading it on first use
+def _get_keybert():
+    return models.registry.get('keybert')
+
+# Function to extract the keywords of one text, through the NLP result cache
+def _extract_keywords(kw_model, text, **kwargs):
+    return cached_call(
+        "keybert", 1, text,
+        lambda: kw_model.extract_keywords(text, **kwargs),
+        params=(models.registry.name('embedding'), sorted(kwargs.items()))
+    )
+
+# Function to extract the keywords of many texts, embedding batch_size documents per model call
+def _extract_keywords_batched(kw_model, texts, batch_size, precompute_embeddings=False, doc_embeddings=None, **kwargs):
+    """
+    Returns one keyword list per text, the same as calling extract_keywords
+    on each text. Texts already in the NLP result cache are not embedded
+    again and missing texts (NaN/None) get no keywords. With
+    precompute_embeddings the document and candidate word embeddings of a
+    batch are computed once up front and handed to extract_keywords.
+    doc_embeddings, one row per text (e.g. from an EmbeddingStore), are
+    used instead of embedding the documents again.
+    """
+    texts = list(texts)
+    results = [[] for _ in texts]
+    params = (models.registry.name('embedding'), sorted(kwargs.items()))
 
-    return sentiment_counts
+    cache = get_cache()
+    keys = {}
+    if cache is not None:
+        keys = {i: cache.key("keybert", 1, text, params) for i, text in enumerate(texts) if isinstance(text, str)}
+        found = cache.get_many(set(keys.values()))
+        for i, key in keys.items():
+            if key in found:
+                results[i] = found[key]
+        todo = [i for i in keys if keys[i] not in found]
+    else:
+        todo = [i for i, text in enumerate(texts) if isinstance(text, str)]
+
+    vectorizer_args = {name: value for name, value in kwargs.items() if name in KEYBERT_VECTORIZER_ARGS}
+    for offset in range(0, len(todo), batch_size):
+        batch = todo[offset:offset + batch_size]
+        docs = [texts[i] for i in batch]
+        if doc_embeddings is not None:
+            keywords = kw_model.extract_keywords(docs, doc_embeddings=np.asarray(doc_embeddings[batch]), **kwargs)
+        elif precompute_embeddings:
+            batch_embeddings, word_embeddings = kw_model.extract_embeddings(docs, **vectorizer_args)
+            keywords = kw_model.extract_keywords(docs, doc_embeddings=batch_embeddings,
+                                                 word_embeddings=word_embeddings, **kwargs)
+        else:
+            keywords = kw_model.extract_keywords(docs, **kwargs)
 
-def keybert_keyword_extraction(news_data):
-    kw_model = KeyBERT()
+        # KeyBERT returns a flat keyword list when it gets a single document
+        if len(docs) == 1:
+            keywords = [keywords]
+        for i, doc_keywords in zip(batch, keywords):
+            results[i] = doc_keywords
+        if cache is not None:
+            cache.set_many({keys[i]: results[i] for i in batch})
+
+    return results
+
+# Function to read the content embeddings of articles from a store, adding the missing ones first
+def _stored_embeddings(embedding_store, dataframe, id_column):
+    embedding_store.fill(dataframe, id_column=id_column, text='content')
+    return embedding_store.get(dataframe[id_column], text='content')
+
+def keybert_keyword_extraction(news_data, batch_size=None, precompute_embeddings=False,
+                               embedding_store=None, id_column='article_id'):
+    """
+    Extracts the top 5 keywords of every title and content. batch_size
+    switches to the batched path, which hands lists of documents to
+    KeyBERT instead of one document per call. embedding_store, an
+    EmbeddingStore of article contents, provides the content embeddings
+    (articles missing from it are embedded and added first).
+    """
+    kw_model = _get_keybert()
+
+    if embedding_store is not None:
+        batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        content_embeddings = _stored_embeddings(embedding_store, news_data, id_column)
+        title_keywords_list = _extract_keywords_batched(kw_model, news_data['title'], batch_size,
+                                                        precompute_embeddings, top_n=5)
+        content_keywords_list = _extract_keywords_batched(kw_model, news_data['content'], batch_size,
+                                                          doc_embeddings=content_embeddings, top_n=5)
+        return title_keywords_list, content_keywords_list
+
+    if batch_size is not None:
+        title_keywords_list = _extract_keywords_batched(kw_model, news_data['title'], batch_size,
+                                                        precompute_embeddings, top_n=5)
+        content_keywords_list = _extract_keywords_batched(kw_model, news_data['content'], batch_size,
+                                                          precompute_embeddings, top_n=5)
+        return title_keywords_list, content_keywords_list
 
     title_keywords_list = []
     content_keywords_list = []
@@ -80,46 +190,82 @@ def keybert_keyword_extraction(news_data):
         content_text = row['content']
 
         # Extract keywords
-        title_keywords = kw_model.extract_keywords(title_text, top_n=5)
-        content_keywords = kw_model.extract_keywords(content_text, top_n=5)
+        title_keywords = _extract_keywords(kw_model, title_text, top_n=5)
+        content_keywords = _extract_keywords(kw_model, content_text, top_n=5)
 
         title_keywords_list.append(title_keywords)
         content_keywords_list.append(content_keywords)
 
     return title_keywords_list, content_keywords_list
 
+# Function to flatten keyword lists into row numbers, keywords and scores
+def _flatten_keywords(keywords_list):
+    lengths = np.fromiter(map(len, keywords_list), dtype=np.int64, count=len(keywords_list))
+    rows = np.repeat(np.arange(len(keywords_list)), lengths)
+    pairs = [pair for keywords in keywords_list for pair in keywords]
+    keywords = np.empty(len(pairs), dtype=object)
+    keywords[:] = [keyword for keyword, _ in pairs]
+    scores = np.fromiter((score for _, score in pairs), dtype=np.float64, count=len(pairs))
+    return rows, keywords, scores
+
+# Function to build a CSR matrix from keyword ids, as with dict(keywords) a repeated keyword keeps its last score
+def _keyword_matrix(rows, columns, scores, shape):
+    from scipy.sparse import csr_matrix
+
+    # Keep the last occurrence of every (row, keyword): unique over the reversed cell ids
+    cells = rows * shape[1] + columns
+    _, last = np.unique(cells[::-1], return_index=True)
+    keep = len(cells) - 1 - last
+    return csr_matrix((scores[keep], (rows[keep], columns[keep])), shape=shape)
+
+# Function to compute the norm of every row of a sparse matrix
+def _row_norms(matrix):
+    return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+
 def calculate_similarity(title_keywords_list, content_keywords_list):
-    similarity_list = []
-
-    for title_keywords, content_keywords in zip(title_keywords_list, content_keywords_list):
-        # Convert the lists of tuples to dictionaries for easy access
-        title_dict = dict(title_keywords)
-        content_dict = dict(content_keywords)
-
-        # Get the set of all unique keywords
-        all_keywords = list(set(title_dict.keys()).union(set(content_dict.keys())))
-        # Create vectors based on the relevance scores for the title and content
-        title_vector = np.array([title_dict.get(keyword, 0) for keyword in all_keywords])
-        content_vector = np.array([content_dict.get(keyword, 0) for keyword in all_keywords])
-       
-        # Calculate cosine similarity
-        if np.linalg.norm(title_vector) == 0 or np.linalg.norm(content_vector) == 0:
-            similarity = 0
-        else:
-            similarity = cosine_similarity([title_vector], [content_vector])[0][0]
+    """
+    Cosine similarity between the keyword scores of each title and its
+    content, 0 when either has no (non-zero) keywords. All pairs are
+    computed at once on sparse matrices sharing one keyword vocabulary.
+    """
+    title_keywords_list = list(title_keywords_list)
+    content_keywords_list = list(content_keywords_list)
+    # Pairs are zipped, so extra rows on either side are ignored
+    n_pairs = min(len(title_keywords_list), len(content_keywords_list))
+    title_rows, title_keywords, title_scores = _flatten_keywords(title_keywords_list[:n_pairs])
+    content_rows, content_keywords, content_scores = _flatten_keywords(content_keywords_list[:n_pairs])
+
+    # One vocabulary for both sides, so equal keywords share a column
+    codes, vocabulary = pd.factorize(np.concatenate([title_keywords, content_keywords]))
+    shape = (n_pairs, len(vocabulary))
+    title_matrix = _keyword_matrix(title_rows, codes[:len(title_keywords)], title_scores, shape)
+    content_matrix = _keyword_matrix(content_rows, codes[len(title_keywords):], content_scores, shape)
 
-        similarity_list.append(similarity)
+    dots = np.asarray(title_matrix.multiply(content_matrix).sum(axis=1)).ravel()
+    title_norms = _row_norms(title_matrix)
+    content_norms = _row_norms(content_matrix)
 
-    return similarity_list
+    similarity = np.zeros(n_pairs)
+    nonzero = (title_norms != 0) & (content_norms != 0)
+    similarity[nonzero] = dots[nonzero] / (title_norms[nonzero] * content_norms[nonzero])
+    return similarity.tolist()
 
 
 def remove_stopwords(text):
-    stop_words = set(stopwords.words('english'))
-    words = text.split()
-    filtered_words = [word for word in words if word.lower() not in stop_words]
-    return ' '.join(filtered_words)
+    return default_normalizer().normalize(text)
+
+def perform_topic_modeling_with_mlflow(dataframe, embedding_store=None, id_column='article_id'):
+    """
+    Fits BERTopic on a sample of 1000 articles and returns its topic info
+    and the model. embedding_store, an EmbeddingStore of the normalised
+    title and content of the articles, provides their embeddings instead
+    of the model. update_topic_model_with_mlflow updates an incremental
+    model with every article instead.
+    """
+    import mlflow
+    import mlflow.sklearn
+    from bertopic import BERTopic
 
-def perform_topic_modeling_with_mlflow(dataframe):
     # Start MLflow run
     with mlflow.start_run():
         # Sample data and combine title and content
@@ -128,11 +274,16 @@ def perform_topic_modeling_with_mlflow(dataframe):
         sampled_list = sampled_data['text'].tolist()
         
         # Remove stopwords from the text
-        sampled_list = [remove_stopwords(text) for text in sampled_list]
+        sampled_list = default_normalizer().normalize_batch(sampled_list)
         
-        # Fit the BERTopic model
-        topic_model = BERTopic()
-        topics, probs = topic_model.fit_transform(sampled_list)
+        # Fit the BERTopic model on the embedding model shared with KeyBERT
+        topic_model = BERTopic(embedding_model=models.registry.get('embedding'))
+        embeddings = None
+        if embedding_store is not None:
+            sampled_data['normalized_text'] = sampled_list
+            embedding_store.fill(sampled_data, id_column=id_column, text='normalized_text')
+            embeddings = np.asarray(embedding_store.get(sampled_data[id_column], text='normalized_text'))
+        topics, probs = topic_model.fit_transform(sampled_list, embeddings)
         print('Model fitting Done!')
         
         # Log model and parameters to MLflow
@@ -154,8 +305,49 @@ def perform_topic_modeling_with_mlflow(dataframe):
     
 
 
+# Function to update the incremental topic model saved at model_path and log the run to MLflow
+def update_topic_model_with_mlflow(data, model_path, batch_size=TOPIC_BATCH_SIZE, n_topics=50,
+                                   embedding_store=None, id_column='article_id'):
+    """
+    Updates the incremental topic model saved at model_path (a new one with
+    n_topics topics if there is none yet) with every article of data, which
+    can also be an iterable of DataFrame chunks, batch_size articles at a
+    time, and saves it back. Returns the topic info, the model and the
+    topic of every article. embedding_store is used as in
+    perform_topic_modeling_with_mlflow.
+    """
+    import mlflow
+
+    with mlflow.start_run():
+        topic_model = IncrementalTopicModel.load_or_create(model_path, n_topics=n_topics)
+        n_documents = topic_model.n_documents
+        topics = topic_model.update(data, batch_size, embedding_store=embedding_store, id_column=id_column)
+        topic_model.save(model_path)
+        print('Model update Done!')
+
+        mlflow.log_param("model_type", "IncrementalBERTopic")
+        mlflow.log_param("n_topics", topic_model.n_topics)
+        mlflow.log_param("batch_size", batch_size)
+        mlflow.log_metric("n_samples", len(topics))
+        mlflow.log_metric("n_documents_total", topic_model.n_documents)
+        mlflow.log_metric("n_documents_before", n_documents)
+
+        topic_info = topic_model.topic_info()
+        topic_info.to_csv("topic_info.csv", index=False)
+        mlflow.log_artifact("topic_info.csv")
+        mlflow.log_artifacts(model_path, artifact_path="incremental_topic_model")
+
+        print("Logged to MLflow successfully!")
+
+        return topic_info, topic_model, topics
+
 # Function to extract named entities
+@cached("named_entities", version=1)
 def get_named_entities(text):
+    from nltk import pos_tag, ne_chunk, Tree
+    from nltk.tokenize import word_tokenize
+
+    require_nltk('tokenizer', 'tagger', 'chunker', 'words')
     chunked = ne_chunk(pos_tag(word_tokenize(text)))
     entities = []
     for chunk in chunked:
@@ -165,16 +357,30 @@ def get_named_entities(text):
     return entities
 
 # Function to extract keywords and entities from articles
-def extract_features(dataframe):
-    kw_model = KeyBERT()
+def extract_features(dataframe, batch_size=None, embedding_store=None, id_column='article_id'):
+    kw_model = _get_keybert()
     
     # Lists to store extracted features
     named_entities_list = []
     keywords_list = []
+
+    # Content embeddings read from the store instead of being recomputed
+    doc_embeddings = None
+    if embedding_store is not None:
+        batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        doc_embeddings = _stored_embeddings(embedding_store, dataframe, id_column)
+
+    if batch_size is not None:
+        batched_keywords = _extract_keywords_batched(kw_model, dataframe['content'], batch_size,
+                                                     doc_embeddings=doc_embeddings,
+                                                     keyphrase_ngram_range=(1, 2), stop_words='english')
     
-    for article in dataframe['content']:
+    for index, article in enumerate(dataframe['content']):
         named_entities = get_named_entities(article)
-        keywords = kw_model.extract_keywords(article, keyphrase_ngram_range=(1, 2), stop_words='english')
+        if batch_size is not None:
+            keywords = batched_keywords[index]
+        else:
+            keywords = _extract_keywords(kw_model, article, keyphrase_ngram_range=(1, 2), stop_words='english')
         
         named_entities_list.append(named_entities)
         keywords_list.append([kw for kw, _ in keywords])
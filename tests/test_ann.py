@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from src.ann import IVFIndex, index_store, near_duplicates, cluster_stories, cross_site_stories
+from src.embeddings import EmbeddingStore
+
+
+class TestIVFIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.vectors = rng.normal(size=(500, 16)).astype(np.float32)
+        self.ids = np.arange(1000, 1500)
+
+    def brute_force(self, queries, k):
+        unit = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        scores = queries @ unit.T
+        return self.ids[np.argsort(-scores, axis=1)[:, :k]]
+
+    def test_probing_every_list_is_exact(self):
+        index = IVFIndex(n_lists=10, n_probe=10).train(self.vectors)
+        index.add(self.ids, self.vectors)
+        ids, scores = index.search(self.vectors[:20], k=5)
+
+        np.testing.assert_array_equal(ids, self.brute_force(self.vectors[:20], 5))
+        self.assertTrue((np.diff(scores, axis=1) <= 0).all())
+        self.assertEqual(len(index), 500)
+
+    def test_approximate_search_finds_most_neighbours(self):
+        index = IVFIndex(n_lists=20, n_probe=5).train(self.vectors)
+        index.add(self.ids, self.vectors)
+        ids, _ = index.search(self.vectors[:50], k=1)
+        # Every vector is its own nearest neighbour and lives in its closest list
+        np.testing.assert_array_equal(ids[:, 0], self.ids[:50])
+
+    def test_incremental_add_and_save_load(self):
+        index = IVFIndex(n_lists=8, n_probe=8, metric='l2')
+        index.train(self.vectors)
+        index.add(self.ids[:300], self.vectors[:300])
+        index.add(self.ids[300:], self.vectors[300:])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'index.npz')
+            index.save(path)
+            loaded = IVFIndex.load(path)
+
+        expected = index.search(self.vectors[400:410], k=3)
+        ids, scores = loaded.search(self.vectors[400:410], k=3)
+        np.testing.assert_array_equal(ids, expected[0])
+        np.testing.assert_allclose(scores, expected[1])
+        np.testing.assert_array_equal(ids[:, 0], self.ids[400:410])
+        self.assertEqual(loaded.metric, 'l2')
+
+    def test_index_store(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = EmbeddingStore(os.path.join(tmpdir, 'store'), model_name='fake')
+            store.add(self.ids, self.vectors)
+            index = index_store(store, n_probe=100, block_size=128)
+
+        self.assertEqual(len(index), 500)
+        self.assertEqual(index.n_lists, 22)
+        np.testing.assert_array_equal(index.search(self.vectors[:20], k=5)[0], self.brute_force(self.vectors[:20], 5))
+
+    def test_training_is_explicit_and_keeps_n_lists(self):
+        index = IVFIndex(n_lists=8)
+        with self.assertRaises(ValueError):
+            index.add(self.ids[:2], self.vectors[:2])
+        with self.assertRaises(ValueError):
+            index.train(self.vectors[:2])
+
+        index.train(self.vectors)
+        index.add(self.ids[:2], self.vectors[:2])
+        self.assertEqual(index.n_lists, 8)
+        self.assertEqual(len(index.centroids), 8)
+
+    def test_re_added_ids_replace_their_vector(self):
+        index = IVFIndex(n_lists=8, n_probe=8).train(self.vectors)
+        index.add(self.ids, self.vectors)
+        # Article 1000 gets the vector of article 1499, twice in one batch and once more later
+        index.add([1000, 1000], [self.vectors[1], self.vectors[499]])
+        index.add([1001], self.vectors[1:2])
+
+        self.assertEqual(len(index), 500)
+        ids, _ = index.search(self.vectors[499:500], k=3)
+        self.assertEqual(sorted(ids[0, :2]), [1000, 1499])
+        all_ids = np.concatenate([list_ids for list_ids, _ in index.items()])
+        self.assertEqual(len(all_ids), len(set(all_ids.tolist())))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'index.npz')
+            index.save(path)
+            loaded = IVFIndex.load(path)
+        loaded.add([1000], self.vectors[:1])
+        self.assertEqual(len(loaded), 500)
+
+    def test_fewer_vectors_than_k(self):
+        index = IVFIndex(n_lists=4).train(self.vectors)
+        index.add([1, 2], self.vectors[:2])
+        ids, scores = index.search(self.vectors[:1], k=4)
+        self.assertEqual(list(ids[0]), [1, 2, -1, -1])
+        self.assertTrue(np.isinf(scores[0, 2:]).all())
+
+
+class TestStoryClustering(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        stories = rng.normal(size=(3, 32))
+        # Articles 1-3 cover story 0, 4-5 story 1, 6 story 2, with a little noise each
+        self.story_of = {1: 0, 2: 0, 3: 0, 4: 1, 5: 1, 6: 2}
+        vectors = np.array([stories[story] + rng.normal(scale=0.05, size=32) for story in self.story_of.values()])
+        self.index = IVFIndex(n_lists=2, n_probe=2).train(vectors)
+        self.index.add(list(self.story_of), vectors)
+
+    def test_near_duplicates(self):
+        pairs = near_duplicates(self.index, threshold=0.9, k=5)
+        self.assertEqual(list(zip(pairs['id_a'], pairs['id_b'])), [(1, 2), (1, 3), (2, 3), (4, 5)])
+
+    def test_cluster_and_cross_site_stories(self):
+        stories = cluster_stories(self.index, threshold=0.9, k=5)
+        self.assertEqual(stories.to_dict(), {1: 1, 2: 1, 3: 1, 4: 4, 5: 4, 6: 6})
+
+        articles = pd.DataFrame({'article_id': [1, 2, 3, 4, 5, 6],
+                                 'source_name': ['BBC', 'CNN', 'BBC', 'BBC', 'BBC', 'CNN']})
+        summary = cross_site_stories(stories, articles)
+        self.assertEqual(list(summary.index), [1])
+        self.assertEqual(summary.loc[1, 'sources'], ['BBC', 'CNN'])
+        self.assertEqual(summary.loc[1, 'n_articles'], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import datetime
+import unittest
+import pandas as pd
+from unittest.mock import patch
+from src.cache import TTLCache, DashboardData
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_entries_expire(self):
+        cache = TTLCache(ttl=0)
+        cache.set('key', 1)
+        self.assertIsNone(cache.get('key'))
+
+    def test_least_recently_used_entry_is_dropped(self):
+        cache = TTLCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    def test_version_change_recomputes(self):
+        cache = TTLCache()
+        calls = []
+        compute = lambda: calls.append(1) or len(calls)
+        self.assertEqual(cache.get_or_compute('key', compute, version=1), 1)
+        self.assertEqual(cache.get_or_compute('key', compute, version=1), 1)
+        self.assertEqual(cache.get_or_compute('key', compute, version=2), 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+
+class TestDashboardData(unittest.TestCase):
+
+    def setUp(self):
+        self.daily = pd.DataFrame({
+            'published_date': [datetime.date(2023, 11, 1), datetime.date(2023, 11, 1), datetime.date(2023, 11, 2)],
+            'source_name': ['site1', 'site2', 'site1'],
+            'article_count': [3, 1, 2],
+        })
+        self.versions = {'articles': 10, 'domains': 5, 'domain_locations': 5, 'traffic_data': 5}
+
+    @patch('src.cache.db')
+    def test_date_windows_are_derived_without_new_queries(self, mock_db):
+        mock_db.read_table_versions.side_effect = lambda: dict(self.versions)
+        mock_db.daily_article_counts_by_source.side_effect = lambda: self.daily.copy()
+        data = DashboardData(check_interval=0)
+
+        everything = data.counts_by_source()
+        first_day = data.counts_by_source(datetime.date(2023, 11, 1), datetime.date(2023, 11, 2))
+
+        self.assertEqual(everything.to_dict('records'), [
+            {'source_name': 'site1', 'article_count': 5},
+            {'source_name': 'site2', 'article_count': 1},
+        ])
+        self.assertEqual(first_day['article_count'].tolist(), [3, 1])
+        mock_db.daily_article_counts_by_source.assert_called_once()
+
+    @patch('src.cache.db')
+    def test_daily_counts_include_articles_without_a_source(self, mock_db):
+        mock_db.read_table_versions.side_effect = lambda: dict(self.versions)
+        # Totals over every article: 5 on the first day, one of them without a source
+        mock_db.daily_article_counts.side_effect = lambda: pd.DataFrame({
+            'published_date': [datetime.date(2023, 11, 1), datetime.date(2023, 11, 2)],
+            'article_count': [5, 2],
+        })
+        data = DashboardData(check_interval=0)
+
+        daily = data.daily_counts()
+        data.daily_counts()
+
+        self.assertEqual(daily['article_count'].tolist(), [5, 2])
+        self.assertEqual(daily['published_date'].tolist(), [pd.Timestamp('2023-11-01'), pd.Timestamp('2023-11-02')])
+        mock_db.daily_article_counts.assert_called_once()
+        mock_db.daily_article_counts_by_source.assert_not_called()
+
+    @patch('src.cache.db')
+    def test_new_rows_invalidate_cached_results(self, mock_db):
+        mock_db.read_table_versions.side_effect = lambda: dict(self.versions)
+        mock_db.daily_article_counts_by_source.side_effect = lambda: self.daily.copy()
+        data = DashboardData(check_interval=0)
+
+        data.counts_by_source()
+        self.versions['articles'] = 11
+        data.counts_by_source()
+
+        self.assertEqual(mock_db.daily_article_counts_by_source.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
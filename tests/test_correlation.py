@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from src.joins import DomainDictionary
+from src.correlation import correlation_blocks, domain_topic_matrix, site_correlation, top_correlated_pairs
+
+
+class TestCorrelation(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        n = 3000
+        self.data = pd.DataFrame({
+            'domain': rng.choice([f"site{i}.com" for i in range(40)], n),
+            'topic': rng.integers(-1, 12, n),
+        })
+        # A site with one article per topic, whose counts have no variance
+        self.data = pd.concat([self.data, pd.DataFrame({'domain': ['flat.com'] * 13, 'topic': list(range(-1, 12))})],
+                              ignore_index=True)
+        self.crosstab = pd.crosstab(self.data['domain'], self.data['topic'])
+
+    def test_matrix_matches_crosstab(self):
+        chunks = [self.data.iloc[:1000], self.data.iloc[1000:]]
+        counts, domains, topics = domain_topic_matrix(iter(chunks))
+
+        self.assertEqual(list(domains), list(self.crosstab.index))
+        self.assertEqual(list(topics), list(self.crosstab.columns))
+        np.testing.assert_array_equal(counts.toarray(), self.crosstab.to_numpy())
+
+    def test_given_empty_dictionary_learns_the_domains(self):
+        dictionary = DomainDictionary()
+        domain_topic_matrix(self.data, dictionary=dictionary)
+        self.assertEqual(sorted(dictionary.categories), list(self.crosstab.index))
+
+    def test_blocks_match_dataframe_corr(self):
+        counts, domains, _ = domain_topic_matrix(self.data)
+        expected = self.crosstab.T.corr().to_numpy()
+
+        blocks = np.vstack([block for _, block in correlation_blocks(counts, block_size=7)])
+        np.testing.assert_allclose(blocks, expected, atol=1e-12)
+
+    def test_sparse_products_match_dense(self):
+        counts, _, _ = domain_topic_matrix(self.data)
+        dense = np.vstack([block for _, block in correlation_blocks(counts, block_size=7)])
+        with patch('src.correlation.DENSE_TRANSPOSE_LIMIT', 0):
+            sparse = np.vstack([block for _, block in correlation_blocks(counts, block_size=7)])
+        np.testing.assert_allclose(sparse, dense, atol=1e-12)
+
+    def test_cosine(self):
+        counts, _, _ = domain_topic_matrix(self.data)
+        values = self.crosstab.to_numpy().astype(float)
+        unit = values / np.linalg.norm(values, axis=1, keepdims=True)
+
+        blocks = np.vstack([block for _, block in correlation_blocks(counts, 'cosine', block_size=16)])
+        np.testing.assert_allclose(blocks, unit @ unit.T, atol=1e-12)
+
+    def test_top_pairs_match_the_full_matrix(self):
+        corr = self.crosstab.T.corr()
+        upper = corr.where(np.triu(np.ones(corr.shape, dtype=bool), k=1)).stack().sort_values(ascending=False)
+
+        pairs = site_correlation(self.data, k=10, block_size=6)
+        self.assertEqual(len(pairs), 10)
+        np.testing.assert_allclose(pairs['correlation'].to_numpy(), upper.head(10).to_numpy())
+        self.assertEqual(set(zip(pairs['site_a'], pairs['site_b'])), set(upper.head(10).index))
+
+    def test_more_pairs_than_exist(self):
+        counts = np.array([[1, 0], [0, 1], [1, 1]])
+        from scipy.sparse import csr_matrix
+        pairs = top_correlated_pairs(csr_matrix(counts), ['a', 'b', 'c'], k=10, method='cosine')
+        self.assertEqual(len(pairs), 3)
+        self.assertEqual(list(pairs['correlation'].round(6)), [0.707107, 0.707107, 0.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,387 @@
+import threading
+import unittest
+import pandas as pd
+import psycopg2
+from unittest.mock import patch, MagicMock
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+from psycopg2.pool import PoolError
+from src import db
+
+
+class FakeConnection:
+    '''
+    Minimal stand-in for a psycopg2 connection used to exercise the pool
+    '''
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.in_transaction = False
+        self.broken = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        cursor = MagicMock()
+        cursor.__enter__.return_value = cursor
+        if self.broken:
+            cursor.execute.side_effect = psycopg2.OperationalError("server closed the connection")
+        else:
+            cursor.execute.side_effect = lambda *args: setattr(self, 'in_transaction', True)
+        return cursor
+
+    def get_transaction_status(self):
+        return TRANSACTION_STATUS_INTRANS if self.in_transaction else TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        self.commits += 1
+        self.in_transaction = False
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = 1
+
+
+def make_articles(n):
+    return pd.DataFrame({
+        'source_name': ['site1'] * n,
+        'author': [None] * n,
+        'title': [f'title {i}' for i in range(n)],
+        'description': ['desc'] * n,
+        'url': [f'https://a.com/{i}' for i in range(n)],
+        'url_to_image': [None] * n,
+        'published_at': ['2023-11-01 10:00:00'] * n,
+        'content': ['content'] * n,
+        'category': ['World'] * n,
+        'article': ['article'] * n,
+        'title_sentiment': ['Positive'] * n,
+        'domain': ['a.com' if i % 2 == 0 else 'b.com' for i in range(n)],
+    })
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def test_connections_are_reused(self):
+        pool = db.ConnectionPool(minconn=1, maxconn=2, connect=self.connect)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(first.commits, 2)
+
+    def test_rolls_back_when_block_raises(self):
+        pool = db.ConnectionPool(minconn=0, maxconn=1, connect=self.connect)
+        with self.assertRaises(RuntimeError):
+            with pool.connection() as conn:
+                raise RuntimeError("boom")
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertEqual(conn.commits, 0)
+
+    def test_exhausted_pool_times_out(self):
+        pool = db.ConnectionPool(minconn=0, maxconn=1, connect=self.connect, timeout=0.05)
+        conn = pool.getconn()
+        with self.assertRaises(PoolError):
+            pool.getconn()
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+
+    def test_waiting_thread_gets_returned_connection(self):
+        pool = db.ConnectionPool(minconn=0, maxconn=1, connect=self.connect, timeout=5)
+        conn = pool.getconn()
+        received = []
+        waiter = threading.Thread(target=lambda: received.append(pool.getconn()))
+        waiter.start()
+        pool.putconn(conn)
+        waiter.join(5)
+        self.assertEqual(received, [conn])
+
+    def test_broken_connection_is_replaced_on_checkout(self):
+        pool = db.ConnectionPool(minconn=1, maxconn=1, connect=self.connect, check_after=0)
+        self.opened[0].broken = True
+        conn = pool.getconn()
+        self.assertIsNot(conn, self.opened[0])
+        self.assertTrue(self.opened[0].closed)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_returned_connection_leaves_open_transaction(self):
+        pool = db.ConnectionPool(minconn=0, maxconn=1, connect=self.connect)
+        conn = pool.getconn()
+        conn.in_transaction = True
+        conn.autocommit = True
+        pool.putconn(conn)
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertFalse(conn.autocommit)
+
+    def test_pgbouncer_mode_keeps_only_minconn_idle(self):
+        pool = db.ConnectionPool(minconn=1, maxconn=3, connect=self.connect, pgbouncer=True)
+        first, second = pool.getconn(), pool.getconn()
+        pool.putconn(first)
+        pool.putconn(second)
+        self.assertFalse(first.closed)
+        self.assertTrue(second.closed)
+
+    def test_read_functions_use_configured_pool(self):
+        db.configure_pool(minconn=0, maxconn=1, connect=self.connect)
+        try:
+            db.read_domains()
+            db.read_traffic_data()
+        finally:
+            db.close_pool()
+        self.assertEqual(len(self.opened), 1)
+
+
+class TestStreamingReaders(unittest.TestCase):
+
+    def setUp(self):
+        self.cursor = MagicMock()
+        self.cursor.__enter__.return_value = self.cursor
+        self.cursor.description = [('id',), ('title',)]
+        conn = FakeConnection()
+        conn.cursor = MagicMock(return_value=self.cursor)
+        self.conn = conn
+        db.configure_pool(minconn=0, maxconn=1, connect=lambda: conn)
+
+    def tearDown(self):
+        db.close_pool()
+
+    def test_stream_articles_yields_chunks_from_named_cursor(self):
+        self.cursor.fetchmany.side_effect = [[(1, 'a'), (2, 'b')], [(3, 'c')]]
+
+        chunks = list(db.stream_articles(chunk_size=2, start_date='2023-11-01'))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertEqual(list(chunks[0].columns), ['id', 'title'])
+        self.assertIn('name', self.conn.cursor.call_args.kwargs)
+        query, params = self.cursor.execute.call_args[0]
+        self.assertEqual(params, ['2023-11-01'])
+        selected = repr(query)
+        self.assertNotIn("Identifier('content')", selected)
+        self.assertIn("Identifier('published_at')", selected)
+
+    def test_read_articles_on_empty_table_returns_empty_frame(self):
+        self.cursor.fetchmany.side_effect = [[]]
+
+        df = db.read_articles(columns=['id', 'title'])
+
+        self.assertTrue(df.empty)
+        self.assertEqual(list(df.columns), ['id', 'title'])
+
+
+class TestAggregateQueries(unittest.TestCase):
+
+    def setUp(self):
+        self.cursor = MagicMock()
+        self.cursor.__enter__.return_value = self.cursor
+        conn = FakeConnection()
+        conn.cursor = MagicMock(return_value=self.cursor)
+        db.configure_pool(minconn=0, maxconn=1, connect=lambda: conn)
+
+    def tearDown(self):
+        db.close_pool()
+
+    def test_count_articles_by_source_pushes_date_window(self):
+        self.cursor.description = [('source_name',), ('article_count',)]
+        self.cursor.fetchall.return_value = [('site1', 5), ('site2', 2)]
+
+        df = db.count_articles_by_source('2023-11-01', '2023-11-08')
+
+        self.assertEqual(df['article_count'].tolist(), [5, 2])
+        query, params = self.cursor.execute.call_args[0]
+        self.assertEqual(params, ['2023-11-01', '2023-11-08'])
+        self.assertIn('GROUP BY source_name', repr(query))
+
+    def test_count_domains_by_country(self):
+        self.cursor.description = [('country',), ('domain_count',)]
+        self.cursor.fetchall.return_value = [('Ethiopia', 3)]
+
+        df = db.count_domains_by_country()
+
+        self.assertEqual(df.to_dict('records'), [{'country': 'Ethiopia', 'domain_count': 3}])
+        self.assertIn('JOIN domain_locations', self.cursor.execute.call_args[0][0])
+
+
+class TestMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.cursor = MagicMock()
+        self.cursor.__enter__.return_value = self.cursor
+        conn = FakeConnection()
+        conn.cursor = MagicMock(return_value=self.cursor)
+        db.configure_pool(minconn=0, maxconn=1, connect=lambda: conn)
+
+    def tearDown(self):
+        db.close_pool()
+
+    def executed(self):
+        return [call.args[0] for call in self.cursor.execute.call_args_list]
+
+    def test_only_pending_migrations_are_applied(self):
+        self.cursor.fetchall.return_value = [(1,), (2,)]
+
+        db.create_database()
+
+        executed = self.executed()
+        self.assertIn(db.create_rollups_commands[0], executed)
+        self.assertNotIn(db.create_tables_commands[0], executed)
+        self.assertNotIn(db.create_indexes_commands[-1], executed)
+
+    def test_existing_tables_are_recorded_as_version_one(self):
+        self.cursor.fetchall.return_value = []
+        self.cursor.fetchone.return_value = (True,)
+
+        db.create_database()
+
+        executed = self.executed()
+        self.assertNotIn(db.create_tables_commands[0], executed)
+        self.assertIn(db.create_indexes_commands[-1], executed)
+        recorded = [call.args[1] for call in self.cursor.execute.call_args_list
+                    if 'INSERT INTO schema_migrations' in call.args[0]]
+        self.assertEqual([version for version, _ in recorded][:1], [1])
+
+
+class TestDomainResolver(unittest.TestCase):
+
+    @patch('src.db.execute_values')
+    def test_resolve_inserts_only_missing(self, mock_execute_values):
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [('a.com', 1)]
+        mock_execute_values.return_value = [('b.com', 2)]
+
+        resolver = db.DomainResolver()
+        domain_ids = resolver.resolve(cursor, ['a.com', 'b.com', 'a.com', None], {'b.com': 7})
+
+        self.assertEqual(domain_ids, {'a.com': 1, 'b.com': 2})
+        self.assertEqual(cursor.execute.call_count, 1)
+        self.assertEqual(mock_execute_values.call_args[0][2], [('b.com', 7)])
+
+    @patch('src.db.execute_values')
+    def test_resolve_reuses_preloaded_ids(self, mock_execute_values):
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [('a.com', 1), ('b.com', 2)]
+
+        resolver = db.DomainResolver()
+        resolver.resolve(cursor, ['a.com'])
+        self.assertEqual(resolver.get(cursor, 'b.com'), 2)
+
+        # The domains table is only read once and nothing is inserted
+        self.assertEqual(cursor.execute.call_count, 1)
+        mock_execute_values.assert_not_called()
+
+        resolver.reset()
+        resolver.resolve(cursor, ['a.com'])
+        self.assertEqual(cursor.execute.call_count, 2)
+
+    @patch('src.db.execute_values')
+    def test_resolve_returns_ids_of_domains_inserted_elsewhere(self, mock_execute_values):
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [('a.com', 1)]
+        resolver = db.DomainResolver()
+        resolver.resolve(cursor, ['a.com'])
+
+        # b.com was inserted by another connection after the cache was loaded; the upsert returns its row
+        mock_execute_values.return_value = [('b.com', 5)]
+        self.assertEqual(resolver.resolve(cursor, ['a.com', 'b.com']), {'a.com': 1, 'b.com': 5})
+        self.assertIn('ON CONFLICT (domain_name) DO UPDATE', mock_execute_values.call_args[0][1])
+        self.assertEqual(mock_execute_values.call_args[0][2], [('b.com', None)])
+        self.assertEqual(resolver.get(cursor, 'b.com'), 5)
+        self.assertEqual(mock_execute_values.call_count, 1)
+
+    @patch('src.db.execute_values')
+    def test_new_ids_are_shared_only_after_commit(self, mock_execute_values):
+        first, second = MagicMock(), MagicMock()
+        first.fetchall.return_value = [('a.com', 1)]
+        resolver = db.DomainResolver()
+        mock_execute_values.return_value = [('b.com', 5)]
+
+        self.assertEqual(resolver.get(first, 'b.com'), 5)
+        # Another connection does not see the uncommitted id and upserts the name itself
+        resolver.get(second, 'b.com')
+        self.assertEqual(mock_execute_values.call_count, 2)
+
+        resolver.rollback(second.connection)
+        resolver.commit(first.connection)
+        self.assertEqual(resolver.ids, {'a.com': 1, 'b.com': 5})
+        self.assertEqual(resolver.pending, {})
+
+        mock_execute_values.return_value = [('c.com', 6)]
+        resolver.get(first, 'c.com')
+        resolver.rollback(first.connection)
+        self.assertNotIn('c.com', resolver.ids)
+
+    @patch('src.db.execute_values')
+    @patch('src.db.psycopg2.connect')
+    def test_insert_domains_skips_rows_without_a_name(self, mock_connect, mock_execute_values):
+        cursor = MagicMock()
+        cursor.__enter__.return_value = cursor
+        cursor.connection = mock_connect.return_value
+        cursor.fetchall.side_effect = [[('Addis Ababa', 'Ethiopia', 3)], []]
+        mock_connect.return_value.cursor.return_value = cursor
+        mock_connect.return_value.closed = 0
+        mock_execute_values.return_value = [('a.com', 1)]
+        db.domain_resolver.reset()
+        db.configure_pool(minconn=0, maxconn=1)
+        self.addCleanup(db.close_pool)
+        self.addCleanup(db.domain_resolver.reset)
+
+        db.insert_domains(pd.DataFrame({
+            'SourceCommonName': ['a.com', None],
+            'location': ['Addis Ababa', 'Addis Ababa'],
+            'Country': ['Ethiopia', 'Ethiopia'],
+        }))
+
+        self.assertEqual(mock_execute_values.call_args_list[0][0][2], [('a.com', 3)])
+        self.assertEqual(mock_execute_values.call_args_list[1][0][2], [(1, 3)])
+        # The pool committed the transaction, so the new id is shared
+        self.assertEqual(db.domain_resolver.ids, {'a.com': 1})
+
+
+
+class TestBulkInsert(unittest.TestCase):
+
+    def setUp(self):
+        db.domain_resolver.reset()
+
+    def tearDown(self):
+        db.close_pool()
+
+    @patch('src.db.execute_values')
+    @patch('src.db.psycopg2.connect')
+    def test_insert_articles_bulk_copies_in_chunks(self, mock_connect, mock_execute_values):
+        cursor = MagicMock()
+        cursor.__enter__.return_value = cursor
+        cursor.fetchall.return_value = [('a.com', 1), ('b.com', 2)]
+        copied = []
+        cursor.copy_expert.side_effect = lambda statement, buffer: copied.append(buffer.getvalue())
+        mock_connect.return_value.cursor.return_value = cursor
+        mock_connect.return_value.closed = 0
+        db.configure_pool(minconn=0, maxconn=1)
+
+        inserted = db.insert_articles_bulk(make_articles(3), chunk_size=2)
+
+        self.assertEqual(inserted, 3)
+        self.assertEqual(len(copied), 2)
+        first_row = copied[0].splitlines()[0].split(',')
+        self.assertEqual(first_row[1], '\\N')
+        self.assertEqual(first_row[-1], '1')
+        self.assertEqual(copied[0].splitlines()[1].split(',')[-1], '2')
+        mock_execute_values.assert_not_called()
+        mock_connect.return_value.commit.assert_called_once()
+
+    def test_insert_articles_bulk_rejects_unknown_method(self):
+        with self.assertRaises(ValueError):
+            db.insert_articles_bulk(make_articles(1), method="bogus")
+
+if __name__ == '__main__':
+    unittest.main()
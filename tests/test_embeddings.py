@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from src.embeddings import EmbeddingStore
+
+
+# Deterministic stand-in for the sentence-transformer: one 4-dimensional vector per text
+def fake_encode(texts):
+    return np.array([[len(text), text.count('a'), text.count(' '), 1.0] for text in texts], dtype=np.float32)
+
+
+class TestEmbeddingStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'store')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def articles(self, ids):
+        return pd.DataFrame({'article_id': ids, 'content': [f"article {i} " + 'a' * i for i in ids]})
+
+    def test_fill_is_incremental_and_persistent(self):
+        store = EmbeddingStore(self.path, model_name='fake')
+        data = self.articles([5, 3, 9])
+        self.assertEqual(store.fill(data, encode=fake_encode), 3)
+
+        calls = []
+        encode = lambda texts: calls.append(texts) or fake_encode(texts)
+        reopened = EmbeddingStore(self.path)
+        chunks = iter([self.articles([3, 4]), self.articles([9, 10, 11])])
+        self.assertEqual(reopened.fill(chunks, encode=encode, batch_size=2), 3)
+
+        # Only the new articles were embedded
+        self.assertEqual(sum(len(texts) for texts in calls), 3)
+        self.assertEqual(len(reopened), 6)
+        self.assertIn(10, reopened)
+        self.assertNotIn(6, reopened)
+        np.testing.assert_array_equal(reopened.get([9, 5]), fake_encode(list(self.articles([9, 5])['content'])))
+
+    def test_opening_a_store_does_not_write_it(self):
+        EmbeddingStore(self.path, model_name='fake').fill(self.articles([1, 2]), encode=fake_encode)
+        meta_path = os.path.join(self.path, 'meta.json')
+        before = os.stat(meta_path).st_mtime_ns
+        with open(meta_path) as file:
+            content = file.read()
+
+        reopened = EmbeddingStore(self.path)
+        reopened.get([1])
+        self.assertEqual(os.stat(meta_path).st_mtime_ns, before)
+        with open(meta_path) as file:
+            self.assertEqual(file.read(), content)
+
+    def test_store_only_serves_the_text_it_holds(self):
+        store = EmbeddingStore(self.path, model_name='fake')
+        store.fill(self.articles([1, 2]), text='content', encode=fake_encode)
+
+        reopened = EmbeddingStore(self.path)
+        self.assertEqual(reopened.text, 'content')
+        np.testing.assert_array_equal(reopened.get([1], text='content'), store.get([1]))
+        with self.assertRaises(ValueError):
+            reopened.get([1], text='normalized_text')
+        with self.assertRaises(ValueError):
+            reopened.fill(self.articles([3]).assign(normalized_text='x'), text='normalized_text', encode=fake_encode)
+        with self.assertRaises(ValueError):
+            EmbeddingStore(self.path, text='normalized_text')
+        with self.assertRaises(ValueError):
+            reopened.fill(self.articles([3]), text=lambda chunk: chunk['content'], encode=fake_encode)
+
+    def test_vectors_are_memory_mapped(self):
+        store = EmbeddingStore(self.path, dtype='float16', model_name='fake')
+        store.add([1, 2, 3], np.arange(12).reshape(3, 4))
+
+        self.assertIsInstance(store.vectors(), np.memmap)
+        self.assertEqual(store.vectors().dtype, np.float16)
+        # Contiguous rows are a view of the file rather than a copy
+        self.assertIsInstance(store.get([2, 3]), np.memmap)
+        np.testing.assert_array_equal(store.get([3, 1]), [[8, 9, 10, 11], [0, 1, 2, 3]])
+
+    def test_duplicates_and_missing_ids(self):
+        store = EmbeddingStore(self.path, model_name='fake')
+        self.assertEqual(store.add([1, 1, 2], np.ones((3, 4))), 2)
+        self.assertEqual(store.add([2], np.zeros((1, 4))), 0)
+        self.assertEqual(store.missing([1, 7, 2, 8]), [7, 8])
+        with self.assertRaises(KeyError):
+            store.get([1, 7])
+        with self.assertRaises(ValueError):
+            store.add([9], np.ones((1, 3)))
+
+    def test_rows_of_an_interrupted_fill_are_ignored(self):
+        store = EmbeddingStore(self.path, model_name='fake')
+        store.add([1], np.ones((1, 4)))
+        # A crash after writing the vectors but before updating meta.json
+        with open(os.path.join(self.path, 'vectors.bin'), 'ab') as file:
+            file.write(np.zeros(4, dtype=np.float32).tobytes())
+
+        reopened = EmbeddingStore(self.path)
+        self.assertEqual(len(reopened), 1)
+        reopened.add([2], np.full((1, 4), 2.0))
+        np.testing.assert_array_equal(reopened.get([1, 2]), [[1, 1, 1, 1], [2, 2, 2, 2]])
+
+if __name__ == '__main__':
+    unittest.main()
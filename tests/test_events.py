@@ -0,0 +1,108 @@
+import unittest
+import numpy as np
+import pandas as pd
+from src.events import EventIndex
+
+
+class TestEventIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        n = 2000
+        self.data = pd.DataFrame({
+            'domain': rng.choice([f"site{i}.com" for i in range(30)], n),
+            'topic': rng.integers(-1, 15, n),
+            # Few distinct times, so many articles of a topic share their time
+            'published_at': pd.Timestamp('2023-10-01') + pd.to_timedelta(rng.integers(0, 50, n), unit='h'),
+        })
+
+    def test_first_reporters_match_groupby(self):
+        index = EventIndex()
+        for start in range(0, len(self.data), 300):
+            index.update(self.data.iloc[start:start + 300])
+
+        expected = self.data.groupby('topic').apply(lambda df: df.loc[df['published_at'].idxmin()])
+        first = index.first_reporters()
+        self.assertEqual(list(first.index), list(expected.index))
+        self.assertEqual(list(first['domain']), list(expected['domain']))
+        self.assertEqual(list(first['published_at']), list(expected['published_at']))
+
+    def test_incremental_updates_match_a_single_update(self):
+        # Distinct times, so the first reporters do not depend on the order the articles were added in
+        data = self.data.assign(published_at=pd.Timestamp('2023-10-01') +
+                                pd.to_timedelta(np.random.default_rng(6).permutation(len(self.data)), unit='s'))
+        whole = EventIndex().update(data)
+        incremental = EventIndex()
+        # Later chunks first, so new rows land before and between the stored ones
+        for start in reversed(range(0, len(data), 300)):
+            incremental.update(data.iloc[start:start + 300])
+
+        pd.testing.assert_frame_equal(incremental.first_reporter_ranking(), whole.first_reporter_ranking())
+        pd.testing.assert_frame_equal(incremental.coverage(), whole.coverage())
+
+    def test_chunked_updates_keep_the_ties_of_a_single_update(self):
+        whole = EventIndex().update(self.data)
+        chunked = EventIndex()
+        for start in range(0, len(self.data), 300):
+            chunked.update(self.data.iloc[start:start + 300])
+            # Queries between updates must not change what later updates give
+            chunked.lags()
+
+        self.assertEqual(len(chunked), len(whole))
+        pd.testing.assert_frame_equal(chunked.lags(), whole.lags())
+        pd.testing.assert_frame_equal(chunked.reporter_order(3), whole.reporter_order(3))
+        pd.testing.assert_frame_equal(chunked.first_reporters(), whole.first_reporters())
+        pd.testing.assert_frame_equal(chunked.first_reporter_ranking(), whole.first_reporter_ranking())
+
+    def test_reporting_counts(self):
+        index = EventIndex().update(self.data)
+        counts = index.reporting_counts()
+        pd.testing.assert_series_equal(counts.sort_index(), self.data['topic'].value_counts().sort_index())
+        self.assertTrue(counts.is_monotonic_decreasing)
+
+    def test_reporter_order_and_lags(self):
+        index = EventIndex().update(self.data)
+        topic = self.data[self.data['topic'] == 3]
+        first = topic.groupby('domain')['published_at'].min()
+
+        order = index.reporter_order(3)
+        self.assertEqual(list(order['rank']), list(range(1, len(first) + 1)))
+        self.assertEqual(sorted(order['domain']), sorted(first.index))
+        self.assertTrue(order['published_at'].is_monotonic_increasing)
+        for row in order.itertuples():
+            self.assertEqual(row.published_at, first[row.domain])
+            self.assertEqual(row.lag, first[row.domain] - topic['published_at'].min())
+
+        site_lags = index.lags('site4.com')
+        self.assertEqual(sorted(site_lags['topic']), sorted(self.data.loc[self.data['domain'] == 'site4.com', 'topic'].unique()))
+
+    def test_ranking(self):
+        data = pd.DataFrame({
+            'domain': ['a.com', 'b.com', 'b.com', 'a.com', 'c.com', 'a.com'],
+            'topic': [1, 1, 2, 2, 2, 3],
+            'published_at': pd.to_datetime(['2023-10-01 10:00', '2023-10-01 12:00', '2023-10-02 09:00',
+                                            '2023-10-02 10:00', '2023-10-02 09:30', '2023-10-03 00:00']),
+        })
+        ranking = EventIndex().update(data).first_reporter_ranking()
+
+        self.assertEqual(list(ranking.index), ['a.com', 'b.com', 'c.com'])
+        self.assertEqual(list(ranking['first_reports']), [2, 1, 0])
+        self.assertEqual(list(ranking['topics_covered']), [3, 2, 1])
+        self.assertEqual(ranking.loc['a.com', 'mean_lag'], pd.Timedelta(minutes=20))
+        self.assertEqual(ranking.loc['b.com', 'mean_lag'], pd.Timedelta(hours=1))
+
+    def test_assigned_topics_and_timezones(self):
+        data = pd.DataFrame({
+            'domain': ['a.com', 'b.com', None],
+            'published_at': ['2023-10-01T10:00:00+02:00', '2023-10-01T09:00:00+00:00', '2023-10-01T08:00:00+00:00'],
+        })
+        index = EventIndex(drop_outliers=True).update(data, topics=[0, 0, 0])
+        index.update(data.iloc[:1], topics=[-1])
+
+        self.assertEqual(len(index), 2)
+        first = index.first_reporters()
+        self.assertEqual(first.loc[0, 'domain'], 'a.com')
+        self.assertEqual(first.loc[0, 'published_at'], pd.Timestamp('2023-10-01 08:00', tz='UTC'))
+
+if __name__ == '__main__':
+    unittest.main()
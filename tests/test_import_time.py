@@ -0,0 +1,18 @@
+import os
+import unittest
+from benchmarks.import_time import HEAVY_MODULES, measure_import
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_utils_import_leaves_heavy_modules_unloaded(self):
+        # Checks what gets imported rather than wall-clock time, which depends on the machine
+        for name in ('torch', 'bertopic', 'keybert', 'nltk'):
+            self.assertIn(name, HEAVY_MODULES)
+        result = measure_import(cwd=ROOT)
+        self.assertEqual(result['heavy'], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+from src.joins import DomainDictionary, extract_domains, inner_join_indexers, join_datasets, load_joined
+from src.loader import NewsDataLoader
+
+
+class TestExtractDomains(unittest.TestCase):
+
+    def test_matches_urlparse(self):
+        urls = ['https://www.bbc.co.uk/news/1', 'http://cnn.com?x=1', '//a.org/x', 'a.com/x', 'HTTPS://Up.COM#f',
+                ' https://sp.com/', 'ftp://u:p@h:21/x', 'https:', 'mailto:x@y.com', 'http:/x', 'h\ttp://t.com']
+        self.assertEqual(list(extract_domains(pd.Series(urls))), [urlparse(url).netloc for url in urls])
+
+    def test_missing_urls_stay_missing(self):
+        domains = extract_domains(pd.Series(['https://a.com/', None], index=[5, 6]))
+        self.assertEqual(list(domains.index), [5, 6])
+        self.assertEqual(domains[5], 'a.com')
+        self.assertTrue(pd.isna(domains[6]))
+
+
+class TestJoins(unittest.TestCase):
+
+    def setUp(self):
+        self.rating = pd.DataFrame({
+            'article_id': [1, 2, 3, 4, 5],
+            'url': ['https://bbc.com/a', 'https://cnn.com/b', 'https://other.com/c', 'https://bbc.com/d', 'https://dw.com/e'],
+            'title': ['a', 'b', 'c', 'd', 'e'],
+            'published_at': pd.to_datetime(['2024-01-01'] * 5),
+        })
+        self.traffic = pd.DataFrame({'GlobalRank': [3, 1, 2, 4], 'Domain': ['cnn.com', 'bbc.com', 'dw.com', 'bbc.com']})
+        self.locations = pd.DataFrame({
+            'SourceCommonName': ['bbc.com', 'dw.com', 'cnn.com', 'nowhere.com'],
+            'location': ['GB', 'DE', 'US', 'XX'],
+            'Country': ['United Kingdom', 'Germany', 'United States', 'Nowhere'],
+        })
+
+    def expected(self):
+        rating = self.rating.copy()
+        rating['domain'] = rating['url'].apply(lambda x: urlparse(x).netloc)
+        traffic_location = pd.merge(self.traffic, self.locations, left_on='Domain', right_on='SourceCommonName', how='inner')
+        return pd.merge(rating, traffic_location, left_on='domain', right_on='Domain', how='inner')
+
+    def test_join_matches_chained_merges(self):
+        joined, dictionary = join_datasets(self.rating, self.traffic, self.locations)
+        pd.testing.assert_frame_equal(joined, self.expected())
+        self.assertEqual(len(dictionary), 5)
+
+    def test_categorical_domains_share_the_dictionary(self):
+        joined, dictionary = join_datasets(self.rating, self.traffic, self.locations, categorical=True)
+        self.assertIs(joined['domain'].cat.categories, joined['Domain'].cat.categories)
+        self.assertTrue((joined['domain'].cat.codes == joined['SourceCommonName'].cat.codes).all())
+        pd.testing.assert_frame_equal(joined.astype({'domain': object, 'Domain': object, 'SourceCommonName': object}),
+                                      self.expected().astype({'domain': object, 'Domain': object, 'SourceCommonName': object}))
+
+    def test_shared_column_names_get_merge_suffixes(self):
+        # 'location' in rating and locations, 'Country' in traffic and locations, 'GlobalRank' in rating and traffic
+        self.rating['location'] = 'newsroom'
+        self.rating['GlobalRank'] = 0
+        self.traffic['Country'] = 'ranked'
+        joined, _ = join_datasets(self.rating, self.traffic, self.locations, categorical=True)
+
+        expected = self.expected()
+        self.assertEqual(list(joined.columns), list(expected.columns))
+        pd.testing.assert_frame_equal(joined.astype({'domain': object, 'Domain': object, 'SourceCommonName': object}),
+                                      expected.astype({'domain': object, 'Domain': object, 'SourceCommonName': object}))
+
+    def test_empty_dictionary_is_filled_in_place(self):
+        dictionary = DomainDictionary()
+        _, returned = join_datasets(self.rating, self.traffic, self.locations, dictionary=dictionary)
+        self.assertIs(returned, dictionary)
+        self.assertEqual(len(dictionary), 5)
+
+    def test_inner_join_indexers_follow_merge_order(self):
+        left = np.array([2, 0, 1, 2, -1])
+        right = np.array([2, 1, 2, -1, 3])
+        left_rows, right_rows = inner_join_indexers(left, right)
+        expected = pd.merge(pd.DataFrame({'k': left, 'l': range(5)}), pd.DataFrame({'k': right, 'r': range(5)}), on='k')
+        self.assertEqual(list(left_rows), list(expected['l']))
+        self.assertEqual(list(right_rows), list(expected['r']))
+
+    def test_dictionary_codes_are_stable(self):
+        dictionary = DomainDictionary(['a.com', 'b.com'])
+        self.assertEqual(list(dictionary.encode(['b.com', 'c.com', None, 'a.com'])), [1, 2, -1, 0])
+        self.assertEqual(list(dictionary.decode([2, -1])), ['c.com', None])
+
+    def test_load_joined_is_cached_until_a_source_changes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = [os.path.join(tmpdir, name) for name in ('rating.csv', 'traffic.csv', 'Domains_location.csv')]
+            for frame, path in zip((self.rating, self.traffic, self.locations), paths):
+                frame.to_csv(path, index=False)
+            cache_path = os.path.join(tmpdir, 'joined.parquet')
+
+            loader = NewsDataLoader(columnar=False)
+            first = load_joined(*paths, loader=loader, cache_path=cache_path)
+            self.assertIs(load_joined(*paths, loader=loader, cache_path=cache_path), first)
+            self.assertTrue(os.path.exists(cache_path))
+
+            # A new loader reads the Parquet file instead of joining again
+            from_file = load_joined(*paths, loader=NewsDataLoader(columnar=False), cache_path=cache_path)
+            pd.testing.assert_frame_equal(from_file, first, check_dtype=False)
+
+            self.traffic.iloc[:1].to_csv(paths[1], index=False)
+            os.utime(paths[1], ns=(1, 1))
+            changed = load_joined(*paths, loader=loader, cache_path=cache_path)
+            self.assertEqual(list(changed['article_id']), [2])
+
+if __name__ == '__main__':
+    unittest.main()
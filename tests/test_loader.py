@@ -1,8 +1,10 @@
+import os
+import tempfile
 import unittest
 import pandas as pd
 from io import StringIO
 from unittest.mock import patch, mock_open
-from src.loader import NewsDataLoader  # Replace 'your_module' with the actual module name
+from src.loader import NewsDataLoader, FrameCache  # Replace 'your_module' with the actual module name
 
 class TestNewsDataLoader(unittest.TestCase):
 
@@ -41,5 +43,130 @@ class TestNewsDataLoader(unittest.TestCase):
         mock_read_csv.assert_not_called()  # Ensure read_csv wasn't called
         pd.testing.assert_frame_equal(df, mock_df)
 
+class TestColumnarSidecar(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'rating.csv')
+        pd.DataFrame({
+            'article_id': [1, 2, 3],
+            'source_name': ['site1', 'site2', 'site1'],
+            'title': ['a', 'b', 'c'],
+            'published_at': ['2023-11-01 10:00:00', '2023-11-02 11:00:00', '2023-11-03 12:00:00'],
+            'title_sentiment': ['Positive', 'Neutral', 'Negative'],
+        }).to_csv(self.path, index=False)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_schema_is_applied_and_sidecar_written(self):
+        df = NewsDataLoader().load_data(self.path)
+
+        self.assertIsInstance(df['source_name'].dtype, pd.CategoricalDtype)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df['published_at']))
+        self.assertTrue(os.path.exists(self.path + '.parquet'))
+
+    def test_later_loads_come_from_sidecar(self):
+        expected = NewsDataLoader().load_data(self.path)
+
+        with patch('pandas.read_csv') as mock_read_csv:
+            df = NewsDataLoader().load_data(self.path)
+            projected = NewsDataLoader().load_data(self.path, columns=['title', 'source_name'])
+
+        mock_read_csv.assert_not_called()
+        pd.testing.assert_frame_equal(df, expected)
+        self.assertEqual(list(projected.columns), ['title', 'source_name'])
+
+    def test_changed_source_rebuilds_sidecar(self):
+        NewsDataLoader().load_data(self.path)
+        with open(self.path, 'a') as f:
+            f.write('4,site3,d,2023-11-04 09:00:00,Positive\n')
+
+        df = NewsDataLoader().load_data(self.path)
+
+        self.assertEqual(len(df), 4)
+        self.assertEqual(len(pd.read_parquet(self.path + '.parquet')), 4)
+    def test_unconvertible_frame_is_loaded_without_sidecar(self):
+        # read_csv can give object columns mixing ints and strings, which Arrow refuses
+        mixed = pd.DataFrame({'article_id': [1, 2], 'title': pd.Series([1, 'abc'], dtype=object)})
+        with patch('src.loader._read_csv', return_value=mixed), patch('builtins.print'):
+            df = NewsDataLoader().load_data(self.path)
+
+        pd.testing.assert_frame_equal(df, mixed)
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ['rating.csv'])
+
+class TestFrameCache(unittest.TestCase):
+
+    def frame(self, n):
+        return pd.DataFrame({'col1': range(n)})
+
+    def test_least_recently_used_frames_are_evicted_over_budget(self):
+        size = int(self.frame(100).memory_usage(deep=True).sum())
+        cache = FrameCache(max_bytes=2 * size)
+        cache['a'] = self.frame(100)
+        cache['b'] = self.frame(100)
+        cache['a']
+        cache['c'] = self.frame(100)
+
+        self.assertEqual(list(cache.keys()), ['a', 'c'])
+        self.assertEqual(cache.bytes, 2 * size)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_frame_larger_than_budget_is_kept_alone(self):
+        cache = FrameCache(max_bytes=1)
+        cache['a'] = self.frame(10)
+        cache['b'] = self.frame(10)
+        self.assertEqual(list(cache.keys()), ['b'])
+
+    def test_loader_reloads_changed_file_and_counts_hits(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'data.csv')
+            pd.DataFrame({'col1': [1, 2]}).to_csv(path, index=False)
+            loader = NewsDataLoader()
+
+            loader.load_data(path)
+            loader.load_data(path)
+            with open(path, 'a') as f:
+                f.write('3\n')
+            df = loader.load_data(path)
+
+            self.assertEqual(len(df), 3)
+            self.assertEqual((loader.cache_stats()['hits'], loader.cache_stats()['misses']), (1, 2))
+
+            loader.evict(path)
+            self.assertNotIn(path, loader.data)
+
+class TestIterData(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'rating.csv')
+        pd.DataFrame({
+            'source_name': ['site1', 'site2', 'site3'] * 3,
+            'published_at': [f'2023-11-0{day} 10:00:00' for day in range(1, 10)],
+            'title_sentiment': ['Positive', 'Neutral', 'Negative'] * 3,
+        }).to_csv(self.path, index=False)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def check_chunks(self, loader):
+        chunks = list(loader.iter_data(self.path, chunksize=4, columns=['source_name'],
+                                       filters=[('published_at', '>=', pd.Timestamp('2023-11-04'))]))
+        self.assertEqual([len(chunk) for chunk in chunks], [1, 4, 1])
+        self.assertEqual(list(chunks[0].columns), ['source_name'])
+        self.assertIsInstance(chunks[0]['source_name'].dtype, pd.CategoricalDtype)
+
+    def test_chunks_from_csv(self):
+        self.check_chunks(NewsDataLoader())
+        self.assertFalse(os.path.exists(self.path + '.parquet'))
+
+    def test_chunks_from_sidecar(self):
+        loader = NewsDataLoader()
+        loader.load_data(self.path)
+        with patch('pandas.read_csv') as mock_read_csv:
+            self.check_chunks(loader)
+        mock_read_csv.assert_not_called()
+
 if __name__ == '__main__':
     unittest.main()
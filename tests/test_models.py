@@ -0,0 +1,76 @@
+import threading
+import time
+import unittest
+from src.models import ModelRegistry
+
+
+class FakeModel:
+    def __init__(self, name, base=None):
+        self.name = name
+        self.base = base
+
+
+class TestModelRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = []
+
+        def load_embedding(registry, name):
+            self.loads.append(('embedding', name))
+            time.sleep(0.01)
+            return FakeModel(name)
+
+        def load_keybert(registry, name):
+            self.loads.append(('keybert', name))
+            return FakeModel(name, base=registry.get('embedding'))
+
+        self.registry = ModelRegistry(
+            loaders={'embedding': load_embedding, 'keybert': load_keybert},
+            names={'embedding': 'small-model'},
+        )
+
+    def test_models_are_loaded_once_and_shared(self):
+        keybert = self.registry.get('keybert')
+        self.assertIs(self.registry.get('keybert'), keybert)
+        self.assertIs(keybert.base, self.registry.get('embedding'))
+        self.assertEqual(self.loads, [('keybert', None), ('embedding', 'small-model')])
+
+    def test_concurrent_first_use_loads_once(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.registry.get('embedding')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.loads), 1)
+        self.assertTrue(all(model is results[0] for model in results))
+
+    def test_warm_up_and_unload(self):
+        self.registry.warm_up()
+        self.assertTrue(self.registry.is_loaded('embedding'))
+        self.assertTrue(self.registry.is_loaded('keybert'))
+        self.assertEqual(set(self.registry.memory_usage()), {'embedding', 'keybert'})
+
+        # KeyBERT was built on the embedding model, so it goes with it
+        self.registry.unload('embedding')
+        self.assertFalse(self.registry.is_loaded('embedding'))
+        self.assertFalse(self.registry.is_loaded('keybert'))
+        self.assertEqual(self.registry.memory_usage(), {})
+
+    def test_configuring_another_name_reloads(self):
+        first = self.registry.get('embedding')
+        self.registry.configure('embedding', 'large-model')
+        second = self.registry.get('embedding')
+
+        self.assertIsNot(first, second)
+        self.assertEqual(second.name, 'large-model')
+        self.assertEqual(self.registry.name('embedding'), 'large-model')
+
+    def test_unknown_model(self):
+        with self.assertRaises(KeyError):
+            self.registry.get('missing')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from collections import Counter
+from src import ner
+
+
+def nltk_models_available():
+    try:
+        ner.extract_gpes("Addis Ababa is in Ethiopia.")
+    except LookupError:
+        return False
+    return True
+
+
+@unittest.skipUnless(nltk_models_available(), "NLTK tokenizer/tagger/chunker data not installed")
+class TestCountCountries(unittest.TestCase):
+
+    texts = [
+        "Ethiopia and Kenya signed a trade deal in Nairobi.",
+        "The summit in Paris was attended by leaders from France and Germany.",
+        None,
+        "Officials in Washington said the United States would respond.",
+    ] * 5
+
+    def test_parallel_counts_match_serial_extraction(self):
+        expected = Counter()
+        for text in self.texts:
+            if text is not None:
+                expected.update(ner.extract_gpes(text))
+
+        self.assertEqual(ner.count_countries(self.texts, n_jobs=1), expected)
+        self.assertEqual(ner.count_countries(iter(self.texts), n_jobs=2, chunk_size=3), expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from src import nlp_cache
+from src.nlp_cache import ResultCache
+
+
+
+@nlp_cache.cached('lower', version=1)
+def lower(text):
+    return text.lower()
+
+# Function run in the pool workers of test_spawned_workers_use_the_cache_and_report_stats
+def lower_all(texts):
+    return [lower(text) for text in texts]
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'nlp.sqlite')
+
+    def tearDown(self):
+        nlp_cache.configure_cache(None)
+        self.tmpdir.cleanup()
+
+    def test_results_survive_reopening(self):
+        cache = ResultCache(self.path)
+        calls = []
+        compute = lambda: calls.append(1) or [('Ethiopia', 'NNP')]
+
+        first = cache.get_or_compute('countries', 1, 'text', compute)
+        cache.close()
+        second = ResultCache(self.path).get_or_compute('countries', 1, 'text', compute)
+
+        self.assertEqual(first, second)
+        self.assertEqual(second, [('Ethiopia', 'NNP')])
+        self.assertEqual(len(calls), 1)
+
+    def test_key_depends_on_extractor_version_params_and_text(self):
+        key = ResultCache.key('keybert', 1, 'text', params=('model', 5))
+        self.assertNotEqual(key, ResultCache.key('countries', 1, 'text', params=('model', 5)))
+        self.assertNotEqual(key, ResultCache.key('keybert', 2, 'text', params=('model', 5)))
+        self.assertNotEqual(key, ResultCache.key('keybert', 1, 'text', params=('model', 10)))
+        self.assertNotEqual(key, ResultCache.key('keybert', 1, 'other text', params=('model', 5)))
+
+    def test_least_recently_used_results_are_evicted(self):
+        cache = ResultCache(self.path, max_bytes=1000)
+        for i in range(20):
+            cache.set_many({f'key{i}': 'x' * 100})
+
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], 1000)
+        self.assertLess(stats['entries'], 20)
+        self.assertIn('key19', cache.get_many(['key19']))
+        self.assertNotIn('key0', cache.get_many(['key0']))
+
+    def test_hit_rate(self):
+        cache = ResultCache(self.path)
+        cache.set_many({'a': 1})
+        cache.get_many(['a', 'b'])
+        self.assertEqual(cache.stats()['hit_rate'], 0.5)
+
+    def test_decorated_function_uses_configured_cache(self):
+        calls = []
+
+        @nlp_cache.cached('upper', version=1)
+        def upper(text):
+            calls.append(text)
+            return text.upper()
+
+        nlp_cache.configure_cache(None)
+        upper('a')
+        upper('a')
+        self.assertEqual(len(calls), 2)
+
+        nlp_cache.configure_cache(self.path)
+        upper('a')
+        self.assertEqual(upper('a'), 'A')
+        self.assertEqual(len(calls), 3)
+
+    def test_spawned_workers_use_the_cache_and_report_stats(self):
+        cache = nlp_cache.configure_cache(self.path)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=nlp_cache.init_worker,
+                                 initargs=(nlp_cache.cache_config(),)) as executor:
+            for _ in range(2):
+                result, stats = executor.submit(nlp_cache.call_with_stats, lower_all, ['A', 'B']).result()
+                self.assertEqual(result, ['a', 'b'])
+                nlp_cache.merge_stats(stats)
+
+        # The second batch was read from the cache the first one wrote
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 2)
+        self.assertEqual(cache.stats()['entries'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
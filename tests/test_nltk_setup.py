@@ -0,0 +1,31 @@
+import unittest
+from unittest import mock
+from src import nltk_setup
+
+
+class TestNltkSetup(unittest.TestCase):
+
+    def setUp(self):
+        nltk_setup._available.clear()
+
+    def test_newer_nltk_needs_the_tab_packages(self):
+        with mock.patch.object(nltk_setup, 'version', return_value='3.9.1'):
+            self.assertEqual(nltk_setup.required_resources()['tokenizer'][0], 'punkt_tab')
+        with mock.patch.object(nltk_setup, 'version', return_value='3.8.1'):
+            self.assertEqual(nltk_setup.required_resources()['tokenizer'][0], 'punkt')
+
+    def test_require_names_the_setup_command_and_never_downloads(self):
+        with mock.patch.object(nltk_setup, 'missing_resources', return_value=['stopwords']), \
+                mock.patch('nltk.download') as download:
+            with self.assertRaisesRegex(LookupError, 'python -m src.nltk_setup'):
+                nltk_setup.require('stopwords')
+        download.assert_not_called()
+
+    def test_available_resources_are_checked_once(self):
+        with mock.patch.object(nltk_setup, 'missing_resources', return_value=[]) as missing:
+            nltk_setup.require('stopwords')
+            nltk_setup.require('stopwords')
+        missing.assert_called_once_with(['stopwords'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,255 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+import zipfile
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+import pandas as pd
+from src.pipeline import MANIFEST_FILE, Pipeline, Stage, analysis_pipeline, extract_datasets, main
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.calls = []
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _stage(self, name, func, requires=(), **kwargs):
+        def call(*inputs):
+            self.calls.append(name)
+            return func(*inputs)
+        return Stage(name, call, requires, **kwargs)
+
+    def _run(self, pipeline, **kwargs):
+        with redirect_stdout(StringIO()):
+            return pipeline.run(**kwargs)
+
+    def test_independent_stages_run_concurrently(self):
+        # Both stages wait for each other, which only succeeds when they run at the same time
+        barrier = threading.Barrier(2, timeout=5)
+        stages = [
+            self._stage('source', lambda: 2),
+            self._stage('left', lambda x: barrier.wait() is not None and x + 1, ['source']),
+            self._stage('right', lambda x: barrier.wait() is not None and x * 10, ['source']),
+            self._stage('total', lambda a, b: a + b, ['left', 'right']),
+        ]
+        results = self._run(Pipeline(stages, self.tmpdir.name))
+        self.assertEqual(results['total'], 23)
+        self.assertEqual(self.calls[0], 'source')
+        self.assertEqual(self.calls[-1], 'total')
+
+    def test_resume_after_a_failed_stage(self):
+        failures = [RuntimeError("disk full")]
+
+        def flaky(x):
+            if failures:
+                raise failures.pop()
+            return x * 2
+
+        stages = [
+            self._stage('load', lambda: 5),
+            self._stage('double', flaky, ['load']),
+            self._stage('other', lambda x: x - 1, ['load']),
+            self._stage('report', lambda x: f"value {x}", ['double']),
+        ]
+        pipeline = Pipeline(stages, self.tmpdir.name, max_workers=1)
+        with self.assertRaises(RuntimeError):
+            self._run(pipeline)
+        self.assertEqual(pipeline.status(), {'load': 'done', 'double': 'pending', 'other': 'done', 'report': 'pending'})
+
+        self.calls.clear()
+        results = self._run(Pipeline(stages, self.tmpdir.name))
+        self.assertEqual(sorted(self.calls), ['double', 'report'])
+        self.assertEqual(results['report'], 'value 10')
+        self.assertEqual(pipeline.load('other'), 4)
+
+    def test_changed_params_rerun_the_stage_and_what_follows(self):
+        def stages(factor):
+            return [
+                self._stage('load', lambda: 3),
+                self._stage('scale', lambda x: x * factor, ['load'], params={'factor': factor}),
+                self._stage('report', lambda x: x + 1, ['scale']),
+            ]
+
+        self._run(Pipeline(stages(2), self.tmpdir.name))
+        self.calls.clear()
+        self._run(Pipeline(stages(2), self.tmpdir.name))
+        self.assertEqual(self.calls, [])
+
+        # Rerunning only the changed stage still leaves the stage after it stale
+        self._run(Pipeline(stages(4), self.tmpdir.name), targets=['scale'])
+        self.assertEqual(Pipeline(stages(4), self.tmpdir.name).status()['report'], 'pending')
+        self.calls.clear()
+        results = self._run(Pipeline(stages(4), self.tmpdir.name))
+        self.assertEqual(self.calls, ['report'])
+        self.assertEqual(results['report'], 13)
+
+    def test_uncheckpointed_stage_is_rerun_when_needed(self):
+        stages = [
+            self._stage('load', lambda: [1, 2, 3], checkpoint=False),
+            self._stage('total', sum, ['load']),
+            self._stage('count', len, ['load']),
+        ]
+        self._run(Pipeline(stages, self.tmpdir.name))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, 'load.pickle')))
+
+        self.calls.clear()
+        self._run(Pipeline(stages, self.tmpdir.name))
+        self.assertEqual(self.calls, [])
+
+        os.remove(os.path.join(self.tmpdir.name, 'count.pickle'))
+        self.calls.clear()
+        self._run(Pipeline(stages, self.tmpdir.name))
+        self.assertEqual(self.calls, ['load', 'count'])
+
+    def test_invalid_graphs(self):
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('a', len, ['b']), Stage('b', len, ['a'])], self.tmpdir.name)
+        with self.assertRaises(ValueError):
+            Pipeline([Stage('a', len, ['missing'])], self.tmpdir.name)
+
+
+class TestAnalysisPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.rating = pd.DataFrame({
+            'article_id': [1, 2, 3],
+            'source_name': ['BBC', 'CNN', 'BBC'],
+            'title': ['a', 'b', 'c'],
+            'content': ['x', 'y', 'z'],
+            'url': ['https://bbc.com/1', 'https://cnn.com/2', 'https://bbc.com/3'],
+            'published_at': ['2023-10-01 10:00', '2023-10-01 11:00', '2023-10-02 09:00'],
+            'title_sentiment': ['Positive', 'Negative', 'Neutral'],
+        })
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_main_runs_and_resumes_from_a_zip(self):
+        zip_path = os.path.join(self.tmpdir.name, 'news.zip')
+        with zipfile.ZipFile(zip_path, 'w') as archive:
+            archive.writestr('data.csv/rating.csv', self.rating.to_csv(index=False))
+        checkpoint_dir = os.path.join(self.tmpdir.name, 'checkpoints')
+        keywords = ([[('a', 1.0)]] * 3, [[('a', 0.5)]] * 3)
+
+        with patch('src.utils.find_popular_articles', return_value={'France': 1}), \
+                patch('src.utils.keybert_keyword_extraction', return_value=keywords) as keybert, \
+                patch('src.utils.perform_topic_modeling_with_mlflow', return_value=(pd.DataFrame(), None)), \
+                redirect_stdout(StringIO()):
+            self.assertEqual(main(['--zip', zip_path, '--checkpoint-dir', checkpoint_dir]), 0)
+            self.assertEqual(main(['--zip', zip_path, '--checkpoint-dir', checkpoint_dir]), 0)
+
+        self.assertEqual(keybert.call_count, 1)
+        with open(os.path.join(checkpoint_dir, MANIFEST_FILE)) as file:
+            self.assertEqual(set(json.load(file)), {'articles', 'popular_countries', 'sentiment',
+                                                    'keywords', 'similarity', 'topics'})
+        pipeline = analysis_pipeline(os.path.join(checkpoint_dir, 'data', 'data.csv', 'rating.csv'), checkpoint_dir)
+        self.assertEqual(pipeline.load('similarity'), [1.0, 1.0, 1.0])
+        self.assertEqual(list(pipeline.load('sentiment').index), ['BBC', 'CNN'])
+
+    def test_extracted_members_stay_in_the_directory(self):
+        zip_path = os.path.join(self.tmpdir.name, 'news.zip')
+        with zipfile.ZipFile(zip_path, 'w') as archive:
+            archive.writestr('../outside/rating.csv', self.rating.to_csv(index=False))
+        outside = os.path.join(self.tmpdir.name, 'outside', 'rating.csv')
+        os.makedirs(os.path.dirname(outside))
+        with open(outside, 'w') as file:
+            file.write('untouched')
+        os.utime(outside, (0, 0))
+
+        directory = os.path.join(self.tmpdir.name, 'data')
+        paths = extract_datasets(zip_path, directory)
+
+        self.assertEqual(paths['rating'], os.path.join(directory, 'outside', 'rating.csv'))
+        self.assertEqual(os.path.getmtime(outside), 0)
+        # Extracting again keeps the file as it is
+        mtime = os.stat(paths['rating']).st_mtime_ns
+        extract_datasets(zip_path, directory)
+        self.assertEqual(os.stat(paths['rating']).st_mtime_ns, mtime)
+
+    def test_n_topics_does_not_change_the_bertopic_stage(self):
+        rating_path = os.path.join(self.tmpdir.name, 'rating.csv')
+        self.rating.to_csv(rating_path, index=False)
+        checkpoint_dir = os.path.join(self.tmpdir.name, 'checkpoints')
+
+        with patch('src.utils.perform_topic_modeling_with_mlflow', return_value=(pd.DataFrame(), None)), \
+                redirect_stdout(StringIO()):
+            analysis_pipeline(rating_path, checkpoint_dir, n_topics=10).run(['topics'])
+
+        self.assertEqual(analysis_pipeline(rating_path, checkpoint_dir, n_topics=20).status()['topics'], 'done')
+
+    def test_max_rows_zero_scans_every_article(self):
+        rating_path = os.path.join(self.tmpdir.name, 'rating.csv')
+        self.rating.to_csv(rating_path, index=False)
+        checkpoint_dir = os.path.join(self.tmpdir.name, 'checkpoints')
+
+        with patch('src.utils.extract_countries_from_article_content', return_value=['France']), \
+                redirect_stdout(StringIO()):
+            code = main(['--rating', rating_path, '--checkpoint-dir', checkpoint_dir,
+                         '--max-rows', '0', '--stage', 'popular_countries'])
+
+        self.assertEqual(code, 0)
+        counts = analysis_pipeline(rating_path, checkpoint_dir, max_rows=None).load('popular_countries')
+        self.assertEqual(counts, {'France': 3})
+
+    def test_per_article_topic_stages(self):
+        rating_path = os.path.join(self.tmpdir.name, 'rating.csv')
+        self.rating.to_csv(rating_path, index=False)
+        pipeline = analysis_pipeline(rating_path, os.path.join(self.tmpdir.name, 'checkpoints'),
+                                     model_path=os.path.join(self.tmpdir.name, 'model'))
+
+        with patch('src.utils.update_topic_model_with_mlflow', return_value=(None, None, [0, 0, 1])), \
+                redirect_stdout(StringIO()):
+            results = pipeline.run(['earliest_reporters', 'site_correlation'])
+
+        first = results['earliest_reporters']['first_reporters']
+        self.assertEqual(list(first['domain']), ['bbc.com', 'bbc.com'])
+        self.assertIn('site_correlation', results)
+
+    def test_topic_stage_starts_from_the_given_model_every_run(self):
+        rating_path = os.path.join(self.tmpdir.name, 'rating.csv')
+        self.rating.to_csv(rating_path, index=False)
+        checkpoint_dir = os.path.join(self.tmpdir.name, 'checkpoints')
+        model_path = os.path.join(self.tmpdir.name, 'model')
+        write_model(model_path, n_documents=10)
+
+        def update_model(data, model_path, n_topics):
+            # Like IncrementalTopicModel.update + save: add the articles to the model found at model_path
+            with open(os.path.join(model_path, 'state.json')) as file:
+                n_documents = json.load(file)['n_documents']
+            write_model(model_path, n_documents + len(data))
+            return None, None, [0] * len(data)
+
+        with patch('src.utils.update_topic_model_with_mlflow', side_effect=update_model), \
+                redirect_stdout(StringIO()):
+            for restart in (False, True):
+                analysis_pipeline(rating_path, checkpoint_dir, model_path=model_path).run(['topics'], resume=not restart)
+                with open(os.path.join(checkpoint_dir, 'topic_model', 'state.json')) as file:
+                    self.assertEqual(json.load(file)['n_documents'], 13)
+
+        with open(os.path.join(model_path, 'state.json')) as file:
+            self.assertEqual(json.load(file)['n_documents'], 10)
+        self.assertEqual(analysis_pipeline(rating_path, checkpoint_dir, model_path=model_path).status()['topics'], 'done')
+
+        # A new version of the starting model makes the topics stale
+        write_model(model_path, n_documents=20)
+        self.assertEqual(analysis_pipeline(rating_path, checkpoint_dir, model_path=model_path).status()['topics'], 'pending')
+
+
+# Function to write a stand-in saved topic model: a state file and a model file
+def write_model(path, n_documents):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, 'state.json'), 'w') as file:
+        json.dump({'n_documents': n_documents}, file)
+    with open(os.path.join(path, 'model.pickle'), 'w') as file:
+        file.write(str(n_documents))
+
+if __name__ == '__main__':
+    unittest.main()
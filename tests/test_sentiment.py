@@ -0,0 +1,73 @@
+import pickle
+import unittest
+import numpy as np
+import pandas as pd
+from src.sentiment import SentimentAggregator
+from src.utils import website_sentiment_distribution
+
+
+class TestSentimentAggregator(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        n = 500
+        self.data = pd.DataFrame({
+            'source_name': rng.choice(['bbc', 'cnn', 'aljazeera', 'reuters', 'dw'], n),
+            'title_sentiment': rng.choice(['Positive', 'Neutral', 'Negative'], n, p=[0.2, 0.5, 0.3]),
+            'published_at': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 21 * 24, n), unit='h'),
+        })
+
+    def chunks(self, size=77):
+        return [self.data.iloc[offset:offset + size] for offset in range(0, len(self.data), size)]
+
+    def test_result_matches_website_sentiment_distribution(self):
+        aggregator = SentimentAggregator()
+        for chunk in self.chunks():
+            aggregator.update(chunk)
+        pd.testing.assert_frame_equal(aggregator.result(), website_sentiment_distribution(self.data))
+
+    def test_missing_sentiments_and_values(self):
+        data = self.data[self.data['title_sentiment'] != 'Negative'].copy()
+        data.loc[data.index[:5], 'source_name'] = None
+        data.loc[data.index[5:10], 'title_sentiment'] = None
+        pd.testing.assert_frame_equal(SentimentAggregator().update(data).result(), website_sentiment_distribution(data))
+
+    def test_merged_partial_states_equal_one_pass(self):
+        chunks = self.chunks()
+        left = SentimentAggregator().update(chunks[:3])
+        right = SentimentAggregator().update(chunks[3:])
+        # States survive pickling, e.g. between processes or runs
+        right = SentimentAggregator.from_state(pickle.loads(pickle.dumps(right.state())))
+
+        pd.testing.assert_frame_equal(left.merge(right).result(), SentimentAggregator().update(chunks).result())
+
+    def test_db_row_batches(self):
+        rows = list(self.data[['source_name', 'title_sentiment', 'published_at']].itertuples(index=False, name=None))
+        aggregator = SentimentAggregator()
+        aggregator.update(rows[:200])
+        aggregator.update(rows[200:])
+        pd.testing.assert_frame_equal(aggregator.result(), website_sentiment_distribution(self.data))
+
+    def test_date_range_and_windows(self):
+        aggregator = SentimentAggregator().update(self.data)
+        week = self.data[(self.data['published_at'] >= '2024-01-08') & (self.data['published_at'] < '2024-01-15')]
+        pd.testing.assert_frame_equal(aggregator.result('2024-01-08', '2024-01-15'), website_sentiment_distribution(week))
+
+        weekly = aggregator.windows('W')
+        self.assertEqual(list(weekly.index.get_level_values(0).unique()),
+                         [pd.Timestamp('2024-01-01'), pd.Timestamp('2024-01-08'), pd.Timestamp('2024-01-15')])
+        pd.testing.assert_frame_equal(weekly.loc[pd.Timestamp('2024-01-08')], website_sentiment_distribution(week))
+
+        daily = aggregator.windows('D')
+        self.assertEqual(daily['Total'].sum(), len(self.data))
+        self.assertEqual(len(daily.index.get_level_values(0).unique()), 21)
+
+    def test_domain_codes_are_stable(self):
+        aggregator = SentimentAggregator().update(self.data.iloc[:10])
+        code = aggregator.domain_code(self.data['source_name'].iloc[0])
+        aggregator.update(self.data.iloc[10:])
+        self.assertEqual(aggregator.domain_code(self.data['source_name'].iloc[0]), code)
+        self.assertEqual(sorted(aggregator.domains), sorted(self.data['source_name'].unique()))
+
+if __name__ == '__main__':
+    unittest.main()
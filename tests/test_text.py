@@ -0,0 +1,37 @@
+import unittest
+import pandas as pd
+from src.text import TextNormalizer
+
+
+class TestTextNormalizer(unittest.TestCase):
+
+    stop_words = ['the', 'in', 'of', 'and']
+
+    def test_matches_remove_stopwords(self):
+        normalizer = TextNormalizer(self.stop_words)
+        text = "The  summit in Paris\nwas one OF the events and more"
+
+        expected = ' '.join(word for word in text.split() if word.lower() not in self.stop_words)
+        self.assertEqual(normalizer.normalize(text), expected)
+        self.assertEqual(normalizer(text), "summit Paris was one events more")
+
+    def test_lowercase_and_token_pattern(self):
+        normalizer = TextNormalizer(self.stop_words, lowercase=True, token_pattern=r"\w+")
+        self.assertEqual(normalizer.normalize("The Summit, in PARIS."), "summit paris")
+
+    def test_batch_keeps_series_index(self):
+        normalizer = TextNormalizer(self.stop_words)
+        texts = pd.Series(["the cat", "a dog in the park"], index=[10, 20])
+
+        result = normalizer.normalize_batch(texts)
+        pd.testing.assert_series_equal(result, pd.Series(["cat", "a dog park"], index=[10, 20]))
+        self.assertEqual(normalizer.normalize_batch(iter(["of mice and men"])), ["mice men"])
+
+    def test_process_pool_gives_the_same_result(self):
+        normalizer = TextNormalizer(self.stop_words)
+        texts = [f"the story {i} of the day" for i in range(50)]
+        self.assertEqual(normalizer.normalize_batch(texts, n_jobs=2, chunk_size=7),
+                         normalizer.normalize_batch(texts))
+
+if __name__ == '__main__':
+    unittest.main()
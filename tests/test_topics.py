@@ -0,0 +1,68 @@
+import unittest
+import pandas as pd
+from src import topics
+from src.text import TextNormalizer
+
+
+class FakeBERTopic:
+    def __init__(self):
+        self.batches = []
+
+    def partial_fit(self, documents, embeddings=None):
+        self.batches.append(documents)
+        self.topics_ = [len(document) % 3 for document in documents]
+        return self
+
+    def transform(self, documents, embeddings=None):
+        return [len(document) % 3 for document in documents], None
+
+
+class FakeTopicModel(topics.IncrementalTopicModel):
+    def _build(self):
+        return FakeBERTopic()
+
+
+class TestIncrementalTopicModel(unittest.TestCase):
+
+    normalizer = TextNormalizer(['the'])
+
+    def articles(self, n, start=0):
+        return pd.DataFrame({
+            'title': [f"title {i}" for i in range(start, start + n)],
+            'content': ['the ' + 'x' * i for i in range(start, start + n)],
+        }, index=range(start, start + n))
+
+    def test_batches_regroup_chunks_and_absorb_a_short_tail(self):
+        data = self.articles(25)
+        chunks = [data.iloc[:7], data.iloc[7:9], data.iloc[9:]]
+
+        sizes = [len(batch) for batch in topics._article_batches(iter(chunks), 10, 6)]
+        self.assertEqual(sizes, [10, 15])
+        self.assertEqual([len(batch) for batch in topics._article_batches(data, 10, 5)], [10, 10, 5])
+
+    def test_update_covers_every_article_in_order(self):
+        model = FakeTopicModel(n_topics=4, n_components=2)
+        data = self.articles(23)
+
+        assigned = model.update(data, batch_size=5, normalizer=self.normalizer)
+
+        self.assertEqual(list(assigned.index), list(data.index))
+        self.assertEqual(model.n_documents, 23)
+        self.assertEqual(model.n_batches, 4)
+        self.assertEqual(model.topic_model.batches[0][0], 'title 0')
+        pd.testing.assert_series_equal(model.assign(data, self.normalizer), assigned)
+
+    def test_first_batch_has_to_fill_every_topic(self):
+        model = FakeTopicModel(n_topics=10, n_components=2)
+        with self.assertRaises(ValueError):
+            model.partial_fit(['a', 'b'])
+        with self.assertRaises(ValueError):
+            model.transform(['a'])
+
+        # Later batches only need as many texts as PCA components
+        model.partial_fit([str(i) for i in range(10)])
+        model.partial_fit(['a', 'b'])
+        self.assertEqual(model.n_documents, 12)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 import pandas as pd
 from src.utils import website_sentiment_distribution  # Ensure correct import path
+from src import utils
 
 class TestUtils(unittest.TestCase):
     def test_website_sentiment_distribution(self):
@@ -27,5 +28,66 @@ class TestUtils(unittest.TestCase):
         # Compare without index names
         pd.testing.assert_frame_equal(result_reset, expected_reset, check_index_type=False)
 
+    def test_website_sentiment_distribution_from_chunks(self):
+        data = pd.DataFrame({
+            'source_name': ['site1', 'site2', 'site1', 'site2', 'site3'],
+            'title_sentiment': ['Positive', 'Neutral', 'Negative', 'Positive', 'Neutral']
+        })
+        chunks = iter([data.iloc[:2], data.iloc[2:4], data.iloc[4:]])
+
+        pd.testing.assert_frame_equal(website_sentiment_distribution(chunks), website_sentiment_distribution(data))
+
+    def test_categorical_columns_only_report_observed_domains(self):
+        data = pd.DataFrame({
+            'source_name': pd.Categorical(['site1', 'site2', 'site1', 'site3']),
+            'title_sentiment': pd.Categorical(['Positive', 'Neutral', 'Negative', 'Positive']),
+        })
+        filtered = data[data['source_name'] != 'site3']
+
+        result = website_sentiment_distribution(filtered)
+        self.assertEqual(list(result.index), ['site1', 'site2'])
+        chunked = website_sentiment_distribution(iter([filtered.iloc[:1], filtered.iloc[1:]]))
+        # The DataFrame path keeps the categorical index, the chunked path builds a plain one
+        pd.testing.assert_frame_equal(result.set_axis(list(result.index)), chunked.set_axis(list(chunked.index)),
+                                      check_column_type=False)
+
+    def test_batched_keywords_match_per_document_keywords(self):
+        class FakeKeyBERT:
+            def __init__(self):
+                self.calls = 0
+
+            def extract_keywords(self, docs, top_n=5, **kwargs):
+                self.calls += 1
+                if isinstance(docs, str):
+                    return [(word, 1.0) for word in docs.split()[:top_n]]
+                keywords = [self.extract_keywords(doc, top_n) for doc in docs]
+                self.calls -= len(docs)
+                return keywords[0] if len(docs) == 1 else keywords
+
+        texts = ['one two', None, 'three four five', 'six']
+        model = FakeKeyBERT()
+        batched = utils._extract_keywords_batched(model, texts, batch_size=2, top_n=5)
+
+        self.assertEqual(batched, [[('one', 1.0), ('two', 1.0)], [],
+                                   [('three', 1.0), ('four', 1.0), ('five', 1.0)], [('six', 1.0)]])
+        self.assertEqual(model.calls, 2)
+
+    def test_calculate_similarity(self):
+        titles = [[('ethiopia', 0.6), ('kenya', 0.8)], [('trade', 0.5)], [], [('a', 0.0)], [('b', 1.0), ('b', 0.2)]]
+        contents = [[('kenya', 0.8), ('ethiopia', 0.6)], [('deal', 0.9)], [('x', 1.0)], [('a', 1.0)], [('b', 0.5)]]
+
+        similarity = utils.calculate_similarity(titles, contents)
+
+        # Same keywords, no shared keyword, empty side, zero scores, repeated keyword keeps its last score
+        self.assertEqual(len(similarity), 5)
+        self.assertAlmostEqual(similarity[0], 1.0)
+        self.assertEqual(similarity[1:4], [0, 0, 0])
+        self.assertAlmostEqual(similarity[4], 1.0)
+
+    def test_calculate_similarity_partial_overlap(self):
+        similarity = utils.calculate_similarity([[('a', 1.0), ('b', 1.0)]], [[('a', 1.0), ('c', 1.0)], []])
+        self.assertEqual(len(similarity), 1)
+        self.assertAlmostEqual(similarity[0], 0.5)
+
 if __name__ == '__main__':
     unittest.main()